@@ -1,6 +1,13 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy.orm import DeclarativeBase
+import time
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.sql import Select
 from typing import AsyncIterator
 
 def _build_async_dsn() -> str:
@@ -15,17 +22,163 @@ def _build_async_dsn() -> str:
     return f"postgresql+asyncpg://{user}:{pwd}@{host}:{port}/{db}"
 
 DATABASE_URL = _build_async_dsn()
+# Comma-separated replica DSNs; empty => every read goes to the primary.
+DATABASE_READ_URLS = [u.strip() for u in os.getenv("DATABASE_READ_URLS", "").split(",") if u.strip()]
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", str(POOL_SIZE)))
+READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", str(MAX_OVERFLOW)))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "2.0"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_SECONDS", "5.0"))
 
 class Base(DeclarativeBase):
     pass
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
-SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+def _engine_kwargs(dsn: str, pool_size: int, max_overflow: int) -> dict:
+    kw: dict = {"echo": False, "future": True}
+    if dsn.startswith("sqlite"):
+        return kw
+    kw.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=POOL_TIMEOUT,
+              pool_recycle=POOL_RECYCLE, pool_pre_ping=True)
+    if "+asyncpg" in dsn:
+        # SQLAlchemy's own per-connection prepared statement LRU + asyncpg's statement cache.
+        kw["connect_args"] = {
+            "prepared_statement_cache_size": STATEMENT_CACHE_SIZE,
+            "statement_cache_size": STATEMENT_CACHE_SIZE,
+        }
+    return kw
+
+engine = create_async_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL, POOL_SIZE, MAX_OVERFLOW))
+read_engines: list[AsyncEngine] = [
+    create_async_engine(u, **_engine_kwargs(u, READ_POOL_SIZE, READ_MAX_OVERFLOW)) for u in DATABASE_READ_URLS
+]
+
+# ---------- read-your-writes ----------
+
+class _RoutingState:
+    __slots__ = ("wrote",)
+
+    def __init__(self):
+        self.wrote = False
+
+# Holds a per-request mutable state; flush/commit on a writer session flips `wrote`,
+# after which every read session in the same request goes to the primary.
+_routing_state: ContextVar[_RoutingState | None] = ContextVar("db_routing_state", default=None)
+
+def _state() -> _RoutingState:
+    st = _routing_state.get()
+    if st is None:
+        st = _RoutingState()
+        _routing_state.set(st)
+    return st
+
+def mark_write() -> None:
+    """Pin the rest of the current request to the primary (called automatically on flush)."""
+    _state().wrote = True
+
+class WriteSession(Session):
+    pass
+
+@event.listens_for(WriteSession, "after_flush")
+def _pin_after_flush(session, flush_context):
+    mark_write()
+
+@event.listens_for(WriteSession, "after_commit")
+def _pin_after_commit(session):
+    mark_write()
+
+# ---------- replicas ----------
+
+class _Replica:
+    __slots__ = ("engine", "lag", "checked_at")
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.lag: float | None = None   # None = never checked
+        self.checked_at = 0.0
+
+_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+_replicas = [_Replica(e) for e in read_engines]
+_rr = itertools.count()
+_lag_monitor: asyncio.Task | None = None
+
+async def _refresh_lag(r: _Replica) -> None:
+    try:
+        async with r.engine.connect() as conn:
+            r.lag = float((await conn.execute(_LAG_SQL)).scalar() or 0.0)
+    except Exception:
+        r.lag = float("inf")
+    finally:
+        r.checked_at = time.monotonic()
+
+async def _watch_replica_lag() -> None:
+    while True:
+        await asyncio.gather(*(_refresh_lag(r) for r in _replicas))
+        await asyncio.sleep(REPLICA_LAG_CHECK_INTERVAL)
+
+async def start_replica_monitor() -> None:
+    """One background loop refreshes every replica's lag; requests only read the last value."""
+    global _lag_monitor
+    if _lag_monitor is None and _replicas:
+        _lag_monitor = asyncio.create_task(_watch_replica_lag())
+
+async def stop_replica_monitor() -> None:
+    global _lag_monitor
+    if _lag_monitor is not None:
+        _lag_monitor.cancel()
+        _lag_monitor = None
+
+async def _pick_reader() -> AsyncEngine:
+    """Round-robin over replicas within the lag threshold; primary if none qualify."""
+    if not _replicas:
+        return engine
+    now = time.monotonic()
+    n = len(_replicas)
+    start = next(_rr)
+    for i in range(n):
+        r = _replicas[(start + i) % n]
+        # without the monitor (CLIs, scripts) check inline: first use, then once per interval
+        if r.lag is None or (_lag_monitor is None and now - r.checked_at > REPLICA_LAG_CHECK_INTERVAL):
+            await _refresh_lag(r)
+        if r.lag <= REPLICA_MAX_LAG:
+            return r.engine
+    return engine
+
+class ReadSession(Session):
+    """Routes SELECTs to the chosen replica unless the request already wrote; everything else to the primary."""
+    reader = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.reader is None or self._flushing or _state().wrote or not isinstance(clause, Select):
+            return engine.sync_engine
+        return self.reader.sync_engine
+
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, sync_session_class=WriteSession, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(class_=AsyncSession, sync_session_class=ReadSession, expire_on_commit=False)
 
 async def get_session() -> AsyncIterator[AsyncSession]:
+    _state()
     async with SessionLocal() as session:
         yield session
 
+async def get_read_session() -> AsyncIterator[AsyncSession]:
+    st = _state()
+    async with ReadSessionLocal() as session:
+        if not st.wrote:
+            session.sync_session.reader = await _pick_reader()
+        yield session
+
+# get_read_session for sessions that outlive the request dependency (streamed bodies, CLIs)
+read_session = asynccontextmanager(get_read_session)
+
 # No-op: rely on Alembic only
 async def init_db() -> None:
     return None
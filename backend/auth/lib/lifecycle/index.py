@@ -0,0 +1,104 @@
+"""
+Startup warm-up and readiness.
+
+`start_warmup(steps)` runs named async steps in the background once the app has started;
+`warmup_status()["ready"]` stays False until every step has succeeded, so /health/ready
+only sends traffic to a warm process. Failing steps (DB not up yet...) are retried with backoff.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+log = logging.getLogger("lifecycle")
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") in ("1", "true", "True")
+WARMUP_RETRY_MAX = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "30"))
+
+Step = tuple[str, Callable[[], Awaitable[None]]]
+
+_ready = False
+_pending: list[str] = []
+_timings: dict[str, float] = {}
+_task: asyncio.Task | None = None
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+def warmup_status() -> dict:
+    return {
+        "ready": _ready,
+        "pending": list(_pending),
+        "timings_ms": {k: round(v * 1000, 1) for k, v in _timings.items()},
+    }
+
+
+async def warm_pool(engine: AsyncEngine, n: int, prime: Callable[[AsyncSession], Awaitable[None]] | None = None) -> None:
+    """
+    Open `n` pool connections at once (so they are distinct), run `prime` on each and hand
+    them back to the pool. Priming runs the hot statements once per connection, which fills
+    SQLAlchemy's compiled cache and each connection's prepared-statement cache.
+    """
+    if engine.dialect.name == "sqlite":
+        n = 1
+    n = max(1, min(n, getattr(engine.pool, "size", lambda: n)()))
+    conns = await asyncio.gather(*(engine.connect().start() for _ in range(n)))
+    try:
+        await asyncio.gather(*(_prime_connection(c, prime) for c in conns))
+    finally:
+        await asyncio.gather(*(c.close() for c in conns), return_exceptions=True)
+
+
+async def _prime_connection(conn, prime) -> None:
+    await conn.execute(text("SELECT 1"))
+    if prime is not None:
+        async with AsyncSession(bind=conn) as session:
+            await prime(session)
+    await conn.rollback()
+
+
+async def _run(steps: list[Step]) -> None:
+    global _ready
+    started = time.perf_counter()
+    for name, fn in steps:
+        backoff = 0.5
+        while True:
+            t0 = time.perf_counter()
+            try:
+                await fn()
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("warm-up step %s failed, retrying in %.1fs: %s", name, backoff, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, WARMUP_RETRY_MAX)
+        _timings[name] = time.perf_counter() - t0
+        _pending.remove(name)
+    _ready = True
+    log.info("warm in %.0fms %s", (time.perf_counter() - started) * 1000, warmup_status()["timings_ms"])
+
+
+async def start_warmup(steps: list[Step]) -> None:
+    global _task, _ready
+    if not WARMUP_ENABLED:
+        _ready = True
+        return
+    if _task is None:
+        _pending[:] = [name for name, _ in steps]
+        _task = asyncio.create_task(_run(steps))
+
+
+async def stop_warmup() -> None:
+    """Report not-ready first so load balancers drain us during shutdown."""
+    global _task, _ready
+    _ready = False
+    if _task is not None:
+        _task.cancel()
+        _task = None
@@ -1,9 +1,14 @@
 import os
 from jose import jwt, JWTError
+from lib.security.revocation import is_revoked
 SECRET = os.getenv("AUTH_SECRET", "dev-secret-change-me")
 ALGO = "HS256"
 def decode(token: str):
+    """Local verification; consults the revocation denylist (needs start_revocation_listener running)."""
     try:
-        return jwt.decode(token, SECRET, algorithms=[ALGO])
+        claims = jwt.decode(token, SECRET, algorithms=[ALGO])
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+    if is_revoked(claims.get("jti")):
+        return None
+    return claims
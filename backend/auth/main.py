@@ -1,3 +1,5 @@
+from contextlib import AsyncExitStack, asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -5,9 +7,43 @@ from src.health.index import router as health_router
 from src.auth.index import router as auth_router
 from lib.middleware.req_context import RequestIdMiddleware
 from lib.observability.logging import setup_logging
+from lib.observability.metrics import setup_metrics, loop_lag_monitor, instrument_engine, instrument_redis
+from lib.observability.profiling import setup_profiling
+from lib.db.postgres import engine, read_engines, start_replica_monitor, stop_replica_monitor
+import lib.redis.index as redis_index
+from src.auth import user_cache, password_cost, session_cleanup, session_store
+from src.auth.warmup import start_auth_warmup
+from lib.security import revocation
+from lib.lifecycle.index import stop_warmup
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Background work starts in order; the exit stack stops it in reverse, also when a later start fails."""
+    async with AsyncExitStack() as stack:
+        stack.push_async_callback(redis_index.close_client)      # last, after the listeners stop
+        await stack.enter_async_context(loop_lag_monitor())
+        await start_replica_monitor()
+        stack.push_async_callback(stop_replica_monitor)
+        await redis_index.start_health_check()
+        stack.push_async_callback(redis_index.stop_health_check)
+        await revocation.start_revocation_listener()
+        stack.push_async_callback(revocation.stop_revocation_listener)
+        await session_store.start_audit_writer()
+        stack.push_async_callback(session_store.stop_audit_writer)
+        await session_cleanup.start_session_cleanup()
+        stack.push_async_callback(session_cleanup.stop_session_cleanup)
+        await user_cache.start_invalidation_listener()
+        stack.push_async_callback(user_cache.stop_invalidation_listener)
+        await password_cost.calibrate_on_startup()
+        # last, so it runs after calibration has settled the hash cost; /health/ready flips when it finishes
+        await start_auth_warmup()
+        stack.push_async_callback(stop_warmup)        # first on shutdown, so readiness drops before anything closes
+        yield
+
 
 setup_logging()
-app = FastAPI(title="Auth Service", version="3.0.0")
+app = FastAPI(title="Auth Service", version="3.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +57,12 @@ app.add_middleware(
 )
 
 app.add_middleware(RequestIdMiddleware)
+setup_profiling(app)
+setup_metrics(app)
+instrument_engine(engine)
+for i, e in enumerate(read_engines):
+    instrument_engine(e, f"replica{i}")
+instrument_redis(lambda: redis_index._client)
 
 app.include_router(health_router, prefix="/health", tags=["health"])
 app.include_router(auth_router,   prefix="/auth",   tags=["auth"])
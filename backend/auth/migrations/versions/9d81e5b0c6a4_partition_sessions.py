@@ -0,0 +1,28 @@
+"""partition sessions by expires_at (superseded)
+
+Revision ID: 9d81e5b0c6a4
+Revises: 4f2a9c1e7b3d
+Create Date: 2026-10-19 10:31:07.552910
+
+Used to partition `sessions` only when SESSIONS_PARTITIONED=1 was set at
+migration time, so two databases at the same revision could differ in schema.
+Kept as an empty step for databases that already recorded it; the partitioning
+itself is revision a4e19c7d2b58, which also converts a table this revision
+partitioned under the old flag.
+"""
+from typing import Sequence, Union
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d81e5b0c6a4'
+down_revision: Union[str, None] = '4f2a9c1e7b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
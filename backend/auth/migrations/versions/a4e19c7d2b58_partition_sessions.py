@@ -0,0 +1,103 @@
+"""partition sessions by expires_at
+
+Revision ID: a4e19c7d2b58
+Revises: c37b0e4d92f1
+Create Date: 2026-10-19 15:12:40.318274
+
+Rebuilds `sessions` as a table RANGE-partitioned by month of expires_at, so a
+month whose sessions have all expired is removed with one DROP TABLE (see
+src/auth/session_cleanup.maintain_partitions) instead of row-by-row deletes.
+The primary key becomes (id, expires_at), as Postgres requires the partition
+key in every unique constraint.
+
+Monthly partitions are created out to the longest refresh lifetime, and a
+DEFAULT partition catches anything past them, so an insert never fails for
+want of a partition. A table already partitioned by the old opt-in
+9d81e5b0c6a4 only gets the DEFAULT partition.
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from src.auth.session_cleanup import DEFAULT_PARTITION, _month, partition_name, upcoming_months
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4e19c7d2b58'
+down_revision: Union[str, None] = 'c37b0e4d92f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _is_partitioned() -> bool:
+    return op.get_bind().execute(sa.text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid
+            WHERE c.relname = 'sessions'
+        )
+    """)).scalar()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if _is_partitioned():
+        op.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF sessions DEFAULT")
+        return
+    op.execute("ALTER TABLE sessions RENAME TO sessions_unpartitioned")
+    op.execute("ALTER INDEX ix_sessions_user_id_created_at RENAME TO ix_sessions_unpartitioned_user_id_created_at")
+    op.execute("ALTER INDEX ix_sessions_expires_at RENAME TO ix_sessions_unpartitioned_expires_at")
+    op.execute("""
+        CREATE TABLE sessions (
+            id UUID NOT NULL,
+            user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            refresh_token_hash VARCHAR NOT NULL,
+            user_agent VARCHAR,
+            ip INET,
+            expires_at TIMESTAMPTZ NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, expires_at)
+        ) PARTITION BY RANGE (expires_at)
+    """)
+    op.create_index('ix_sessions_user_id_created_at', 'sessions', ['user_id', 'created_at'], unique=False)
+    op.create_index(op.f('ix_sessions_expires_at'), 'sessions', ['expires_at'], unique=False)
+
+    # the months maintain_partitions keeps ahead, and on to the latest live expiry
+    months = upcoming_months(date.today())
+    newest = op.get_bind().execute(sa.text("SELECT max(expires_at) FROM sessions_unpartitioned")).scalar()
+    if newest:
+        while months[-1] < newest.date().replace(day=1):
+            months.append(_month(months[-1], 1))
+    for m in months:
+        op.execute(
+            f"CREATE TABLE {partition_name(m)} PARTITION OF sessions "
+            f"FOR VALUES FROM ('{m.isoformat()}') TO ('{_month(m, 1).isoformat()}')"
+        )
+    op.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF sessions DEFAULT")
+
+    op.execute("INSERT INTO sessions SELECT * FROM sessions_unpartitioned WHERE expires_at >= now()")
+    op.execute("DROP TABLE sessions_unpartitioned")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE sessions RENAME TO sessions_partitioned")
+    op.execute("ALTER INDEX ix_sessions_user_id_created_at RENAME TO ix_sessions_partitioned_user_id_created_at")
+    op.execute("ALTER INDEX ix_sessions_expires_at RENAME TO ix_sessions_partitioned_expires_at")
+    op.create_table('sessions',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('refresh_token_hash', sa.String(), nullable=False),
+    sa.Column('user_agent', sa.String(), nullable=True),
+    sa.Column('ip', postgresql.INET(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_sessions_user_id_created_at', 'sessions', ['user_id', 'created_at'], unique=False)
+    op.create_index(op.f('ix_sessions_expires_at'), 'sessions', ['expires_at'], unique=False)
+    op.execute("INSERT INTO sessions SELECT * FROM sessions_partitioned")
+    op.execute("DROP TABLE sessions_partitioned")
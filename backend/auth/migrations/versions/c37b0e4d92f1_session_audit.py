@@ -0,0 +1,39 @@
+"""session audit
+
+Revision ID: c37b0e4d92f1
+Revises: 9d81e5b0c6a4
+Create Date: 2026-10-19 11:04:52.907113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'c37b0e4d92f1'
+down_revision: Union[str, None] = '9d81e5b0c6a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('session_audit',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('session_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('event', sa.String(), nullable=False),
+    sa.Column('ip', postgresql.INET(), nullable=True),
+    sa.Column('user_agent', sa.String(), nullable=True),
+    sa.Column('occurred_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_session_audit_user_id'), 'session_audit', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_session_audit_user_id'), table_name='session_audit')
+    op.drop_table('session_audit')
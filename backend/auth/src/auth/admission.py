@@ -0,0 +1,50 @@
+# src/auth/admission.py
+"""
+Admission control for the bcrypt-bound endpoints.
+
+login/register take a slot from their own ConcurrencyLimiter and run the hash in the
+bounded hashing pool (see basemodels.run_hash), so a burst against them can neither
+block the event loop nor queue /auth/token/inspect, which uses neither.
+"""
+import os
+from fastapi import Request
+
+from lib.ratelimit.index import ConcurrencyLimiter, SlidingWindowLimiter
+
+# only set when the service is reachable through nginx alone; otherwise clients pick their own "IP"
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "0") in ("1", "true", "True")
+RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS_ENABLED", "1") in ("1", "true", "True")
+QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2.0"))
+
+login_slots = ConcurrencyLimiter(
+    "login",
+    limit=int(os.getenv("LOGIN_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("LOGIN_QUEUE", "64")),
+    queue_timeout=QUEUE_TIMEOUT,
+)
+register_slots = ConcurrencyLimiter(
+    "register",
+    limit=int(os.getenv("REGISTER_CONCURRENCY", "4")),
+    max_queue=int(os.getenv("REGISTER_QUEUE", "32")),
+    queue_timeout=QUEUE_TIMEOUT,
+)
+
+login_per_ip = SlidingWindowLimiter("login_ip", int(os.getenv("RL_LOGIN_PER_IP", "30")), 60, RATE_LIMITS_ENABLED)
+login_per_email = SlidingWindowLimiter("login_email", int(os.getenv("RL_LOGIN_PER_EMAIL", "10")), 300, RATE_LIMITS_ENABLED)
+register_per_ip = SlidingWindowLimiter("register_ip", int(os.getenv("RL_REGISTER_PER_IP", "10")), 600, RATE_LIMITS_ENABLED)
+
+
+def client_ip(request: Request) -> str:
+    """
+    The address per-IP limits are keyed on. Behind the gateway that is X-Real-IP, which nginx
+    overwrites with $remote_addr, else the right-most X-Forwarded-For hop, the one nginx appended;
+    the hops before it are whatever the client sent.
+    """
+    if TRUST_PROXY_HEADERS:
+        ip = request.headers.get("x-real-ip", "").strip()
+        if ip:
+            return ip
+        fwd = request.headers.get("x-forwarded-for", "").rsplit(",", 1)[-1].strip()
+        if fwd:
+            return fwd
+    return request.client.host if request.client else "unknown"
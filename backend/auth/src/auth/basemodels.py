@@ -3,13 +3,48 @@ from pydantic import BaseModel, EmailStr
 from typing import Optional
 from jose import jwt
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import hmac
 import os
-from uuid import UUID
+from uuid import UUID, uuid4
 SECRET_KEY = os.getenv("AUTH_SECRET", "dev-secret-change-me")
 ALGORITHM = "HS256"
 ACCESS_MIN = int(os.getenv("ACCESS_MINUTES", "15"))
 REFRESH_DAYS = int(os.getenv("REFRESH_DAYS", "30"))
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# The configured cost is both the default and the minimum: hashes below it, or under another
+# scheme, report needs_update() and get rewritten on the next successful login. Stronger hashes
+# are left alone, so workers whose costs differ never rehash each other's hashes back and forth.
+# Use `python -m src.auth.password_cost` to pick values for the current hardware.
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "bcrypt")          # "bcrypt" | "argon2" (needs argon2-cffi)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_KIB = int(os.getenv("ARGON2_MEMORY_KIB", "65536"))
+def password_context_settings(
+    scheme: str = PASSWORD_SCHEME,
+    bcrypt_rounds: int = BCRYPT_ROUNDS,
+    argon2_time_cost: int = ARGON2_TIME_COST,
+    argon2_memory_kib: int = ARGON2_MEMORY_KIB,
+) -> dict:
+    schemes = [scheme] if scheme == "bcrypt" else [scheme, "bcrypt"]   # keep verifying legacy bcrypt
+    settings = dict(
+        schemes=schemes,
+        deprecated="auto",
+        bcrypt__default_rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+    )
+    if scheme == "argon2":
+        settings.update(
+            argon2__time_cost=argon2_time_cost,
+            argon2__min_rounds=argon2_time_cost,
+            argon2__memory_cost=argon2_memory_kib,
+        )
+    return settings
+pwd_ctx = CryptContext(**password_context_settings())
+# bcrypt releases the GIL, so hashing on a small dedicated pool keeps the event loop free
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pwhash")
 class UserOut(BaseModel):
     id: UUID
     email: EmailStr
@@ -33,11 +68,26 @@ def hash_password(p: str) -> str:
     return pwd_ctx.hash(p)
 def verify_password(p: str, h: str) -> bool:
     return pwd_ctx.verify(p, h)
+def password_needs_rehash(h: str) -> bool:
+    return pwd_ctx.needs_update(h)
+async def run_hash(fn, *args):
+    """Run a CPU-bound hashing call on the hashing pool."""
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, fn, *args)
 def create_access_token(sub: str, roles: list[str]) -> str:
     now = datetime.utcnow()
-    payload = {"sub": sub, "roles": roles, "iat": int(now.timestamp()), "exp": int((now + timedelta(minutes=ACCESS_MIN)).timestamp())}
+    payload = {"sub": sub, "roles": roles, "jti": uuid4().hex, "iat": int(now.timestamp()), "exp": int((now + timedelta(minutes=ACCESS_MIN)).timestamp())}
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
-def create_refresh_token(sub: str) -> str:
+def create_refresh_token(sub: str, sid: str | None = None) -> str:
     now = datetime.utcnow()
     payload = {"sub": sub, "type": "refresh", "iat": int(now.timestamp()), "exp": int((now + timedelta(days=REFRESH_DAYS)).timestamp())}
-    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
+    if sid:
+        payload["sid"] = sid
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+def hash_refresh_token(token: str) -> str:
+    # refresh tokens are high-entropy, so a fast digest is enough (no bcrypt on the login path)
+    return hashlib.sha256(token.encode()).hexdigest()
+async def verify_refresh_token(token: str, h: str) -> bool:
+    if h.startswith("$2"):   # sessions created before the switch to sha256
+        from passlib.hash import bcrypt   # legacy hashes only; keep it off the import path
+        return await run_hash(bcrypt.verify, token, h)
+    return hmac.compare_digest(hash_refresh_token(token), h)
\ No newline at end of file
@@ -29,3 +29,9 @@ def set_auth_cookies(response: Response, access_token: str, refresh_token: str):
         max_age=30 * 24 * 60 * 60,  # 30 days
         **common,
     )
+
+
+def clear_auth_cookies(response: Response):
+    common = dict(httponly=True, samesite="lax", secure=not IS_DEV, path="/")
+    response.delete_cookie(key="access_token", **common)
+    response.delete_cookie(key="refresh_token", **common)
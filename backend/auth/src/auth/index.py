@@ -1,32 +1,43 @@
 # src/auth/index.py
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+import os
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Response, Request
 from pydantic import BaseModel
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
 from lib.db.postgres import get_session
 from .basemodels import RegisterIn, LoginIn, TokenOut
-from .module import register_user, login_user
-from src.models import User
-from .cookies import set_auth_cookies
+from .module import (
+    register_user, login_user, refresh_session, logout_session, revoke_access_token, deactivate_user, delete_user,
+)
+from .user_cache import get_user_status
+from .cookies import set_auth_cookies, clear_auth_cookies
+from .admission import login_slots, register_slots, login_per_ip, login_per_email, register_per_ip, client_ip
 
 # >>> Use jose directly to avoid None returns from a helper
 from jose import jwt, JWTError
 from .basemodels import SECRET_KEY, ALGORITHM
+from lib.security.revocation import is_revoked
 
 router = APIRouter()
 
+# may deactivate / delete any account; everyone else only their own
+ADMIN_ROLE = os.getenv("AUTH_ADMIN_ROLE", "admin")
+
 
 @router.post("/register", response_model=TokenOut, status_code=status.HTTP_201_CREATED)
 async def register(
     payload: RegisterIn,
+    request: Request,
     response: Response,
     session: AsyncSession = Depends(get_session),
 ):
+    await register_per_ip.enforce(client_ip(request))
     try:
-        result = await register_user(session, payload)
+        async with register_slots.slot():
+            result = await register_user(session, payload)
         set_auth_cookies(response, result.access_token, result.refresh_token)
         return result
     except ValueError as e:
@@ -36,35 +47,92 @@ async def register(
 @router.post("/login", response_model=TokenOut)
 async def login(
     payload: LoginIn,
+    request: Request,
     response: Response,
+    background_tasks: BackgroundTasks,
     session: AsyncSession = Depends(get_session),
 ):
+    await login_per_ip.enforce(client_ip(request))
+    await login_per_email.enforce(payload.email.lower())
     try:
-        result = await login_user(session, payload)
+        async with login_slots.slot():
+            result = await login_user(session, payload, background_tasks)
         set_auth_cookies(response, result.access_token, result.refresh_token)
         return result
     except ValueError as e:
         raise HTTPException(status_code=401, detail=str(e))
 
 
+class RefreshIn(BaseModel):
+    refresh_token: str | None = None   # falls back to the refresh_token cookie
+
+
+def _refresh_token_from(request: Request, payload: RefreshIn | None) -> str | None:
+    return (payload.refresh_token if payload else None) or request.cookies.get("refresh_token")
+
+
+@router.post("/refresh", response_model=TokenOut)
+async def refresh(
+    request: Request,
+    response: Response,
+    payload: RefreshIn | None = None,
+    session: AsyncSession = Depends(get_session),
+):
+    token = _refresh_token_from(request, payload)
+    if not token:
+        raise HTTPException(status_code=401, detail="Refresh token missing")
+    try:
+        result = await refresh_session(session, token)
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    set_auth_cookies(response, result.access_token, result.refresh_token)
+    return result
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    request: Request,
+    response: Response,
+    payload: RefreshIn | None = None,
+    session: AsyncSession = Depends(get_session),
+):
+    token = _refresh_token_from(request, payload)
+    if token:
+        try:
+            await logout_session(session, token)
+        except ValueError:
+            pass   # logging out with a garbage token still clears the cookies
+    access = request.cookies.get("access_token")
+    if access:
+        try:
+            await revoke_access_token(access)
+        except ValueError:
+            pass
+        except Exception:
+            raise HTTPException(status_code=503, detail="Revocation store unavailable")
+    clear_auth_cookies(response)
+
+
 # -------- Token introspection for other microservices --------
 
 class TokenIntrospectIn(BaseModel):
     token: str
 
+class TokenRevokeIn(BaseModel):
+    token: str
+
 class TokenIntrospectOut(BaseModel):
     user_id: UUID
+    roles: list[str] = []
 
 
 @router.post("/token/inspect", response_model=TokenIntrospectOut)
-async def inspect_token(
-    payload: TokenIntrospectIn,
-    session: AsyncSession = Depends(get_session),
-):
+async def inspect_token(payload: TokenIntrospectIn):
     """
-    Accepts a JWT (expected: access token) and returns the user's UUID if valid.
+    Accepts a JWT (expected: access token) and returns the user's UUID and roles if valid.
     Body: {"token": "<jwt>"}
-    Response: {"user_id": "<uuid>"}
+    Response: {"user_id": "<uuid>", "roles": ["customer", ...]}
+    User status comes from the in-process cache, so a warm introspection does no DB I/O.
     """
     token = (payload.token or "").strip()
     if not token:
@@ -79,6 +147,8 @@ async def inspect_token(
     # Disallow refresh tokens for this endpoint (optional).
     if claims.get("type") == "refresh":
         raise HTTPException(status_code=401, detail="Refresh token not allowed for introspection")
+    if is_revoked(claims.get("jti")):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
 
     # Extract subject and validate UUID
     sub = claims.get("sub")
@@ -89,9 +159,63 @@ async def inspect_token(
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid subject in token")
 
-    # Ensure the user exists (optional: check is_active)
-    user = (await session.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
-    if not user:
+    # Ensure the user exists and is active
+    user = await get_user_status(user_id)
+    if not user.exists:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not user.is_active:
+        raise HTTPException(status_code=401, detail="User is inactive")
+
+    return TokenIntrospectOut(user_id=user_id, roles=list(user.roles))
+
+
+@router.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_token(payload: TokenRevokeIn):
+    """
+    Revoke an access token until it expires. Takes effect on every worker via pub/sub.
+    Body: {"token": "<jwt>"}
+    """
+    try:
+        await revoke_access_token((payload.token or "").strip())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        raise HTTPException(status_code=503, detail="Revocation store unavailable")
+
+
+# -------- Account deactivation / deletion --------
+
+async def _authorize_account(request: Request, user_id: UUID) -> None:
+    """The caller's access token (Bearer, else the access_token cookie) must be the account's own or an admin's."""
+    header = request.headers.get("authorization", "")
+    token = header[7:].strip() if header.lower().startswith("bearer ") else request.cookies.get("access_token")
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        caller = UUID(claims["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    if claims.get("type") == "refresh" or is_revoked(claims.get("jti")):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    status_ = await get_user_status(caller)
+    if not status_.exists or not status_.is_active:
+        raise HTTPException(status_code=401, detail="User is inactive")
+    if caller != user_id and ADMIN_ROLE not in status_.roles:
+        raise HTTPException(status_code=403, detail="Not allowed")
+
+
+@router.post("/users/{user_id}/deactivate", status_code=status.HTTP_204_NO_CONTENT)
+async def deactivate_account(user_id: UUID, request: Request, session: AsyncSession = Depends(get_session)):
+    """Own account or admin. Every worker drops its cached status at once (user cache channel)."""
+    await _authorize_account(request, user_id)
+    if not await deactivate_user(session, user_id):
         raise HTTPException(status_code=404, detail="User not found")
 
-    return TokenIntrospectOut(user_id=user.id)
+
+@router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_account(user_id: UUID, request: Request, session: AsyncSession = Depends(get_session)):
+    """Own account or admin. Every worker drops its cached status at once (user cache channel)."""
+    await _authorize_account(request, user_id)
+    if not await delete_user(session, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
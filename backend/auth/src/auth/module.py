@@ -1,70 +1,219 @@
 # src/auth/module.py
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
-from src.models import User, Role, Session, user_roles
-from .basemodels import RegisterIn, LoginIn, TokenOut, UserOut, hash_password, verify_password, create_access_token, create_refresh_token
+from src.models import User, Role, user_roles
+from fastapi import BackgroundTasks
+from jose import jwt, JWTError
+from lib.db.postgres import SessionLocal
+from lib.security.revocation import revoke
+from .basemodels import (
+    RegisterIn, LoginIn, TokenOut, UserOut, hash_password, verify_password, password_needs_rehash, run_hash,
+    create_access_token, create_refresh_token, hash_refresh_token, verify_refresh_token,
+    SECRET_KEY, ALGORITHM, REFRESH_DAYS,
+)
+from .session_store import SessionRecord, get_session_store, audit
+from .user_cache import get_user_status, invalidate_user
 import datetime as dt
-from passlib.hash import bcrypt
+import logging
+import uuid
 
-async def register_user(session: AsyncSession, data: RegisterIn) -> TokenOut:
-    exists = (await session.execute(select(User).where(User.email == data.email))).scalar_one_or_none()
-    if exists:
-        raise ValueError("Email already registered")
-
-    user = User(email=data.email, password_hash=hash_password(data.password), full_name=data.full_name)
-    session.add(user)
-    await session.flush()
-
-    role = (await session.execute(select(Role).where(Role.code == "customer"))).scalar_one_or_none()
-    if not role:
-        role = Role(code="customer", name="Customer")
-        session.add(role)
-        await session.flush()
-
-    # ⬇️ insert into association table instead of user.roles.append(role)
-    await session.execute(
-        insert(user_roles).values(user_id=user.id, role_id=role.id)
-    )
-    await session.commit()
+log = logging.getLogger("auth")
 
-    access = create_access_token(str(user.id), ["customer"])
-    refresh = create_refresh_token(str(user.id))
-    s = Session(
-        user_id=user.id,
-        refresh_token_hash=bcrypt.hash(refresh),
+def _new_session(user_id: uuid.UUID) -> tuple[str, SessionRecord]:
+    sid = uuid.uuid4()
+    refresh = create_refresh_token(str(user_id), str(sid))
+    rec = SessionRecord(
+        id=sid,
+        user_id=user_id,
+        refresh_token_hash=hash_refresh_token(refresh),
         user_agent=None,
         ip=None,
-        expires_at=dt.datetime.utcnow() + dt.timedelta(days=30),
+        expires_at=dt.datetime.now(dt.timezone.utc) + dt.timedelta(days=REFRESH_DAYS),
     )
-    session.add(s)
-    await session.commit()
+    return refresh, rec
 
-    return TokenOut(access_token=access, refresh_token=refresh, user=UserOut.model_validate(user))
+# role code -> id; roles are effectively immutable, so one lookup per process is enough
+_role_ids: dict[str, uuid.UUID] = {}
+ROLE_NAMES = {"customer": "Customer"}
 
-async def login_user(session: AsyncSession, data: LoginIn) -> TokenOut:
-    # ⬇️ eager-load roles to avoid lazy I/O
-    user = (
-        await session.execute(
-            select(User)
-            .where(User.email == data.email)
-            .options(selectinload(User.roles))
+async def get_role_id(session: AsyncSession, code: str) -> uuid.UUID:
+    """
+    The role's id, inserting the role if needed. The upsert runs in the caller's transaction,
+    so the id is only cached by `remember_role_id` once that transaction has committed.
+    """
+    rid = _role_ids.get(code)
+    if rid is None:
+        # upsert-and-return in one round trip; the no-op DO UPDATE makes RETURNING yield existing rows too
+        stmt = (
+            pg_insert(Role)
+            .values(code=code, name=ROLE_NAMES.get(code, code.title()))
+            .on_conflict_do_update(index_elements=[Role.code], set_={"code": code})
+            .returning(Role.id)
         )
-    ).scalar_one_or_none()
+        rid = (await session.execute(stmt)).scalar_one()
+    return rid
+
+def remember_role_id(code: str, rid: uuid.UUID) -> None:
+    """Cache a role id read by `get_role_id`; call after the transaction that read it commits."""
+    _role_ids[code] = rid
+
+async def register_user(session: AsyncSession, data: RegisterIn) -> TokenOut:
+    # The id is generated up front so both tokens can be minted before touching the DB;
+    # user, role link and session are then written in a single transaction.
+    user_id = uuid.uuid4()
+    access = create_access_token(str(user_id), ["customer"])
+    refresh, rec = _new_session(user_id)
+    store = get_session_store()
 
-    if not user or not user.password_hash or not verify_password(data.password, user.password_hash):
+    password_hash = await run_hash(hash_password, data.password)
+
+    try:
+        row = (
+            await session.execute(
+                pg_insert(User)
+                .values(id=user_id, email=data.email, password_hash=password_hash, full_name=data.full_name)
+                .on_conflict_do_nothing(index_elements=[User.email])
+                .returning(User.id, User.email, User.full_name, User.is_active, User.is_verified)
+            )
+        ).one_or_none()
+        if row is None:
+            raise ValueError("Email already registered")
+
+        role_id = await get_role_id(session, "customer")
+        await session.execute(insert(user_roles).values(user_id=user_id, role_id=role_id))
+        if store.transactional:
+            await store.create(session, rec, enforce_cap=False)   # a new user has no other sessions
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    remember_role_id("customer", role_id)
+    if not store.transactional:
+        # only once the user row is committed, so a failed registration leaves no session behind
+        await store.create(session, rec, enforce_cap=False)
+    audit("register", rec)
+
+    return TokenOut(access_token=access, refresh_token=refresh, user=UserOut.model_validate(row))
+
+async def rehash_password(user_id: uuid.UUID, password: str, old_hash: str) -> None:
+    """Re-hash under the current policy; runs after the response, on its own session."""
+    try:
+        new_hash = await run_hash(hash_password, password)
+        async with SessionLocal() as session:
+            # guard on the old hash so a concurrent password change wins
+            await session.execute(
+                update(User).where(User.id == user_id, User.password_hash == old_hash).values(password_hash=new_hash)
+            )
+            await session.commit()
+    except Exception as e:
+        log.warning("password rehash failed for %s: %s", user_id, e)
+
+def login_stmt(email: str):
+    # ⬇️ eager-load roles to avoid lazy I/O
+    return select(User).where(User.email == email).options(selectinload(User.roles))
+
+async def login_user(session: AsyncSession, data: LoginIn, background: BackgroundTasks | None = None) -> TokenOut:
+    user = (await session.execute(login_stmt(data.email))).scalar_one_or_none()
+
+    if not user or not user.password_hash or not await run_hash(verify_password, data.password, user.password_hash):
         raise ValueError("Invalid credentials")
 
+    if background is not None and password_needs_rehash(user.password_hash):
+        background.add_task(rehash_password, user.id, data.password, user.password_hash)
+
     access = create_access_token(str(user.id), [r.code for r in user.roles])
-    refresh = create_refresh_token(str(user.id))
-    s = Session(
-        user_id=user.id,
-        refresh_token_hash=bcrypt.hash(refresh),
-        user_agent=None,
-        ip=None,
-        expires_at=dt.datetime.utcnow() + dt.timedelta(days=30),
-    )
-    session.add(s)
-    await session.commit()
+    refresh, rec = _new_session(user.id)
+    store = get_session_store()
+    await store.create(session, rec)
+    if store.transactional:
+        await session.commit()
+    audit("login", rec)
 
     return TokenOut(access_token=access, refresh_token=refresh, user=UserOut.model_validate(user))
+
+def _as_utc(ts: dt.datetime) -> dt.datetime:
+    return ts if ts.tzinfo else ts.replace(tzinfo=dt.timezone.utc)
+
+def _decode_refresh(token: str, verify_exp: bool = True) -> tuple[uuid.UUID, uuid.UUID]:
+    """Returns (user_id, session_id) from a refresh token or raises ValueError."""
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": verify_exp})
+        if claims.get("type") != "refresh" or not claims.get("sid"):
+            raise ValueError("Invalid refresh token")
+        return uuid.UUID(claims["sub"]), uuid.UUID(claims["sid"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise ValueError("Invalid refresh token")
+
+async def refresh_session(session: AsyncSession, token: str) -> TokenOut:
+    """Rotate the session's refresh token and mint a new access token."""
+    user_id, sid = _decode_refresh(token)
+    store = get_session_store()
+    rec = await store.get(session, sid)
+    if rec is None or rec.user_id != user_id or _as_utc(rec.expires_at) <= dt.datetime.now(dt.timezone.utc):
+        raise ValueError("Session expired or revoked")
+    if not await verify_refresh_token(token, rec.refresh_token_hash):
+        # a superseded refresh token was replayed: treat the session as stolen
+        await store.revoke(session, sid)
+        if store.transactional:
+            await session.commit()
+        audit("refresh_reuse", rec)
+        raise ValueError("Session expired or revoked")
+
+    status = await get_user_status(user_id)
+    if not status.exists or not status.is_active:
+        raise ValueError("User is inactive")
+
+    new_refresh = create_refresh_token(str(user_id), str(sid))
+    if not await store.rotate(session, sid, rec.refresh_token_hash, hash_refresh_token(new_refresh)):
+        raise ValueError("Session expired or revoked")
+    if store.transactional:
+        await session.commit()
+    audit("refresh", rec)
+    return TokenOut(access_token=create_access_token(str(user_id), list(status.roles)), refresh_token=new_refresh)
+
+async def logout_session(session: AsyncSession, token: str) -> None:
+    # an expired refresh token can still end its session
+    user_id, sid = _decode_refresh(token, verify_exp=False)
+    store = get_session_store()
+    rec = await store.get(session, sid)
+    if rec is None or rec.user_id != user_id:
+        return
+    await store.revoke(session, sid)
+    if store.transactional:
+        await session.commit()
+    audit("logout", rec)
+
+
+async def revoke_access_token(token: str) -> None:
+    """Deny an access token until its exp; raises ValueError for tokens we didn't issue."""
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+    except JWTError:
+        raise ValueError("Invalid token")
+    if claims.get("type") == "refresh":
+        raise ValueError("Use /auth/logout to end a refresh session")
+    jti, exp = claims.get("jti"), claims.get("exp")
+    if jti and exp:   # tokens minted before jti existed simply expire
+        await revoke(jti, int(exp))
+
+
+async def deactivate_user(session: AsyncSession, user_id: uuid.UUID) -> bool:
+    """Mark a user inactive; every worker refuses their tokens and refreshes from then on. False if unknown."""
+    res = await session.execute(update(User).where(User.id == user_id).values(is_active=False))
+    await session.commit()
+    if not res.rowcount:
+        return False
+    await invalidate_user(user_id)
+    return True
+
+
+async def delete_user(session: AsyncSession, user_id: uuid.UUID) -> bool:
+    """Delete a user with their role links and database sessions (ON DELETE CASCADE). False if unknown."""
+    res = await session.execute(delete(User).where(User.id == user_id))
+    await session.commit()
+    if not res.rowcount:
+        return False
+    await invalidate_user(user_id)
+    return True
@@ -0,0 +1,108 @@
+# src/auth/password_cost.py
+"""
+Pick password-hash parameters that hit a target verify time on this machine.
+
+    python -m src.auth.password_cost --target-ms 250              # bcrypt
+    python -m src.auth.password_cost --scheme argon2 --target-ms 250
+
+prints the env vars to set (BCRYPT_ROUNDS / ARGON2_*). With PASSWORD_CALIBRATE_ON_STARTUP=1
+each worker calibrates itself at startup instead, and may only raise the configured cost.
+Prefer the CLI when workers run on mixed hardware: a hash is rewritten only when its cost is
+below the target, so logins on the faster workers keep upgrading hashes the slower ones made.
+"""
+import argparse
+import logging
+import os
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+from .basemodels import pwd_ctx, password_context_settings, run_hash, ARGON2_MEMORY_KIB, ARGON2_TIME_COST, BCRYPT_ROUNDS
+
+log = logging.getLogger("auth.password_cost")
+
+TARGET_MS = float(os.getenv("PASSWORD_TARGET_MS", "250"))
+CALIBRATE_ON_STARTUP = os.getenv("PASSWORD_CALIBRATE_ON_STARTUP", "0") in ("1", "true", "True")
+_PROBE = "calibration-probe-Passw0rd!"
+
+
+def time_verify(settings: dict, samples: int = 3) -> float:
+    """Median seconds for one verify under `settings` (verify costs the same as hash)."""
+    ctx = CryptContext(**settings)
+    h = ctx.hash(_PROBE)
+    times = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        ctx.verify(_PROBE, h)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def calibrate(scheme: str = "bcrypt", target_ms: float = TARGET_MS, memory_kib: int = ARGON2_MEMORY_KIB) -> dict:
+    """
+    Largest cost whose verify time stays <= target (never below the floor).
+    bcrypt: walk rounds 10..16 (each step doubles the time).
+    argon2: fixed memory, walk time_cost 1..10.
+    """
+    target = target_ms / 1000
+    if scheme == "bcrypt":
+        best = {"bcrypt_rounds": 10}
+        for rounds in range(10, 17):
+            t = time_verify(password_context_settings("bcrypt", bcrypt_rounds=rounds))
+            log.info("bcrypt rounds=%s verify=%.1fms", rounds, t * 1000)
+            if t > target:
+                break
+            best = {"bcrypt_rounds": rounds, "verify_ms": round(t * 1000, 1)}
+        return best
+    if scheme == "argon2":
+        best = {"argon2_time_cost": 1, "argon2_memory_kib": memory_kib}
+        for cost in range(1, 11):
+            t = time_verify(password_context_settings("argon2", argon2_time_cost=cost, argon2_memory_kib=memory_kib))
+            log.info("argon2 time_cost=%s memory=%sKiB verify=%.1fms", cost, memory_kib, t * 1000)
+            if t > target:
+                break
+            best = {"argon2_time_cost": cost, "argon2_memory_kib": memory_kib, "verify_ms": round(t * 1000, 1)}
+        return best
+    raise ValueError(f"Unsupported scheme: {scheme}")
+
+
+def apply(scheme: str, params: dict) -> None:
+    """
+    Reload the shared context in place (hash_password / verify_password pick it up immediately).
+    The cost never drops below the configured one: a slow machine keeps BCRYPT_ROUNDS /
+    ARGON2_TIME_COST rather than weakening new hashes.
+    """
+    kw = {k: v for k, v in params.items() if k != "verify_ms"}
+    if "bcrypt_rounds" in kw:
+        kw["bcrypt_rounds"] = max(kw["bcrypt_rounds"], BCRYPT_ROUNDS)
+    if "argon2_time_cost" in kw:
+        kw["argon2_time_cost"] = max(kw["argon2_time_cost"], ARGON2_TIME_COST)
+    pwd_ctx.load(password_context_settings(scheme, **kw))
+
+
+async def calibrate_on_startup() -> None:
+    if not CALIBRATE_ON_STARTUP:
+        return
+    scheme = os.getenv("PASSWORD_SCHEME", "bcrypt")
+    params = await run_hash(calibrate, scheme, TARGET_MS)
+    apply(scheme, params)
+    log.info("password hashing calibrated: scheme=%s %s", scheme, params)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Calibrate password hashing cost")
+    ap.add_argument("--scheme", choices=("bcrypt", "argon2"), default="bcrypt")
+    ap.add_argument("--target-ms", type=float, default=TARGET_MS)
+    ap.add_argument("--memory-kib", type=int, default=ARGON2_MEMORY_KIB, help="argon2 only")
+    args = ap.parse_args()
+    params = calibrate(args.scheme, args.target_ms, args.memory_kib)
+    print(f"PASSWORD_SCHEME={args.scheme}")
+    for k, v in params.items():
+        if k != "verify_ms":
+            print(f"{k.upper()}={v}")
+    print(f"# measured verify time: {params.get('verify_ms', '> target at minimum cost')} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# src/auth/session_cleanup.py
+"""
+Background upkeep for the `sessions` table.
+
+- Deletes expired rows in small batches (SKIP LOCKED, one short transaction per
+  batch, pause between batches) so cleanup never holds long locks or floods WAL.
+- The table is partitioned by month of expires_at (migration a4e19c7d2b58): creates
+  the monthly partitions out to the longest refresh lifetime and drops months whose
+  sessions have all expired. Rows that landed in the DEFAULT partition (say after
+  REFRESH_DAYS was raised) move into their month when it is created.
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+
+from lib.db.postgres import engine
+from .basemodels import REFRESH_DAYS
+
+log = logging.getLogger("auth.session_cleanup")
+
+INTERVAL = float(os.getenv("SESSION_CLEANUP_INTERVAL_SECONDS", "300"))
+BATCH_SIZE = int(os.getenv("SESSION_CLEANUP_BATCH_SIZE", "1000"))
+BATCH_PAUSE = float(os.getenv("SESSION_CLEANUP_BATCH_PAUSE_SECONDS", "0.05"))
+MAX_BATCHES = int(os.getenv("SESSION_CLEANUP_MAX_BATCHES", "500"))   # per run
+# far enough that a session created today has its month: expires_at <= today + REFRESH_DAYS
+PARTITION_MONTHS_AHEAD = max(3, math.ceil(REFRESH_DAYS / 28) + 1)
+DEFAULT_PARTITION = "sessions_default"
+
+_DELETE_BATCH = text("""
+    DELETE FROM sessions WHERE id IN (
+        SELECT id FROM sessions
+        WHERE expires_at < now()
+        ORDER BY expires_at
+        LIMIT :n
+        FOR UPDATE SKIP LOCKED
+    )
+""")
+_IS_PARTITIONED = text("""
+    SELECT EXISTS (
+        SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid
+        WHERE c.relname = 'sessions'
+    )
+""")
+_PARTITIONS = text("""
+    SELECT c.relname FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    WHERE p.relname = 'sessions'
+""")
+_PARTITION_RE = re.compile(r"^sessions_y(\d{4})m(\d{2})$")
+
+_task: asyncio.Task | None = None
+
+
+def _month(d: date, offset: int) -> date:
+    y, m = divmod(d.month - 1 + offset, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def upcoming_months(today: date) -> list[date]:
+    """First day of this month and of the next PARTITION_MONTHS_AHEAD months."""
+    this_month = today.replace(day=1)
+    return [_month(this_month, i) for i in range(PARTITION_MONTHS_AHEAD + 1)]
+
+
+def partition_name(m: date) -> str:
+    return f"sessions_y{m.year}m{m.month:02d}"
+
+
+async def purge_expired_sessions(batch_size: int = BATCH_SIZE, max_batches: int = MAX_BATCHES) -> int:
+    total = 0
+    for _ in range(max_batches):
+        async with engine.begin() as conn:
+            deleted = (await conn.execute(_DELETE_BATCH, {"n": batch_size})).rowcount or 0
+        total += deleted
+        if deleted < batch_size:
+            break
+        await asyncio.sleep(BATCH_PAUSE)
+    return total
+
+
+async def maintain_partitions() -> None:
+    async with engine.begin() as conn:
+        if not (await conn.execute(_IS_PARTITIONED)).scalar():
+            return
+        existing = set((await conn.execute(_PARTITIONS)).scalars())
+        for m in upcoming_months(date.today()):
+            name = partition_name(m)
+            if name in existing:
+                continue
+            lo, hi = m.isoformat(), _month(m, 1).isoformat()
+            if DEFAULT_PARTITION not in existing:
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF sessions FOR VALUES FROM ('{lo}') TO ('{hi}')"
+                ))
+                continue
+            # attaching checks the default partition holds nothing of this month, so move those rows first
+            await conn.execute(text(f"CREATE TABLE {name} (LIKE sessions INCLUDING DEFAULTS)"))
+            await conn.execute(text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE expires_at >= '{lo}' AND expires_at < '{hi}' "
+                f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+            ))
+            await conn.execute(text(f"ALTER TABLE sessions ATTACH PARTITION {name} FOR VALUES FROM ('{lo}') TO ('{hi}')"))
+        now = datetime.now(timezone.utc).date()
+        for name in existing:
+            match = _PARTITION_RE.match(name)
+            if match and _month(date(int(match[1]), int(match[2]), 1), 1) <= now:
+                # every row in it has expires_at < upper bound <= today
+                await conn.execute(text(f"DROP TABLE {name}"))
+                log.info("dropped expired session partition %s", name)
+
+
+async def _run() -> None:
+    while True:
+        try:
+            await maintain_partitions()
+            n = await purge_expired_sessions()
+            if n:
+                log.info("purged %s expired sessions", n)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("session cleanup failed: %s", e)
+        await asyncio.sleep(INTERVAL)
+
+
+async def start_session_cleanup() -> None:
+    global _task
+    if _task is None and INTERVAL > 0:
+        _task = asyncio.create_task(_run())
+
+
+async def stop_session_cleanup() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
@@ -0,0 +1,284 @@
+# src/auth/session_store.py
+"""
+Where refresh-token sessions live.
+
+SESSION_STORE=postgres (default) keeps them in the `sessions` table and writes through
+the request's AsyncSession (the caller commits). SESSION_STORE=redis keeps each session
+in a Redis hash with a native TTL plus a per-user sorted set for the per-user cap, so
+login / refresh / logout need no Postgres write at all. With SESSION_AUDIT=1 every
+session event is also queued and written to `session_audit` in batches in the background.
+"""
+import abc
+import asyncio
+import datetime as dt
+import logging
+import os
+import uuid
+from typing import NamedTuple
+
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from lib.db.postgres import engine
+from lib.observability.metrics import REGISTRY
+from lib.redis.index import get_client
+from src.models import Session, SessionAudit
+
+log = logging.getLogger("auth.session_store")
+
+SESSION_STORE = os.getenv("SESSION_STORE", "postgres")
+# Oldest sessions beyond this many per user are evicted on login (0 disables the cap).
+SESSION_MAX_PER_USER = int(os.getenv("SESSION_MAX_PER_USER", "10"))
+REDIS_PREFIX = os.getenv("SESSION_REDIS_PREFIX", "sess")
+
+AUDIT_ENABLED = os.getenv("SESSION_AUDIT", "0") in ("1", "true", "True")
+AUDIT_QUEUE_MAX = int(os.getenv("SESSION_AUDIT_QUEUE_MAX", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("SESSION_AUDIT_BATCH_SIZE", "500"))
+AUDIT_LINGER = float(os.getenv("SESSION_AUDIT_LINGER_SECONDS", "1.0"))
+
+
+class SessionRecord(NamedTuple):
+    id: uuid.UUID
+    user_id: uuid.UUID
+    refresh_token_hash: str
+    user_agent: str | None
+    ip: str | None
+    expires_at: dt.datetime
+
+
+class SessionStore(abc.ABC):
+    # True => writes go through the caller's AsyncSession and the caller must commit.
+    transactional = False
+
+    @abc.abstractmethod
+    async def create(self, db: AsyncSession, rec: SessionRecord, enforce_cap: bool = True) -> None: ...
+
+    @abc.abstractmethod
+    async def get(self, db: AsyncSession, sid: uuid.UUID) -> SessionRecord | None: ...
+
+    @abc.abstractmethod
+    async def rotate(self, db: AsyncSession, sid: uuid.UUID, old_hash: str, new_hash: str) -> bool:
+        """Compare-and-set the refresh hash; False if the session is gone or was rotated already."""
+
+    @abc.abstractmethod
+    async def revoke(self, db: AsyncSession, sid: uuid.UUID) -> None: ...
+
+
+class PostgresSessionStore(SessionStore):
+    transactional = True
+
+    async def create(self, db: AsyncSession, rec: SessionRecord, enforce_cap: bool = True) -> None:
+        await db.execute(insert(Session).values(**rec._asdict()))
+        if enforce_cap and SESSION_MAX_PER_USER > 0:
+            overflow = (
+                select(Session.id)
+                .where(Session.user_id == rec.user_id)
+                .order_by(Session.created_at.desc(), Session.id.desc())
+                .offset(SESSION_MAX_PER_USER)
+            )
+            await db.execute(
+                delete(Session).where(Session.id.in_(overflow)).execution_options(synchronize_session=False)
+            )
+
+    async def get(self, db: AsyncSession, sid: uuid.UUID) -> SessionRecord | None:
+        row = (
+            await db.execute(
+                select(Session.id, Session.user_id, Session.refresh_token_hash, Session.user_agent,
+                       Session.ip, Session.expires_at).where(Session.id == sid)
+            )
+        ).one_or_none()
+        return SessionRecord(*row) if row else None
+
+    async def rotate(self, db: AsyncSession, sid: uuid.UUID, old_hash: str, new_hash: str) -> bool:
+        res = await db.execute(
+            update(Session)
+            .where(Session.id == sid, Session.refresh_token_hash == old_hash)
+            .values(refresh_token_hash=new_hash)
+            .execution_options(synchronize_session=False)
+        )
+        return res.rowcount == 1
+
+    async def revoke(self, db: AsyncSession, sid: uuid.UUID) -> None:
+        await db.execute(delete(Session).where(Session.id == sid).execution_options(synchronize_session=False))
+
+
+# KEYS: session hash, user index | ARGV: sid, expires_ms, now_ms, cap, prefix, field/value pairs...
+_CREATE_LUA = """
+redis.call('HSET', KEYS[1], unpack(ARGV, 6))
+redis.call('PEXPIREAT', KEYS[1], ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+local cap = tonumber(ARGV[4])
+if cap > 0 then
+  local extra = redis.call('ZCARD', KEYS[2]) - cap
+  if extra > 0 then
+    local old = redis.call('ZPOPMIN', KEYS[2], extra)
+    for i = 1, #old, 2 do redis.call('DEL', ARGV[5] .. ':' .. old[i]) end
+  end
+end
+redis.call('PEXPIREAT', KEYS[2], ARGV[2])
+return 1
+"""
+# KEYS: session hash | ARGV: old hash, new hash
+_ROTATE_LUA = """
+if redis.call('HGET', KEYS[1], 'refresh_token_hash') == ARGV[1] then
+  redis.call('HSET', KEYS[1], 'refresh_token_hash', ARGV[2])
+  return 1
+end
+return 0
+"""
+# KEYS: session hash | ARGV: sid, prefix
+_REVOKE_LUA = """
+local uid = redis.call('HGET', KEYS[1], 'user_id')
+redis.call('DEL', KEYS[1])
+if uid then redis.call('ZREM', ARGV[2] .. ':user:' .. uid, ARGV[1]) end
+return 1
+"""
+
+
+class RedisSessionStore(SessionStore):
+    transactional = False
+
+    def __init__(self, prefix: str = REDIS_PREFIX):
+        self.prefix = prefix
+        self._scripts: dict[str, object] = {}
+
+    async def _script(self, name: str, src: str):
+        script = self._scripts.get(name)
+        if script is None:
+            script = self._scripts[name] = (await get_client()).register_script(src)
+        return script
+
+    def _key(self, sid) -> str:
+        return f"{self.prefix}:{sid}"
+
+    def _user_key(self, user_id) -> str:
+        return f"{self.prefix}:user:{user_id}"
+
+    async def create(self, db: AsyncSession, rec: SessionRecord, enforce_cap: bool = True) -> None:
+        expires_ms = int(rec.expires_at.timestamp() * 1000)
+        fields = ["user_id", str(rec.user_id), "refresh_token_hash", rec.refresh_token_hash,
+                  "user_agent", rec.user_agent or "", "ip", rec.ip or "", "expires_at", str(expires_ms)]
+        script = await self._script("create", _CREATE_LUA)
+        await script(
+            keys=[self._key(rec.id), self._user_key(rec.user_id)],
+            args=[str(rec.id), expires_ms, int(dt.datetime.now(dt.timezone.utc).timestamp() * 1000),
+                  SESSION_MAX_PER_USER if enforce_cap else 0, self.prefix, *fields],
+        )
+
+    async def get(self, db: AsyncSession, sid: uuid.UUID) -> SessionRecord | None:
+        h = await (await get_client()).hgetall(self._key(sid))
+        if not h:
+            return None
+        return SessionRecord(
+            id=sid,
+            user_id=uuid.UUID(h["user_id"]),
+            refresh_token_hash=h["refresh_token_hash"],
+            user_agent=h.get("user_agent") or None,
+            ip=h.get("ip") or None,
+            expires_at=dt.datetime.fromtimestamp(int(h["expires_at"]) / 1000, dt.timezone.utc),
+        )
+
+    async def rotate(self, db: AsyncSession, sid: uuid.UUID, old_hash: str, new_hash: str) -> bool:
+        script = await self._script("rotate", _ROTATE_LUA)
+        return bool(await script(keys=[self._key(sid)], args=[old_hash, new_hash]))
+
+    async def revoke(self, db: AsyncSession, sid: uuid.UUID) -> None:
+        script = await self._script("revoke", _REVOKE_LUA)
+        await script(keys=[self._key(sid)], args=[str(sid), self.prefix])
+
+
+_store: SessionStore | None = None
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        if SESSION_STORE == "redis":
+            _store = RedisSessionStore()
+        elif SESSION_STORE == "postgres":
+            _store = PostgresSessionStore()
+        else:
+            raise ValueError(f"Unknown SESSION_STORE: {SESSION_STORE}")
+    return _store
+
+
+# ---------- audit write-behind ----------
+
+AUDIT_DROPPED = REGISTRY.counter("session_audit_dropped_total", "Audit records dropped because the queue was full.").labels()
+
+_audit_queue: asyncio.Queue | None = None
+_audit_task: asyncio.Task | None = None
+
+
+def audit(event: str, rec: SessionRecord) -> None:
+    """Queue one audit row; never blocks the request (drops and counts when the queue is full)."""
+    if _audit_queue is None:
+        return
+    try:
+        _audit_queue.put_nowait({
+            "session_id": rec.id, "user_id": rec.user_id, "event": event,
+            "ip": rec.ip, "user_agent": rec.user_agent,
+            "occurred_at": dt.datetime.now(dt.timezone.utc),
+        })
+    except asyncio.QueueFull:
+        AUDIT_DROPPED.value += 1
+
+
+async def _flush(batch: list[dict]) -> None:
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(insert(SessionAudit), batch)
+    except Exception as e:
+        log.warning("dropping %s session audit rows: %s", len(batch), e)
+
+
+async def _audit_writer() -> None:
+    q = _audit_queue
+    loop = asyncio.get_running_loop()
+    batch: list[dict] = []
+    try:
+        while True:
+            batch.append(await q.get())
+            deadline = loop.time() + AUDIT_LINGER
+            while len(batch) < AUDIT_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(q.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await _flush(batch)
+            batch = []
+    except asyncio.CancelledError:
+        # records already taken off the queue are no longer seen by stop_audit_writer's drain;
+        # a flush cut short rolled back, so writing the batch again does not duplicate it
+        if batch:
+            await _flush(batch)
+        raise
+
+
+async def start_audit_writer() -> None:
+    global _audit_queue, _audit_task
+    if AUDIT_ENABLED and _audit_task is None:
+        _audit_queue = asyncio.Queue(maxsize=AUDIT_QUEUE_MAX)
+        _audit_task = asyncio.create_task(_audit_writer())
+
+
+async def stop_audit_writer() -> None:
+    """Stop accepting records and flush whatever is still queued."""
+    global _audit_queue, _audit_task
+    if _audit_task is None:
+        return
+    task, q, _audit_queue, _audit_task = _audit_task, _audit_queue, None, None
+    task.cancel()
+    try:
+        await task      # lets the writer flush the batch it was holding
+    except asyncio.CancelledError:
+        pass
+    pending = []
+    while not q.empty():
+        pending.append(q.get_nowait())
+    for i in range(0, len(pending), AUDIT_BATCH_SIZE):
+        await _flush(pending[i:i + AUDIT_BATCH_SIZE])
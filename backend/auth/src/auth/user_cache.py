@@ -0,0 +1,151 @@
+# src/auth/user_cache.py
+"""
+Per-worker cache of user status (exists / is_active / role codes) for token introspection.
+
+Entries live for USER_CACHE_TTL_SECONDS (missing users for USER_CACHE_NEGATIVE_TTL_SECONDS).
+Any worker that deactivates or deletes a user calls `invalidate_user`, which drops the local
+entry and publishes the id on Redis so every other worker drops it too. The TTL is only the
+fallback for changes made outside the service; a worker whose listener loses Redis clears
+its whole cache, since it may have missed messages.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import NamedTuple
+from uuid import UUID
+
+from sqlalchemy import select
+
+from lib.db.postgres import get_read_session
+from lib.observability.metrics import CacheStats
+from lib.redis.index import get_client
+from src.models import User, Role, user_roles
+
+log = logging.getLogger("auth.user_cache")
+
+TTL = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+NEGATIVE_TTL = float(os.getenv("USER_CACHE_NEGATIVE_TTL_SECONDS", "5"))
+MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "100000"))
+INVALIDATE_CHANNEL = os.getenv("USER_CACHE_CHANNEL", "auth:user-invalidate")
+
+
+class UserStatus(NamedTuple):
+    exists: bool
+    is_active: bool
+    roles: tuple[str, ...]
+
+
+MISSING = UserStatus(False, False, ())
+
+_entries: dict[UUID, tuple[float, UserStatus]] = {}
+_inflight: dict[UUID, asyncio.Future] = {}
+_stats = CacheStats("user_status")
+_listener: asyncio.Task | None = None
+
+
+def status_stmt(user_id: UUID):
+    return (
+        select(User.is_active, Role.code)
+        .outerjoin(user_roles, user_roles.c.user_id == User.id)
+        .outerjoin(Role, Role.id == user_roles.c.role_id)
+        .where(User.id == user_id)
+    )
+
+
+async def _load(user_id: UUID) -> UserStatus:
+    stmt = status_stmt(user_id)
+    async with asynccontextmanager(get_read_session)() as session:
+        rows = (await session.execute(stmt)).all()
+    if not rows:
+        return MISSING
+    return UserStatus(True, rows[0].is_active, tuple(r.code for r in rows if r.code))
+
+
+def _store(user_id: UUID, status: UserStatus) -> None:
+    if len(_entries) >= MAX_ENTRIES and user_id not in _entries:
+        _entries.pop(next(iter(_entries)))   # oldest insertion first
+    _entries[user_id] = (time.monotonic() + (TTL if status.exists else NEGATIVE_TTL), status)
+
+
+async def get_user_status(user_id: UUID) -> UserStatus:
+    hit = _entries.get(user_id)
+    if hit is not None and hit[0] > time.monotonic():
+        _stats.hits.value += 1
+        return hit[1]
+    _stats.misses.value += 1
+
+    # single-flight: concurrent misses for the same user share one query
+    pending = _inflight.get(user_id)
+    if pending is not None:
+        return await pending
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[user_id] = fut
+    try:
+        status = await _load(user_id)
+        _store(user_id, status)
+        fut.set_result(status)
+        return status
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()   # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        _inflight.pop(user_id, None)
+
+
+def forget_user(user_id: UUID) -> None:
+    _entries.pop(user_id, None)
+
+
+async def invalidate_user(user_id: UUID) -> None:
+    """Call after deactivating / deleting a user (or changing their roles), once that has committed."""
+    forget_user(user_id)
+    try:
+        r = await get_client()
+        await r.publish(INVALIDATE_CHANNEL, str(user_id))
+    except Exception as e:
+        log.warning("user cache invalidation publish failed for %s: %s", user_id, e)
+
+
+async def _listen() -> None:
+    backoff = 0.5
+    while True:
+        try:
+            r = await get_client()
+            # closed on every way out, so a reconnect doesn't leave the old connection behind
+            async with r.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATE_CHANNEL)
+                backoff = 0.5
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "message":
+                        continue
+                    try:
+                        forget_user(UUID(msg["data"]))
+                    except ValueError:
+                        pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # invalidations published while we're disconnected are lost; drop everything to be safe
+            log.warning("user cache invalidation listener error: %s", e)
+            _entries.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+async def start_invalidation_listener() -> None:
+    global _listener
+    if _listener is None:
+        _listener = asyncio.create_task(_listen())
+
+
+async def stop_invalidation_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        _listener = None
@@ -0,0 +1,47 @@
+# src/auth/warmup.py
+"""What "warm" means for auth: pooled + primed DB connections, role ids, JWT keys, hash backend."""
+import os
+from uuid import UUID
+
+from jose import jwt
+
+from lib.db.postgres import engine, read_engines, SessionLocal
+from lib.lifecycle.index import start_warmup, warm_pool
+from .basemodels import create_access_token, hash_password, verify_password, run_hash, SECRET_KEY, ALGORITHM
+from .module import get_role_id, login_stmt, remember_role_id
+from .user_cache import status_stmt
+
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "4"))
+
+_NIL = UUID(int=0)
+
+
+async def _prime_statements(session) -> None:
+    # same statement shapes as the login and introspection paths; they match nothing
+    await session.execute(login_stmt("warmup@invalid.invalid"))
+    await session.execute(status_stmt(_NIL))
+
+
+async def _db() -> None:
+    for e in (engine, *read_engines):
+        await warm_pool(e, WARMUP_DB_CONNECTIONS, _prime_statements)
+
+
+async def _roles() -> None:
+    async with SessionLocal() as session:
+        rid = await get_role_id(session, "customer")
+        await session.commit()
+    remember_role_id("customer", rid)
+
+
+async def _keys() -> None:
+    jwt.decode(create_access_token(str(_NIL), []), SECRET_KEY, algorithms=[ALGORITHM])
+
+
+async def _hash() -> None:
+    # loads the passlib backend and starts a hashing thread at the current cost
+    await run_hash(verify_password, "warmup", await run_hash(hash_password, "warmup"))
+
+
+async def start_auth_warmup() -> None:
+    await start_warmup([("db", _db), ("roles", _roles), ("keys", _keys), ("hash", _hash)])
@@ -1,5 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from lib.redis.index import ping as redis_ping
+from lib.lifecycle.index import warmup_status
 
 router = APIRouter()
 
@@ -8,8 +9,12 @@ async def live():
     return {"live": True}
 
 @router.get("/ready")
-async def ready():
-    return {"ready": True}
+async def ready(response: Response):
+    # 503 until the startup warm-up has finished (and again once shutdown begins)
+    status = warmup_status()
+    if not status["ready"]:
+        response.status_code = 503
+    return status
 
 @router.get("/deep")
 async def deep():
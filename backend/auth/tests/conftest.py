@@ -0,0 +1,55 @@
+"""
+Tests run against SQLite (aiosqlite) and fakeredis, the same stand-ins bench/asgi_bench.py
+uses, so they need no Postgres or Redis server:
+
+    cd backend/auth && python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest_asyncio
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+_workdir = Path(tempfile.mkdtemp(prefix="auth-tests-"))
+# before anything imports lib.db.postgres, which builds its engines at import time
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_workdir / 'auth.db'}"
+os.environ.pop("DATABASE_READ_URLS", None)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")      # the minimum; hashing cost isn't under test
+sys.path.insert(0, str(SERVICE_DIR))
+
+
+@pytest_asyncio.fixture
+async def redis(monkeypatch):
+    """A fakeredis client installed as the shared client returned by lib.redis.index.get_client."""
+    import fakeredis
+    import lib.redis.index as redis_index
+
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis_index, "_client", client)
+    yield client
+    await client.flushall()
+    await client.aclose()
+
+
+@pytest_asyncio.fixture
+async def db():
+    """A fresh schema per test; yields the session factory."""
+    from sqlalchemy.dialects.postgresql import INET
+    from sqlalchemy.ext.compiler import compiles
+    from lib.db.postgres import Base, SessionLocal, engine
+    import src.models  # noqa: F401
+
+    @compiles(INET, "sqlite")
+    def _inet_sqlite(type_, compiler, **kw):
+        return "VARCHAR"
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield SessionLocal
+    # pooled aiosqlite connections belong to this test's event loop
+    await engine.dispose()
+
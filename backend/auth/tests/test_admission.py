@@ -0,0 +1,65 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from starlette.requests import Request
+
+from lib.ratelimit.index import ConcurrencyLimiter, SlidingWindowLimiter
+from src.auth import admission, index
+
+
+def _request(**headers) -> Request:
+    raw = [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": raw, "client": ("10.0.0.9", 4321)})
+
+
+def test_proxy_headers_are_ignored_by_default(monkeypatch):
+    monkeypatch.setattr(admission, "TRUST_PROXY_HEADERS", False)
+    req = _request(x_real_ip="1.2.3.4", x_forwarded_for="5.6.7.8")
+    assert admission.client_ip(req) == "10.0.0.9"
+
+
+def test_trusted_proxy_headers_use_the_hop_nginx_added(monkeypatch):
+    monkeypatch.setattr(admission, "TRUST_PROXY_HEADERS", True)
+    assert admission.client_ip(_request(x_real_ip="1.2.3.4", x_forwarded_for="6.6.6.6, 1.2.3.4")) == "1.2.3.4"
+    # a client-supplied first entry never wins
+    assert admission.client_ip(_request(x_forwarded_for="6.6.6.6, 7.7.7.7, 1.2.3.4")) == "1.2.3.4"
+    assert admission.client_ip(_request(x_forwarded_for="1.2.3.4")) == "1.2.3.4"
+    assert admission.client_ip(_request()) == "10.0.0.9"
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(index.router, prefix="/auth")
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_per_ip_limit_answers_429_with_retry_after(db, redis, monkeypatch, client):
+    monkeypatch.setattr(index, "login_per_ip", SlidingWindowLimiter("test_login_ip", 2, 60))
+    monkeypatch.setattr(index, "login_per_email", SlidingWindowLimiter("test_login_email", 100, 60))
+    body = {"email": "nobody@example.com", "password": "pw-123456"}
+    async with client:
+        statuses = []
+        for _ in range(3):
+            r = await client.post("/auth/login", json=body)
+            statuses.append(r.status_code)
+    assert statuses[2] == 429 and 429 not in statuses[:2]
+    assert 1 <= int(r.headers["retry-after"]) <= 60
+
+
+@pytest.mark.asyncio
+async def test_full_login_queue_answers_503_with_retry_after(redis, monkeypatch, client):
+    slots = ConcurrencyLimiter("test_login", limit=1, max_queue=1, queue_timeout=0.05, retry_after=7)
+    monkeypatch.setattr(index, "login_slots", slots)
+    monkeypatch.setattr(index, "login_per_ip", SlidingWindowLimiter("test_login_ip", 100, 60, enabled=False))
+    monkeypatch.setattr(index, "login_per_email", SlidingWindowLimiter("test_login_email", 100, 60, enabled=False))
+    body = {"email": "nobody@example.com", "password": "pw-123456"}
+    async with client, slots.slot():
+        # the slot is held: one request waits in the queue and times out, the others find it full
+        responses = await asyncio.gather(*(client.post("/auth/login", json=body) for _ in range(3)))
+    assert [r.status_code for r in responses] == [503] * 3
+    assert {r.headers["retry-after"] for r in responses} == {"7"}
+    assert slots._timeout.value == 1 and slots._full.value == 2
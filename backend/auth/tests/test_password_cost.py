@@ -0,0 +1,33 @@
+import pytest
+from passlib.context import CryptContext
+
+from src.auth import basemodels, password_cost
+from src.auth.basemodels import password_context_settings
+
+
+def _bcrypt(rounds: int) -> str:
+    return CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds).hash("s3cret")
+
+
+@pytest.fixture
+def restore_ctx():
+    saved = basemodels.pwd_ctx.to_string()
+    yield
+    basemodels.pwd_ctx.load(saved)
+
+
+@pytest.mark.parametrize("stored, rehash", [(5, True), (6, False), (7, False)])
+def test_only_hashes_below_the_target_cost_need_update(stored, rehash):
+    ctx = CryptContext(**password_context_settings("bcrypt", bcrypt_rounds=6))
+    assert ctx.needs_update(_bcrypt(stored)) is rehash
+
+
+def test_calibration_only_raises_the_cost(restore_ctx, monkeypatch):
+    monkeypatch.setattr(password_cost, "BCRYPT_ROUNDS", 6)
+    password_cost.apply("bcrypt", {"bcrypt_rounds": 5, "verify_ms": 1.0})
+    assert basemodels.hash_password("x").startswith("$2b$06$")
+
+    password_cost.apply("bcrypt", {"bcrypt_rounds": 7})
+    assert basemodels.hash_password("x").startswith("$2b$07$")
+    assert basemodels.password_needs_rehash(_bcrypt(6))
+    assert not basemodels.password_needs_rehash(_bcrypt(8))
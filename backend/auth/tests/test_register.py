@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import select
+
+from src.auth import module
+from src.auth.basemodels import RegisterIn
+from src.models import Role, User
+
+
+class _FailingStore:
+    transactional = True
+
+    async def create(self, db, rec, enforce_cap=True):
+        raise RuntimeError("session store down")
+
+
+@pytest.fixture(autouse=True)
+def no_cached_roles(monkeypatch):
+    monkeypatch.setattr(module, "_role_ids", {})
+
+
+@pytest.mark.asyncio
+async def test_role_id_is_cached_only_after_commit(db, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(module, "get_session_store", lambda: _FailingStore())
+        async with db() as session:
+            with pytest.raises(RuntimeError):
+                await module.register_user(session, RegisterIn(email="a@example.com", password="pw-123456"))
+    # the role upsert was rolled back with the registration; its id must not outlive it
+    assert module._role_ids == {}
+    async with db() as session:
+        assert (await session.execute(select(Role.id))).all() == []
+
+    async with db() as session:
+        out = await module.register_user(session, RegisterIn(email="b@example.com", password="pw-123456"))
+    async with db() as session:
+        role_id = (await session.execute(select(Role.id).where(Role.code == "customer"))).scalar_one()
+        assert (await session.execute(select(User.email))).scalars().all() == ["b@example.com"]
+    assert module._role_ids == {"customer": role_id}
+    assert out.user.email == "b@example.com"
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+from lib.security import revocation
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def empty_denylist(monkeypatch):
+    monkeypatch.setattr(revocation, "_revoked", {})
+
+
+@pytest.fixture
+def pubsubs(redis, monkeypatch):
+    """Every PubSub the listener opens, so the test can check they were all closed."""
+    opened = []
+    real = redis.pubsub
+
+    def tracking_pubsub(**kw):
+        ps = real(**kw)
+        opened.append(ps)
+        return ps
+
+    monkeypatch.setattr(redis, "pubsub", tracking_pubsub)
+    return opened
+
+
+async def _until(cond, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def _stop() -> None:
+    task = revocation._task
+    await revocation.stop_revocation_listener()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+async def test_revoke_persists_and_skips_expired_tokens(redis):
+    exp = int(time.time()) + 60
+    await revocation.revoke("live", exp)
+    await revocation.revoke("stale", int(time.time()) - 1)
+    assert revocation.is_revoked("live") and not revocation.is_revoked("stale")
+    assert not revocation.is_revoked(None)
+    assert await redis.zrange(revocation.ZSET_KEY, 0, -1, withscores=True) == [("live", exp)]
+
+
+async def test_listener_loads_snapshot_and_follows_the_channel(redis, pubsubs):
+    exp = int(time.time()) + 60
+    await redis.zadd(revocation.ZSET_KEY, {"before-start": exp})
+    await revocation.start_revocation_listener()
+    await _until(lambda: revocation.is_revoked("before-start"))
+
+    await redis.publish(revocation.CHANNEL, f"from-other-worker {exp}")     # another worker's revoke
+    await _until(lambda: revocation.is_revoked("from-other-worker"))
+    await _stop()
+    assert pubsubs and all(ps.connection is None for ps in pubsubs)
+
+
+async def test_reconnect_closes_the_previous_pubsub(redis, pubsubs, monkeypatch):
+    monkeypatch.setattr(revocation, "_load_snapshot", _fail_once(revocation._load_snapshot))
+    await revocation.start_revocation_listener()
+    await _until(lambda: len(pubsubs) == 2)        # first attempt failed, second one subscribed
+    assert pubsubs[0].connection is None
+    await _stop()
+    assert pubsubs[1].connection is None
+
+
+def _fail_once(fn):
+    calls = 0
+
+    async def wrapper(r):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionError("connection reset")
+        return await fn(r)
+    return wrapper
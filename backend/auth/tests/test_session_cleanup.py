@@ -0,0 +1,19 @@
+from datetime import date, timedelta
+
+import pytest
+
+from src.auth import session_cleanup
+from src.auth.basemodels import REFRESH_DAYS
+from src.models import Session
+
+
+@pytest.mark.parametrize("today", [date(2026, 1, 1), date(2026, 10, 19), date(2026, 12, 31)])
+def test_partitions_reach_past_the_longest_refresh_lifetime(today):
+    months = session_cleanup.upcoming_months(today)
+    assert months[0] == today.replace(day=1)
+    assert session_cleanup._month(months[-1], 1) > today + timedelta(days=REFRESH_DAYS)
+    assert session_cleanup.partition_name(months[0]) == f"sessions_y{today.year}m{today.month:02d}"
+
+
+def test_session_key_matches_the_partitioned_table():
+    assert [c.name for c in Session.__table__.primary_key] == ["id", "expires_at"]
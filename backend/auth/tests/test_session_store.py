@@ -0,0 +1,84 @@
+import asyncio
+import datetime as dt
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from src.auth import session_store as ss
+from src.auth.session_store import RedisSessionStore, SessionRecord, SessionStore
+from src.models import SessionAudit
+
+
+def _rec(user_id: uuid.UUID | None = None, days: float = 1) -> SessionRecord:
+    return SessionRecord(
+        id=uuid.uuid4(), user_id=user_id or uuid.uuid4(), refresh_token_hash=uuid.uuid4().hex,
+        user_agent="pytest", ip="127.0.0.1",
+        expires_at=(dt.datetime.now(dt.timezone.utc) + dt.timedelta(days=days)).replace(microsecond=0),
+    )
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+    class Partial(SessionStore):
+        async def create(self, db, rec, enforce_cap=True): ...
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+@pytest.fixture
+def store(redis):
+    return RedisSessionStore(prefix="sess-test")
+
+
+@pytest.mark.asyncio
+async def test_redis_store_round_trip(store, redis):
+    rec = _rec()
+    await store.create(None, rec)
+    assert await store.get(None, rec.id) == rec
+    assert 0 < await redis.pttl(store._key(rec.id)) <= 86_400_000
+
+    assert await store.rotate(None, rec.id, rec.refresh_token_hash, "next") is True
+    assert await store.rotate(None, rec.id, rec.refresh_token_hash, "again") is False   # reused token
+    assert (await store.get(None, rec.id)).refresh_token_hash == "next"
+
+    await store.revoke(None, rec.id)
+    assert await store.get(None, rec.id) is None
+    assert await redis.zcard(store._user_key(rec.user_id)) == 0
+    assert await store.rotate(None, rec.id, "next", "x") is False
+
+
+@pytest.mark.asyncio
+async def test_redis_store_caps_sessions_per_user(store, redis, monkeypatch):
+    monkeypatch.setattr(ss, "SESSION_MAX_PER_USER", 2)
+    user_id = uuid.uuid4()
+    recs = [_rec(user_id, days=1 + i) for i in range(3)]
+    for rec in recs:
+        await store.create(None, rec)
+    assert await store.get(None, recs[0].id) is None        # oldest evicted
+    assert [await store.get(None, r.id) for r in recs[1:]] == recs[1:]
+
+    extra = _rec(user_id, days=10)
+    await store.create(None, extra, enforce_cap=False)
+    assert await redis.zcard(store._user_key(user_id)) == 3
+
+
+@pytest.mark.asyncio
+async def test_audit_writer_flushes_held_batch_on_stop(db, monkeypatch):
+    monkeypatch.setattr(ss, "AUDIT_ENABLED", True)
+    monkeypatch.setattr(ss, "AUDIT_LINGER", 60.0)      # the writer is still collecting when stopped
+    await ss.start_audit_writer()
+    recs = [_rec() for _ in range(3)]
+    for rec in recs:
+        ss.audit("login", rec)
+    await asyncio.sleep(0.05)                          # taken off the queue, not yet written
+    assert ss._audit_queue.empty()
+    await ss.stop_audit_writer()
+    ss.audit("login", _rec())                          # ignored once stopped
+
+    async with db() as session:
+        rows = (await session.execute(select(SessionAudit.session_id, SessionAudit.event))).all()
+    assert sorted(rows) == sorted((r.id, "login") for r in recs)
@@ -0,0 +1,150 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from src.auth import module, user_cache
+from src.auth.basemodels import create_access_token
+from src.auth.user_cache import MISSING, UserStatus
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Stub _load: records each query and answers from `users`."""
+    calls, users = [], {}
+
+    async def load(user_id):
+        calls.append(user_id)
+        await asyncio.sleep(0.01)
+        return users.get(user_id, MISSING)
+
+    monkeypatch.setattr(user_cache, "_load", load)
+    monkeypatch.setattr(user_cache, "_entries", {})
+    return calls, users
+
+
+async def test_concurrent_misses_share_one_query(loads):
+    calls, users = loads
+    uid = uuid.uuid4()
+    users[uid] = UserStatus(True, True, ("customer",))
+    results = await asyncio.gather(*(user_cache.get_user_status(uid) for _ in range(10)))
+    assert results == [users[uid]] * 10
+    assert calls == [uid]
+    assert await user_cache.get_user_status(uid) == users[uid] and calls == [uid]
+
+
+async def test_missing_users_expire_on_the_negative_ttl(loads, monkeypatch):
+    calls, users = loads
+    monkeypatch.setattr(user_cache, "NEGATIVE_TTL", 0)
+    uid = uuid.uuid4()
+    assert await user_cache.get_user_status(uid) == MISSING
+    users[uid] = UserStatus(True, True, ())
+    assert (await user_cache.get_user_status(uid)).exists
+    assert calls == [uid, uid]
+
+
+async def test_status_is_read_from_the_database(db):
+    from src.models import Role, User, user_roles
+
+    uid = uuid.uuid4()
+    async with db() as session:
+        session.add(User(id=uid, email="c@example.com", password_hash="x", is_active=False))
+        role = Role(code="customer", name="Customer")
+        session.add(role)
+        await session.flush()
+        await session.execute(user_roles.insert().values(user_id=uid, role_id=role.id))
+        await session.commit()
+    assert await user_cache._load(uid) == UserStatus(True, False, ("customer",))
+    assert await user_cache._load(uuid.uuid4()) == MISSING
+
+
+async def _until(cond, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def test_invalidations_from_other_workers_drop_the_entry(loads, redis, monkeypatch):
+    calls, users = loads
+    uid, other = uuid.uuid4(), uuid.uuid4()
+    users[uid] = users[other] = UserStatus(True, True, ())
+    await user_cache.get_user_status(uid)
+    await user_cache.get_user_status(other)
+
+    opened = []
+    real = redis.pubsub
+    monkeypatch.setattr(redis, "pubsub", lambda **kw: opened.append(real(**kw)) or opened[-1])
+    await user_cache.start_invalidation_listener()
+    await _until(lambda: opened and opened[0].subscribed)
+    await redis.publish(user_cache.INVALIDATE_CHANNEL, str(uid))       # another worker's invalidate_user
+    await _until(lambda: uid not in user_cache._entries)
+    assert other in user_cache._entries
+
+    task = user_cache._listener
+    await user_cache.stop_invalidation_listener()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert opened[0].connection is None
+
+
+async def _seed_user(db, *roles: str) -> uuid.UUID:
+    from src.models import Role, User, user_roles
+
+    uid = uuid.uuid4()
+    async with db() as session:
+        session.add(User(id=uid, email=f"{uid.hex}@example.com", password_hash="x"))
+        await session.flush()
+        for code in roles:
+            role = Role(code=code, name=code.title())
+            session.add(role)
+            await session.flush()
+            await session.execute(user_roles.insert().values(user_id=uid, role_id=role.id))
+        await session.commit()
+    return uid
+
+
+@pytest.mark.parametrize("action", [module.deactivate_user, module.delete_user])
+async def test_deactivate_and_delete_invalidate_without_waiting_for_the_ttl(db, redis, monkeypatch, action):
+    monkeypatch.setattr(user_cache, "_entries", {})
+    uid = await _seed_user(db)
+    assert (await user_cache.get_user_status(uid)).is_active
+
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(user_cache.INVALIDATE_CHANNEL)
+    async with db() as session:
+        assert await action(session, uid)
+    assert not (await user_cache.get_user_status(uid)).is_active
+    msgs = [await pubsub.get_message(timeout=1.0) for _ in range(2)]     # the subscribe ack, then ours
+    assert msgs[1]["type"] == "message" and msgs[1]["data"] == str(uid)
+    await pubsub.aclose()
+
+    async with db() as session:
+        assert not await action(session, uuid.uuid4())
+
+
+async def test_accounts_are_deactivated_by_their_owner_or_an_admin(db, redis, monkeypatch):
+    from src.auth.index import router
+
+    monkeypatch.setattr(user_cache, "_entries", {})
+    owner, stranger, admin = await _seed_user(db), await _seed_user(db), await _seed_user(db, "admin")
+    app = FastAPI()
+    app.include_router(router, prefix="/auth")
+
+    def bearer(uid):
+        return {"Authorization": f"Bearer {create_access_token(str(uid), [])}"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.post(f"/auth/users/{owner}/deactivate")).status_code == 401
+        assert (await client.post(f"/auth/users/{owner}/deactivate", headers=bearer(stranger))).status_code == 403
+        assert (await client.post(f"/auth/users/{owner}/deactivate", headers=bearer(owner))).status_code == 204
+        # the owner's token is refused from the very next request
+        r = await client.post("/auth/token/inspect", json={"token": bearer(owner)["Authorization"][7:]})
+        assert r.status_code == 401
+        assert (await client.delete(f"/auth/users/{stranger}", headers=bearer(admin))).status_code == 204
+        assert (await client.delete(f"/auth/users/{stranger}", headers=bearer(admin))).status_code == 404
@@ -0,0 +1,186 @@
+"""
+Cold-start timing for auth, catalog and media_storage.
+
+Every run is a fresh interpreter, so nothing is cached between runs. A run records:
+- import_s: time to import the service's `main`.
+- startup_s: time for the lifespan startup handlers.
+- ready_s: time from startup until /health/ready answers 200 (the warm-up).
+- first_ms / warm_ms: latency of the first request and the median of the
+  next ones, on the same endpoint.
+
+    python bench/cold_start.py --service all --runs 5 --out cold.json
+    python bench/cold_start.py --service auth --top-imports 15      # slowest imports (-X importtime)
+    python bench/cold_start.py --baseline cold.json --max-regression 0.20
+
+Uses the same SQLite stand-in / --db env switch as asgi_bench.py.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from asgi_bench import BACKEND_DIR, SERVICES, _prepare_env, _create_sqlite_schema, _wait_ready
+
+WARM_SAMPLES = 20
+
+
+def _probe(service: str):
+    """One representative request per service: DB read on the hot path, no fixture data needed."""
+    if service == "auth":
+        return lambda c: c.post("/auth/login", json={"email": "cold@bench.example.com", "password": "x"})
+    if service == "catalog":
+        return lambda c: c.get("/catalog/products", params={"limit": 20})
+    product_id = str(uuid.uuid4())
+    return lambda c: c.get(f"/products/{product_id}/images")
+
+
+async def _child(service: str, args) -> dict:
+    import httpx
+
+    workdir = Path(tempfile.mkdtemp(prefix=f"cold-{service}-"))
+    _prepare_env(service, args, workdir)
+    sys.path.insert(0, str(BACKEND_DIR / service))
+    os.chdir(BACKEND_DIR / service)
+
+    t0 = time.perf_counter()
+    import main  # noqa: E402
+    import_s = time.perf_counter() - t0
+
+    if args.db == "sqlite" and service != "media_storage":
+        await _create_sqlite_schema()
+
+    probe = _probe(service)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+        async with main.app.router.lifespan_context(main.app):
+            startup_s = time.perf_counter() - t0
+            ready_s = await _wait_ready(client)
+
+            t0 = time.perf_counter()
+            await probe(client)
+            first_s = time.perf_counter() - t0
+            warm = []
+            for _ in range(WARM_SAMPLES):
+                t0 = time.perf_counter()
+                await probe(client)
+                warm.append(time.perf_counter() - t0)
+
+    return {
+        "import_s": round(import_s, 4),
+        "startup_s": round(startup_s, 4),
+        "ready_s": round(ready_s, 4) if ready_s is not None else None,
+        "first_ms": round(first_s * 1000, 3),
+        "warm_ms": round(statistics.median(warm) * 1000, 3),
+    }
+
+
+def _top_imports(stderr: str, n: int) -> list[dict]:
+    """Slowest top-level imports from `-X importtime` output (cumulative microseconds)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nesting is shown by extra indentation; keep only imports made directly by the process
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            continue
+        rows.append({"module": name.strip(), "cumulative_ms": round(int(cumulative) / 1000, 1)})
+    return sorted(rows, key=lambda r: -r["cumulative_ms"])[:n]
+
+
+def _spawn(service: str, argv: list[str], importtime: bool) -> tuple[dict, str]:
+    cmd = [sys.executable, *(["-X", "importtime"] if importtime else []), __file__,
+           "--service", service, "--child", *argv]
+    t0 = time.perf_counter()
+    out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    run = json.loads(out.stdout)
+    run["process_s"] = round(time.perf_counter() - t0, 4)
+    return run, out.stderr
+
+
+def _summarize(runs: list[dict]) -> dict:
+    out = {}
+    for key in ("process_s", "import_s", "startup_s", "ready_s", "first_ms", "warm_ms"):
+        vals = [r[key] for r in runs if r.get(key) is not None]
+        if vals:
+            out[key] = {"median": round(statistics.median(vals), 4), "max": round(max(vals), 4)}
+    return out
+
+
+def _compare(current: dict, baseline: dict, max_regression: float) -> list[str]:
+    problems = []
+    for service, data in current["services"].items():
+        base = baseline.get("services", {}).get(service, {}).get("summary", {})
+        for key in ("import_s", "ready_s", "first_ms"):
+            old, new = base.get(key, {}).get("median"), data["summary"].get(key, {}).get("median")
+            if old and new and (new - old) / old > max_regression:
+                problems.append(f"{service}.{key}: {old} -> {new} (+{(new - old) / old:.0%})")
+    return problems
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--service", choices=(*SERVICES, "all"), default="all")
+    ap.add_argument("--db", choices=("sqlite", "env"), default="sqlite")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top-imports", type=int, default=0, help="report the N slowest imports of the first run")
+    ap.add_argument("--out", type=Path)
+    ap.add_argument("--baseline", type=Path)
+    ap.add_argument("--max-regression", type=float, default=0.20)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_child(args.service, args))))
+        return 0
+
+    services = SERVICES if args.service == "all" else (args.service,)
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "db": args.db,
+        "services": {},
+    }
+    for service in services:
+        runs = []
+        top = None
+        for i in range(args.runs):
+            importtime = bool(args.top_imports) and i == 0
+            run, stderr = _spawn(service, ["--db", args.db], importtime)
+            if importtime:
+                top = _top_imports(stderr, args.top_imports)
+                run.pop("import_s")   # inflated by -X importtime itself
+            runs.append(run)
+        report["services"][service] = {"summary": _summarize(runs), "runs": runs}
+        if top is not None:
+            report["services"][service]["top_imports"] = top
+        s = report["services"][service]["summary"]
+        print(f"[{service}] import={s.get('import_s', {}).get('median')}s "
+              f"ready={s.get('ready_s', {}).get('median')}s first={s['first_ms']['median']}ms "
+              f"warm={s['warm_ms']['median']}ms", file=sys.stderr)
+
+    problems = []
+    if args.baseline:
+        problems = _compare(report, json.loads(args.baseline.read_text()), args.max_regression)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        args.out.write_text(text)
+    print(text)
+    for p in problems:
+        print(f"REGRESSION {p}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Contention benchmark for the Redis inventory scripts (catalog/src/inventory/store.py).
+
+Many concurrent "shoppers" fight over a few hot variants with limited stock. Each one
+reserves, then commits or releases. At the end the run checks that nothing was oversold:
+for every variant, on_hand == stock - sold and reserved == 0.
+
+    python bench/inventory_bench.py --redis-url redis://localhost:6379/15 -c 256 -n 50000
+    python bench/inventory_bench.py --fake          # fakeredis (needs fakeredis[lua])
+
+Exits 1 if the invariant is violated.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+
+from asgi_bench import BACKEND_DIR, _percentile
+
+sys.path.insert(0, str(BACKEND_DIR / "catalog"))
+from src.inventory.store import InventoryStore, InsufficientStock  # noqa: E402
+
+
+async def _client(args):
+    if args.fake:
+        import fakeredis
+        return fakeredis.aioredis.FakeRedis(decode_responses=True)
+    import redis.asyncio as redis
+    return redis.from_url(args.redis_url, decode_responses=True)
+
+
+async def run(args) -> dict:
+    r = await _client(args)
+    store = InventoryStore(r, prefix=f"{{invbench-{uuid.uuid4().hex[:8]}}}")
+    variants = [uuid.uuid4() for _ in range(args.variants)]
+    for v in variants:
+        await store.set_on_hand(v, args.stock)
+
+    rng = random.Random(args.seed)
+    sold = {v: 0 for v in variants}
+    outcome = {"reserved": 0, "sold_out": 0, "committed": 0, "released": 0, "errors": 0}
+    latencies: list[float] = []
+    counter = iter(range(args.requests))
+
+    async def shopper():
+        for _ in counter:
+            v = rng.choice(variants)
+            qty = rng.randint(1, args.max_qty)
+            t0 = time.perf_counter()
+            try:
+                hold_id, _ = await store.reserve({v: qty}, args.ttl)
+                outcome["reserved"] += 1
+                if rng.random() < args.commit_ratio:
+                    if await store.commit(hold_id):
+                        sold[v] += qty
+                        outcome["committed"] += 1
+                else:
+                    await store.release(hold_id)
+                    outcome["released"] += 1
+            except InsufficientStock:
+                outcome["sold_out"] += 1
+            except Exception:
+                outcome["errors"] += 1
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(shopper() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - start
+
+    violations = []
+    for v in variants:
+        s = await store.get(v)
+        if s.reserved != 0 or s.on_hand != args.stock - sold[v] or s.on_hand < 0:
+            violations.append({"variant": str(v), "on_hand": s.on_hand, "reserved": s.reserved, "sold": sold[v]})
+
+    keys = [k async for k in r.scan_iter(match=f"{store.prefix}*")]
+    if keys:
+        await r.delete(*keys)
+
+    latencies.sort()
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "variants": args.variants,
+        "stock_per_variant": args.stock,
+        "wall_s": round(wall, 4),
+        "ops_per_s": round(args.requests / wall, 1) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 3),
+            "p99": round(_percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "outcome": outcome,
+        "units_sold": sum(sold.values()),
+        "violations": violations,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--redis-url", default="redis://localhost:6379/15")
+    ap.add_argument("--fake", action="store_true", help="use fakeredis instead of a server")
+    ap.add_argument("-n", "--requests", type=int, default=20000)
+    ap.add_argument("-c", "--concurrency", type=int, default=128)
+    ap.add_argument("--variants", type=int, default=3, help="hot variants everyone competes for")
+    ap.add_argument("--stock", type=int, default=1000)
+    ap.add_argument("--max-qty", type=int, default=3)
+    ap.add_argument("--commit-ratio", type=float, default=0.7)
+    ap.add_argument("--ttl", type=float, default=60.0)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if report["violations"]:
+        print("OVERSOLD / LEAKED RESERVATIONS", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Lookup latency against directory size, flat vs hash-sharded media layout
+(media_storage/layout.py).
+
+For each owner count, a scratch tree is built in both layouts (one directory with one file
+per owner), then random files are looked up through ShardedStaticFiles.lookup_path (what
+/media/... serving does), new owner directories are created (what an upload does), and the
+directory a backup or `ls` would list is scanned.
+
+    python bench/media_layout_bench.py --owners 1000,10000,100000 -n 20000
+    python bench/media_layout_bench.py --owners 200000 --tmp /srv/media-scratch --drop-caches
+
+Pass --tmp on the filesystem MEDIA_ROOT lives on; tmpfs numbers say little about ext4/xfs.
+--drop-caches (root only) empties the dentry / page cache before each lookup pass, which is
+where large directories hurt most.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from asgi_bench import BACKEND_DIR, _percentile
+
+sys.path.insert(0, str(BACKEND_DIR / "media_storage"))
+import layout  # noqa: E402
+
+LAYOUTS = {"flat": 0, "sharded": 2}
+
+
+def _ms(sorted_vals: list[float]) -> dict:
+    return {
+        "p50": round(_percentile(sorted_vals, 50) * 1000, 4),
+        "p99": round(_percentile(sorted_vals, 99) * 1000, 4),
+        "max": round(sorted_vals[-1] * 1000, 4) if sorted_vals else 0.0,
+    }
+
+
+def _drop_caches() -> None:
+    os.sync()
+    try:
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+    except OSError as e:
+        print(f"cannot drop caches ({e}); measuring warm lookups", file=sys.stderr)
+
+
+def _build(root: Path, owners: list[str]) -> None:
+    for owner_id in owners:
+        d = layout.owner_dir(root, "profiles", owner_id)
+        d.mkdir(parents=True)
+        (d / "000000-avatar.jpg").write_bytes(b"\xff\xd8\xff")
+
+
+def _run_layout(root: Path, levels: int, owners: list[str], args) -> dict:
+    layout.SHARD_LEVELS = levels
+    t0 = time.perf_counter()
+    _build(root, owners)
+    build_s = time.perf_counter() - t0
+
+    static = layout.ShardedStaticFiles(directory=str(root))
+    rng = random.Random(args.seed)
+    if args.drop_caches:
+        _drop_caches()
+    lookups = []
+    for _ in range(args.lookups):
+        rel = os.path.join("profiles", rng.choice(owners), "000000-avatar.jpg")
+        t0 = time.perf_counter()
+        _, st = static.lookup_path(rel)
+        lookups.append(time.perf_counter() - t0)
+        if st is None:
+            raise RuntimeError(f"lookup failed for {rel}")
+    misses = []
+    for _ in range(min(args.lookups, 5000)):
+        rel = os.path.join("profiles", str(uuid.uuid4()), "000000-avatar.jpg")
+        t0 = time.perf_counter()
+        static.lookup_path(rel)
+        misses.append(time.perf_counter() - t0)
+    creates = []
+    for _ in range(min(args.lookups, 2000)):
+        t0 = time.perf_counter()
+        layout.owner_dir(root, "profiles", str(uuid.uuid4())).mkdir(parents=True)
+        creates.append(time.perf_counter() - t0)
+
+    # the directory a listing has to read: profiles/ itself when flat, one leaf when sharded
+    listed = layout.owner_dir(root, "profiles", owners[0]).parent
+    t0 = time.perf_counter()
+    with os.scandir(listed) as it:
+        entries = sum(1 for _ in it)
+    scan_s = time.perf_counter() - t0
+
+    for samples in (lookups, misses, creates):
+        samples.sort()
+    return {
+        "build_s": round(build_s, 3),
+        "lookup_ms": _ms(lookups),
+        "miss_ms": _ms(misses),
+        "create_ms": _ms(creates),
+        "largest_dir_entries": entries,
+        "scan_ms": round(scan_s * 1000, 3),
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--owners", default="1000,10000,100000", help="comma-separated owner counts")
+    ap.add_argument("-n", "--lookups", type=int, default=20000)
+    ap.add_argument("--tmp", help="scratch directory (default: system temp)")
+    ap.add_argument("--drop-caches", action="store_true")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    report = []
+    for count in (int(c) for c in args.owners.split(",")):
+        owners = [str(uuid.uuid4()) for _ in range(count)]
+        row = {"owners": count}
+        for name, levels in LAYOUTS.items():
+            root = Path(tempfile.mkdtemp(prefix="media-layout-", dir=args.tmp))
+            try:
+                row[name] = _run_layout(root, levels, owners, args)
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+        report.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+
+from lib.observability.metrics import REGISTRY
+from lib.redis.index import get_client
+
+log = logging.getLogger("ratelimit")
+
+REJECTIONS = REGISTRY.counter("admission_rejections_total", "Requests refused by admission control.", ("limiter", "reason"))
+QUEUED = REGISTRY.gauge("admission_queue_depth", "Requests waiting for a concurrency slot.", ("limiter",))
+
+
+class ConcurrencyLimiter:
+    """
+    At most `limit` holders at once; up to `max_queue` more may wait `queue_timeout` seconds.
+    Beyond that callers get 503 + Retry-After immediately instead of piling onto the worker.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float, retry_after: int = 1):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._sem = asyncio.Semaphore(limit)
+        self._queued = QUEUED.labels(name)
+        self._full = REJECTIONS.labels(name, "queue_full")
+        self._timeout = REJECTIONS.labels(name, "queue_timeout")
+
+    def _reject(self, counter) -> HTTPException:
+        counter.value += 1
+        return HTTPException(503, detail="Server busy, retry later", headers={"Retry-After": str(self.retry_after)})
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._sem.locked():
+            if self._queued.value >= self.max_queue:
+                raise self._reject(self._full)
+            self._queued.value += 1
+            try:
+                await asyncio.wait_for(self._sem.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._reject(self._timeout)
+            finally:
+                self._queued.value -= 1
+        else:
+            await self._sem.acquire()
+        try:
+            yield
+        finally:
+            self._sem.release()
+
+
+# Approximate sliding window: current bucket count + previous bucket weighted by overlap.
+# O(1) memory per key, one round trip, atomic.
+_SLIDING_WINDOW_LUA = """
+local limit = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local prev_weight = tonumber(ARGV[3])
+local cur = tonumber(redis.call('GET', KEYS[1]) or '0')
+local prev = tonumber(redis.call('GET', KEYS[2]) or '0')
+if prev * prev_weight + cur >= limit then
+  return 0
+end
+redis.call('INCR', KEYS[1])
+redis.call('PEXPIRE', KEYS[1], window_ms * 2)
+return 1
+"""
+
+
+class SlidingWindowLimiter:
+    """Redis-backed `limit` hits per `window` seconds per key. Fails open if Redis is unreachable."""
+
+    def __init__(self, name: str, limit: int, window: float, enabled: bool = True):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.enabled = enabled
+        self._script = None
+        self._rejected = REJECTIONS.labels(name, "rate_limited")
+
+    async def hit(self, key: str) -> float | None:
+        """Count one hit; returns None when allowed, otherwise seconds until retry."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        bucket = int(now // self.window)
+        elapsed = now - bucket * self.window
+        prefix = f"rl:{self.name}:{key}"
+        try:
+            if self._script is None:
+                self._script = (await get_client()).register_script(_SLIDING_WINDOW_LUA)
+            allowed = await self._script(
+                keys=[f"{prefix}:{bucket}", f"{prefix}:{bucket - 1}"],
+                args=[self.limit, int(self.window * 1000), 1 - elapsed / self.window],
+            )
+        except Exception as e:
+            log.warning("rate limiter %s unavailable, allowing: %s", self.name, e)
+            return None
+        if allowed:
+            return None
+        self._rejected.value += 1
+        return self.window - elapsed
+
+    async def enforce(self, key: str) -> None:
+        retry = await self.hit(key)
+        if retry is not None:
+            raise HTTPException(429, detail="Too many requests", headers={"Retry-After": str(max(1, math.ceil(retry)))})
@@ -0,0 +1,96 @@
+"""
+Access-token denylist.
+
+Revoked `jti`s live in a Redis sorted set (score = token exp) and are fanned out on a
+pub/sub channel; every worker mirrors them in a local dict, so `is_revoked` is a
+single dict lookup with no network round trip. Entries are pruned once the token
+would have expired anyway.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from lib.redis.index import get_client
+
+log = logging.getLogger("revocation")
+
+CHANNEL = os.getenv("REVOCATION_CHANNEL", "auth:revoked")
+ZSET_KEY = os.getenv("REVOCATION_KEY", "auth:revoked_jti")
+PRUNE_INTERVAL = float(os.getenv("REVOCATION_PRUNE_SECONDS", "60"))
+
+_revoked: dict[str, int] = {}   # jti -> exp (unix seconds)
+_task: asyncio.Task | None = None
+
+
+def is_revoked(jti: str | None) -> bool:
+    return jti is not None and jti in _revoked
+
+
+def _prune_local(now: float) -> None:
+    for jti in [j for j, exp in _revoked.items() if exp <= now]:
+        del _revoked[jti]
+
+
+async def revoke(jti: str, exp: int) -> None:
+    """Persist + broadcast; raises if Redis is unreachable (the revocation would not be durable)."""
+    if exp <= time.time():
+        return
+    _revoked[jti] = exp
+    r = await get_client()
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.zadd(ZSET_KEY, {jti: exp})
+        pipe.publish(CHANNEL, f"{jti} {exp}")
+        await pipe.execute()
+
+
+async def _load_snapshot(r) -> None:
+    now = int(time.time())
+    for jti, exp in await r.zrangebyscore(ZSET_KEY, now, "+inf", withscores=True):
+        _revoked[jti] = int(exp)
+
+
+async def _listen() -> None:
+    backoff = 0.5
+    while True:
+        try:
+            r = await get_client()
+            # closed on every way out, so a reconnect doesn't leave the old connection behind
+            async with r.pubsub() as pubsub:
+                await pubsub.subscribe(CHANNEL)
+                await _load_snapshot(r)   # after subscribing, so nothing published in between is missed
+                backoff = 0.5
+                next_prune = time.monotonic() + PRUNE_INTERVAL
+                while True:
+                    msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if asyncio.current_task().cancelling():
+                        # a cancel landing as the read timeout expires comes back as "no message"
+                        raise asyncio.CancelledError
+                    if msg and msg.get("type") == "message":
+                        jti, _, exp = msg["data"].partition(" ")
+                        if exp.isdigit():
+                            _revoked[jti] = int(exp)
+                    if time.monotonic() >= next_prune:
+                        now = time.time()
+                        _prune_local(now)
+                        await r.zremrangebyscore(ZSET_KEY, "-inf", int(now))
+                        next_prune = time.monotonic() + PRUNE_INTERVAL
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("revocation listener error: %s", e)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+async def start_revocation_listener() -> None:
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_listen())
+
+
+async def stop_revocation_listener() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
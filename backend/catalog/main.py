@@ -1,13 +1,63 @@
+from contextlib import AsyncExitStack, asynccontextmanager
 from fastapi import FastAPI
 from src.health.index import router as health_router
 from src.catalog.index import router as catalog_router
+from src.inventory.index import router as inventory_router
+from src.inventory.module import start_inventory, stop_inventory
 from lib.middleware.req_context import RequestIdMiddleware
 from lib.observability.logging import setup_logging
+from lib.observability.metrics import setup_metrics, loop_lag_monitor, instrument_engine, instrument_redis, instrument_httpx
+from lib.observability.profiling import setup_profiling
+from lib.db.postgres import engine, read_engines, start_replica_monitor, stop_replica_monitor
+import lib.redis.index as redis_index
+import src.utils.auth_client as auth_client
+from src.catalog.media_events import start_media_consumer, stop_media_consumer
+from src.catalog.warmup import start_catalog_warmup
+from src.catalog.fx import start_fx_refresh, stop_fx_refresh
+from src.catalog.suggest import start_suggest, stop_suggest
+from lib.security import revocation
+from lib.lifecycle.index import stop_warmup
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Background work starts in order; the exit stack stops it in reverse, also when a later start fails."""
+    async with AsyncExitStack() as stack:
+        stack.push_async_callback(redis_index.close_client)      # last, after the inventory flush
+        stack.push_async_callback(auth_client.close_http_client)
+        await stack.enter_async_context(loop_lag_monitor())
+        await start_replica_monitor()
+        stack.push_async_callback(stop_replica_monitor)
+        await redis_index.start_health_check()
+        stack.push_async_callback(redis_index.stop_health_check)
+        await revocation.start_revocation_listener()     # lib.security.jwt.decode consults its denylist
+        stack.push_async_callback(revocation.stop_revocation_listener)
+        await start_media_consumer()
+        stack.push_async_callback(stop_media_consumer)
+        await start_inventory()
+        stack.push_async_callback(stop_inventory)
+        await start_fx_refresh()
+        stack.push_async_callback(stop_fx_refresh)
+        await start_suggest()
+        stack.push_async_callback(stop_suggest)
+        await start_catalog_warmup()   # /health/ready flips when it finishes
+        stack.push_async_callback(stop_warmup)        # first on shutdown, so readiness drops before anything closes
+        yield
+
+
 setup_logging()
-app = FastAPI(title="Catalog Service", version="3.0.0")
+app = FastAPI(title="Catalog Service", version="3.0.0", lifespan=lifespan)
 app.add_middleware(RequestIdMiddleware)
+setup_profiling(app)
+setup_metrics(app)
+instrument_engine(engine)
+for i, e in enumerate(read_engines):
+    instrument_engine(e, f"replica{i}")
+instrument_redis(lambda: redis_index._client)
+instrument_httpx(lambda: auth_client._http, name="auth")
 app.include_router(health_router, prefix="/health", tags=["health"])
 app.include_router(catalog_router, prefix="/catalog", tags=["catalog"])
+app.include_router(inventory_router, prefix="/catalog", tags=["inventory"])
 @app.get("/", tags=["root"])
 async def root():
     return {"name": "catalog-service", "ok": True}
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""product listing summary
+
+Revision ID: e6f1a3c8d2b7
+Revises: b9665ba78a88
+Create Date: 2026-10-19 14:02:17.530912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f1a3c8d2b7'
+down_revision: Union[str, None] = 'b9665ba78a88'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Recomputes the summary for just the given products (index scan on product_variants.product_id).
+REFRESH_FN = """
+CREATE FUNCTION product_listing_refresh(ids uuid[]) RETURNS void AS $$
+BEGIN
+  INSERT INTO product_listing AS pl (product_id, min_price, max_price, on_sale, variant_count, updated_at)
+  SELECT p.id, min(v.price), max(v.price),
+         coalesce(bool_or(v.compare_at > v.price), false), count(v.id), now()
+  FROM products p
+  LEFT JOIN product_variants v ON v.product_id = p.id
+  WHERE p.id = ANY(ids)
+  GROUP BY p.id
+  ON CONFLICT (product_id) DO UPDATE SET
+    min_price = EXCLUDED.min_price,
+    max_price = EXCLUDED.max_price,
+    on_sale = EXCLUDED.on_sale,
+    variant_count = EXCLUDED.variant_count,
+    updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Statement-level with transition tables, so a bulk variant write refreshes each product once.
+# Variant writes also bump products.updated_at, which product ETags rely on.
+VARIANTS_TRG_FN = """
+CREATE FUNCTION product_variants_listing_trg() RETURNS trigger AS $$
+DECLARE
+  ids uuid[];
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    ids := ARRAY(SELECT DISTINCT product_id FROM new_rows);
+  ELSIF TG_OP = 'DELETE' THEN
+    ids := ARRAY(SELECT DISTINCT product_id FROM old_rows);
+  ELSE
+    ids := ARRAY(SELECT product_id FROM new_rows UNION SELECT product_id FROM old_rows);
+  END IF;
+  PERFORM product_listing_refresh(ids);
+  UPDATE products SET updated_at = now() WHERE id = ANY(ids) AND updated_at < now();
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+PRODUCTS_TRG_FN = """
+CREATE FUNCTION products_listing_trg() RETURNS trigger AS $$
+BEGIN
+  PERFORM product_listing_refresh(ARRAY(SELECT id FROM new_rows));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('product_listing',
+    sa.Column('product_id', sa.UUID(), nullable=False),
+    sa.Column('min_price', sa.Numeric(precision=12, scale=2), nullable=True),
+    sa.Column('max_price', sa.Numeric(precision=12, scale=2), nullable=True),
+    sa.Column('on_sale', sa.Boolean(), server_default='false', nullable=False),
+    sa.Column('variant_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index(op.f('ix_product_listing_min_price'), 'product_listing', ['min_price'], unique=False)
+    op.create_index(op.f('ix_product_listing_max_price'), 'product_listing', ['max_price'], unique=False)
+
+    op.execute(REFRESH_FN)
+    op.execute(VARIANTS_TRG_FN)
+    op.execute(PRODUCTS_TRG_FN)
+    op.execute("""
+        CREATE TRIGGER product_variants_listing_ins AFTER INSERT ON product_variants
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION product_variants_listing_trg()
+    """)
+    op.execute("""
+        CREATE TRIGGER product_variants_listing_upd AFTER UPDATE ON product_variants
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION product_variants_listing_trg()
+    """)
+    op.execute("""
+        CREATE TRIGGER product_variants_listing_del AFTER DELETE ON product_variants
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION product_variants_listing_trg()
+    """)
+    op.execute("""
+        CREATE TRIGGER products_listing_ins AFTER INSERT ON products
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION products_listing_trg()
+    """)
+
+    # backfill existing products
+    op.execute("SELECT product_listing_refresh(ARRAY(SELECT id FROM products))")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS products_listing_ins ON products")
+    op.execute("DROP TRIGGER IF EXISTS product_variants_listing_del ON product_variants")
+    op.execute("DROP TRIGGER IF EXISTS product_variants_listing_upd ON product_variants")
+    op.execute("DROP TRIGGER IF EXISTS product_variants_listing_ins ON product_variants")
+    op.execute("DROP FUNCTION IF EXISTS products_listing_trg()")
+    op.execute("DROP FUNCTION IF EXISTS product_variants_listing_trg()")
+    op.execute("DROP FUNCTION IF EXISTS product_listing_refresh(uuid[])")
+    op.drop_index(op.f('ix_product_listing_max_price'), table_name='product_listing')
+    op.drop_index(op.f('ix_product_listing_min_price'), table_name='product_listing')
+    op.drop_table('product_listing')
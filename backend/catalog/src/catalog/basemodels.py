@@ -1,6 +1,6 @@
 from __future__ import annotations
 from pydantic import BaseModel, ConfigDict, condecimal
-from typing import Optional, List
+from typing import Optional, List, Dict
 from uuid import UUID
 from datetime import datetime
 from enum import Enum
@@ -38,6 +38,7 @@ class ProductRead(BaseModel):
     description: Optional[str] = None
     brand: Optional[str] = None
     default_currency: str
+    currency: Optional[str] = None                  # currency the prices are in when ?currency= was given
     created_at: datetime
     updated_at: datetime
 
@@ -51,6 +52,63 @@ class ProductVariantRead(BaseModel):
     weight_grams: Optional[int] = None
     price: condecimal(max_digits=12, decimal_places=2)
     compare_at: Optional[condecimal(max_digits=12, decimal_places=2)] = None
+    updated_at: Optional[datetime] = None           # echo as expected_updated_at in bulk updates
+
+class ProductListingSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    min_price: Optional[condecimal(max_digits=12, decimal_places=2)] = None   # None => no variants yet
+    max_price: Optional[condecimal(max_digits=12, decimal_places=2)] = None
+    on_sale: bool = False                                                    # any variant has compare_at > price
+    variant_count: int = 0
+
+class ProductListItem(ProductRead):
+    listing: Optional[ProductListingSummary] = None
+
+class ProductImageRead(BaseModel):
+    url: str
+    position: int
+    alt: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    blurhash: Optional[str] = None
+    derivatives: Dict[str, str] = {}          # width -> url
 
 class ProductDetailRead(ProductRead):
     variants: List[ProductVariantRead] = []
+    images: List[ProductImageRead] = []
+
+# ---- suggestions ----
+class SuggestionRead(BaseModel):
+    id: UUID
+    title: str
+    slug: str
+    brand: Optional[str] = None
+
+# ---- batch fetch ----
+class ProductBatchIn(BaseModel):
+    ids: List[UUID]
+
+class ProductBatchRead(BaseModel):
+    items: List[ProductDetailRead] = []     # in request order, duplicates collapsed
+    missing: List[UUID] = []
+
+# ---- bulk variant updates ----
+class VariantUpdate(BaseModel):
+    sku: str
+    # omitted fields are left alone; an explicit null clears compare_at / weight_grams
+    price: Optional[condecimal(max_digits=12, decimal_places=2, ge=0)] = None
+    compare_at: Optional[condecimal(max_digits=12, decimal_places=2, ge=0)] = None
+    weight_grams: Optional[int] = None
+    expected_updated_at: Optional[datetime] = None   # optimistic check against the variant's updated_at
+
+class VariantBulkUpdateIn(BaseModel):
+    items: List[VariantUpdate]
+
+class VariantUpdateResult(BaseModel):
+    sku: str
+    status: str                                      # updated | not_found | conflict
+    updated_at: Optional[datetime] = None            # new value, or the current one on conflict
+
+class VariantBulkUpdateRead(BaseModel):
+    results: List[VariantUpdateResult] = []          # in request order
+    updated: int = 0
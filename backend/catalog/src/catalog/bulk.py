@@ -0,0 +1,124 @@
+# src/catalog/bulk.py
+"""
+Set-based bulk variant updates (repricing runs).
+
+Each chunk of CATALOG_BULK_CHUNK items is one `UPDATE product_variants ... FROM unnest(...)`
+statement in its own transaction, so tens of thousands of SKUs cost a few dozen round trips
+instead of one ORM flush per row. The rows travel as one typed array per column (the
+set-based equivalent of a VALUES list): the SQL text and its seven binds are the same for
+every chunk, so it stays one prepared statement, and NULLs need no per-row typing.
+The statement-level variant triggers then refresh product_listing and bump
+products.updated_at once per chunk, which moves product ETags.
+
+An item with `expected_updated_at` only applies if the variant's updated_at still matches
+(optimistic concurrency); otherwise it is reported as a conflict with the current value.
+"""
+import json
+import logging
+import os
+import uuid
+
+from sqlalchemy import Boolean, DateTime, Integer, Numeric, String, bindparam, case, column, func, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from lib.observability.metrics import REGISTRY
+from lib.redis.index import get_client
+from src.models import ProductVariant
+from .basemodels import VariantUpdate, VariantUpdateResult
+from .suggest import PRODUCT_EVENTS_STREAM, PRODUCT_EVENTS_MAXLEN
+
+log = logging.getLogger("catalog.bulk")
+
+BULK_MAX_ITEMS = int(os.getenv("CATALOG_BULK_MAX_ITEMS", "50000"))
+BULK_CHUNK = int(os.getenv("CATALOG_BULK_CHUNK", "5000"))   # rows per statement / transaction
+
+RESULTS = REGISTRY.counter("catalog_bulk_variant_updates_total", "Bulk variant update items by result.", ("status",))
+
+
+_COLUMNS = (
+    ("sku", String),
+    ("price", Numeric(12, 2)),
+    ("set_compare_at", Boolean),
+    ("compare_at", Numeric(12, 2)),
+    ("set_weight", Boolean),
+    ("weight_grams", Integer),
+    ("expected", DateTime(timezone=True)),
+)
+
+
+def _chunk_params(items: list[VariantUpdate]) -> dict[str, list]:
+    return {
+        "sku": [i.sku for i in items],
+        "price": [i.price for i in items],
+        "set_compare_at": ["compare_at" in i.model_fields_set for i in items],
+        "compare_at": [i.compare_at for i in items],
+        "set_weight": ["weight_grams" in i.model_fields_set for i in items],
+        "weight_grams": [i.weight_grams for i in items],
+        "expected": [i.expected_updated_at for i in items],
+    }
+
+
+def _chunk_stmt():
+    d = (
+        func.unnest(*(bindparam(name, type_=ARRAY(t)) for name, t in _COLUMNS))
+        .table_valued(*(column(name, t) for name, t in _COLUMNS))
+        .render_derived(name="d")
+    )
+    v = ProductVariant
+    return (
+        update(v)
+        .where(v.sku == d.c.sku, or_(d.c.expected.is_(None), v.updated_at == d.c.expected))
+        .values(
+            price=func.coalesce(d.c.price, v.price),
+            compare_at=case((d.c.set_compare_at, d.c.compare_at), else_=v.compare_at),
+            weight_grams=case((d.c.set_weight, d.c.weight_grams), else_=v.weight_grams),
+            updated_at=func.now(),
+        )
+        .returning(v.sku, v.product_id, v.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def publish_invalidations(product_ids: set[uuid.UUID]) -> None:
+    """One `product.invalidate` event per chunk on the product change stream, for caches downstream."""
+    if not product_ids:
+        return
+    try:
+        r = await get_client()
+        await r.xadd(
+            PRODUCT_EVENTS_STREAM,
+            {"type": "product.invalidate", "product_ids": json.dumps(sorted(map(str, product_ids)))},
+            maxlen=PRODUCT_EVENTS_MAXLEN, approximate=True,
+        )
+    except Exception as e:
+        # ETags already moved with products.updated_at; this only speeds up external caches
+        log.warning("could not publish invalidation for %s products: %s", len(product_ids), e)
+
+
+async def apply_variant_updates(session: AsyncSession, items: list[VariantUpdate]) -> list[VariantUpdateResult]:
+    """Apply `items` chunk by chunk; results come back in request order."""
+    results: dict[str, VariantUpdateResult] = {}
+    for start in range(0, len(items), BULK_CHUNK):
+        chunk = items[start:start + BULK_CHUNK]
+        rows = (await session.execute(_chunk_stmt(), _chunk_params(chunk))).all()
+        await session.commit()
+        for r in rows:
+            results[r.sku] = VariantUpdateResult(sku=r.sku, status="updated", updated_at=r.updated_at)
+        await publish_invalidations({r.product_id for r in rows})
+
+        missing = [i.sku for i in chunk if i.sku not in results]
+        if missing:
+            # not updated: either the SKU doesn't exist or its expected_updated_at was stale
+            current = dict((await session.execute(
+                select(ProductVariant.sku, ProductVariant.updated_at).where(ProductVariant.sku.in_(missing))
+            )).all())
+            for sku in missing:
+                if sku in current:
+                    results[sku] = VariantUpdateResult(sku=sku, status="conflict", updated_at=current[sku])
+                else:
+                    results[sku] = VariantUpdateResult(sku=sku, status="not_found")
+    out = [results[i.sku] for i in items]
+    for res in out:
+        RESULTS.labels(res.status).value += 1
+    return out
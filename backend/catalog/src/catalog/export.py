@@ -0,0 +1,272 @@
+# src/catalog/export.py
+"""
+Full-catalog export for feeds and analytics, streamed in constant memory.
+
+One joined query (product x variant, plus the image manifest) runs on a server-side cursor
+(`yield_per`), so rows arrive EXPORT_BATCH at a time and are never all in memory. Plain
+column tuples are selected, not ORM objects, so nothing accumulates in the identity map.
+Each batch is encoded (NDJSON: one product per line with its variants nested; CSV: one row
+per variant), optionally compressed and handed on before the next one is fetched.
+
+Served by GET /catalog/export and, for cron jobs, the CLI:
+
+    python -m src.catalog.export --format csv --compression gzip -o catalog.csv.gz
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import zlib
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable
+
+import anyio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import StreamingResponse
+
+from lib.observability.metrics import REGISTRY
+from lib.ratelimit.index import ConcurrencyLimiter
+from src.models import Product, ProductVariant, ProductMedia
+
+log = logging.getLogger("catalog.export")
+
+EXPORT_BATCH = int(os.getenv("CATALOG_EXPORT_BATCH", "2000"))
+EXPORT_MAX_CONCURRENT = int(os.getenv("CATALOG_EXPORT_MAX_CONCURRENT", "2"))
+EXPORT_GZIP_LEVEL = int(os.getenv("CATALOG_EXPORT_GZIP_LEVEL", "6"))
+EXPORT_ZSTD_LEVEL = int(os.getenv("CATALOG_EXPORT_ZSTD_LEVEL", "3"))
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+COMPRESSIONS = {"gzip": ("application/gzip", ".gz"), "zstd": ("application/zstd", ".zst")}
+
+# exports hold a DB connection for their whole duration; extra ones are refused, not queued
+EXPORT_LIMITER = ConcurrencyLimiter("catalog_export", EXPORT_MAX_CONCURRENT, max_queue=0, queue_timeout=0, retry_after=30)
+EXPORTED_ROWS = REGISTRY.counter("catalog_export_rows_total", "Product x variant rows exported.", ("format",))
+
+CSV_COLUMNS = (
+    "product_id", "slug", "title", "brand", "status", "currency", "updated_at", "image_url",
+    "variant_id", "sku", "variant_title", "barcode", "weight_grams", "price", "compare_at",
+)
+
+
+def export_stmt(updated_since: datetime | None = None):
+    # variant writes bump products.updated_at (trigger), so updated_since also catches price / stock-unit edits
+    stmt = (
+        select(
+            Product.id, Product.slug, Product.title, Product.brand, Product.status,
+            Product.default_currency, Product.updated_at, ProductMedia.images,
+            ProductVariant.id.label("variant_id"), ProductVariant.sku, ProductVariant.title.label("variant_title"),
+            ProductVariant.barcode, ProductVariant.weight_grams, ProductVariant.price, ProductVariant.compare_at,
+        )
+        .outerjoin(ProductVariant, ProductVariant.product_id == Product.id)
+        .outerjoin(ProductMedia, ProductMedia.product_id == Product.id)
+        .order_by(Product.id, ProductVariant.sku)
+    )
+    if updated_since is not None:
+        stmt = stmt.where(Product.updated_at > updated_since)
+    return stmt
+
+
+def _str(v) -> str | None:
+    return None if v is None else str(v)
+
+
+def _product(r) -> dict:
+    return {
+        "id": str(r.id),
+        "slug": r.slug,
+        "title": r.title,
+        "brand": r.brand,
+        "status": getattr(r.status, "value", r.status),
+        "currency": r.default_currency,
+        "updated_at": r.updated_at.isoformat(),
+        "images": sorted(r.images or [], key=lambda i: i.get("position", 0)),
+        "variants": [],
+    }
+
+
+def _variant(r) -> dict:
+    return {
+        "id": str(r.variant_id),
+        "sku": r.sku,
+        "title": r.variant_title,
+        "barcode": r.barcode,
+        "weight_grams": r.weight_grams,
+        "price": _str(r.price),
+        "compare_at": _str(r.compare_at),
+    }
+
+
+class _NdjsonEncoder:
+    """Rows arrive ordered by product, so one product is buffered at a time."""
+
+    def __init__(self):
+        self._current: dict | None = None
+
+    def feed(self, rows) -> str:
+        out = []
+        for r in rows:
+            if self._current is None or self._current["id"] != str(r.id):
+                if self._current is not None:
+                    out.append(json.dumps(self._current, separators=(",", ":")))
+                self._current = _product(r)
+            if r.variant_id is not None:
+                self._current["variants"].append(_variant(r))
+        return "".join(line + "\n" for line in out)
+
+    def finish(self) -> str:
+        if self._current is None:
+            return ""
+        line, self._current = json.dumps(self._current, separators=(",", ":")) + "\n", None
+        return line
+
+
+class _CsvEncoder:
+    def __init__(self):
+        self._buf = io.StringIO()
+        self._writer = csv.writer(self._buf)
+        self._writer.writerow(CSV_COLUMNS)
+
+    def feed(self, rows) -> str:
+        w = self._writer
+        for r in rows:
+            images = r.images or []
+            first = min(images, key=lambda i: i.get("position", 0))["url"] if images else None
+            w.writerow((
+                r.id, r.slug, r.title, r.brand, getattr(r.status, "value", r.status), r.default_currency,
+                r.updated_at.isoformat(), first, r.variant_id, r.sku, r.variant_title, r.barcode,
+                r.weight_grams, r.price, r.compare_at,
+            ))
+        out = self._buf.getvalue()
+        self._buf.seek(0)
+        self._buf.truncate()
+        return out
+
+    def finish(self) -> str:
+        return self.feed(())
+
+
+_ENCODERS = {"ndjson": _NdjsonEncoder, "csv": _CsvEncoder}
+
+
+class _Identity:
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _compressor(compression: str | None):
+    if compression == "gzip":
+        return zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)   # wbits 31 => gzip container
+    if compression == "zstd":
+        import zstandard   # optional; callers check zstd_available() first
+        return zstandard.ZstdCompressor(level=EXPORT_ZSTD_LEVEL).compressobj()
+    return _Identity()
+
+
+def media_type(fmt: str, compression: str | None) -> str:
+    return COMPRESSIONS[compression][0] if compression else FORMATS[fmt]
+
+
+def filename(fmt: str, compression: str | None) -> str:
+    return f"catalog.{fmt}" + (COMPRESSIONS[compression][1] if compression else "")
+
+
+async def export_chunks(
+    session: AsyncSession,
+    fmt: str = "ndjson",
+    compression: str | None = None,
+    updated_since: datetime | None = None,
+    should_stop: Callable[[], Awaitable[bool]] | None = None,
+) -> AsyncIterator[bytes]:
+    """Encoded (and compressed) export, one chunk per fetched batch; stops early if `should_stop()`."""
+    encoder = _ENCODERS[fmt]()
+    compressor = _compressor(compression)
+    counter = EXPORTED_ROWS.labels(fmt)
+    result = await session.stream(export_stmt(updated_since).execution_options(yield_per=EXPORT_BATCH))
+    total = 0
+    try:
+        async for rows in result.partitions():
+            chunk = compressor.compress(encoder.feed(rows).encode())
+            total += len(rows)
+            counter.value += len(rows)
+            if chunk:
+                yield chunk
+            if should_stop is not None and await should_stop():
+                log.info("export stopped after %s rows: client went away", total)
+                return
+        yield compressor.compress(encoder.finish().encode()) + compressor.flush()
+        log.info("export finished: %s rows (%s, %s)", total, fmt, compression or "uncompressed")
+    finally:
+        await result.close()     # releases the server-side cursor on early exit too
+
+
+class ExportResponse(StreamingResponse):
+    """
+    Streams an export, then closes `stack` (the limiter slot and the read session) however the
+    response ends: finished, failed, or the client gone before or during the stream.
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], stack: AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self._stack = stack
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()    # the cursor goes before its session
+                await self._stack.aclose()
+
+
+# ---------- CLI ----------
+
+def _parse_since(value: str) -> datetime:
+    ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+async def _cli(args) -> None:
+    from lib.db.postgres import read_session
+
+    out = open(args.output, "wb") if args.output != "-" else sys.stdout.buffer
+    try:
+        async with read_session() as session:
+            async for chunk in export_chunks(session, args.format, args.compression, args.updated_since):
+                out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    p = argparse.ArgumentParser(prog="python -m src.catalog.export", description="Stream the catalog to a file.")
+    p.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    p.add_argument("--compression", choices=sorted(COMPRESSIONS))
+    p.add_argument("--updated-since", type=_parse_since, help="ISO timestamp; only products changed after it")
+    p.add_argument("-o", "--output", default="-", help="file path, or - for stdout (default)")
+    args = p.parse_args(argv)
+    if args.compression == "zstd" and not zstd_available():
+        p.error("zstd compression needs the 'zstandard' package")
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    asyncio.run(_cli(args))
+
+
+if __name__ == "__main__":
+    main()
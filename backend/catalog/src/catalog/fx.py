@@ -0,0 +1,179 @@
+# src/catalog/fx.py
+"""
+Currency conversion for catalog reads.
+
+Rates live in an immutable in-memory `FxTable` (units of each currency per 1 unit of the
+base currency). A background task reloads it from FX_RATES_FILE or FX_RATES_URL every
+FX_REFRESH_SECONDS and swaps the module reference in one assignment, so a request always
+converts a whole page against one consistent table. Amounts are rounded to the target
+currency's minor unit (banker's rounding), or to its cash increment where one is configured.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from decimal import Decimal, ROUND_HALF_EVEN
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+log = logging.getLogger("catalog.fx")
+
+FX_BASE = os.getenv("FX_BASE_CURRENCY", "USD")
+FX_RATES_FILE = os.getenv("FX_RATES_FILE", "")
+FX_RATES_URL = os.getenv("FX_RATES_URL", "")
+FX_REFRESH_SECONDS = float(os.getenv("FX_REFRESH_SECONDS", "300"))
+
+# ISO 4217 minor units where they differ from 2
+MINOR_UNITS = {
+    "BIF": 0, "CLP": 0, "DJF": 0, "GNF": 0, "ISK": 0, "JPY": 0, "KMF": 0, "KRW": 0, "PYG": 0,
+    "RWF": 0, "UGX": 0, "UYI": 0, "VND": 0, "VUV": 0, "XAF": 0, "XOF": 0, "XPF": 0,
+    "BHD": 3, "IQD": 3, "JOD": 3, "KWD": 3, "LYD": 3, "OMR": 3, "TND": 3,
+}
+# smallest amount actually charged, where coarser than the minor unit (e.g. CHF=0.05)
+CASH_INCREMENTS = {
+    k: Decimal(v) for k, v in
+    (pair.split("=") for pair in os.getenv("FX_CASH_INCREMENTS", "").split(",") if "=" in pair)
+}
+
+
+class FxTable(NamedTuple):
+    base: str
+    rates: dict[str, Decimal]     # currency -> units per 1 base
+    version: str                  # changes whenever the rates do; part of ETags / cache keys
+    loaded_at: float
+
+    def supports(self, currency: str) -> bool:
+        return currency in self.rates
+
+    def rate(self, src: str, dst: str) -> Decimal | None:
+        if src == dst:
+            return Decimal(1)
+        a, b = self.rates.get(src), self.rates.get(dst)
+        return None if a is None or b is None else b / a
+
+
+_table = FxTable(FX_BASE, {FX_BASE: Decimal(1)}, "base", time.time())
+_task: asyncio.Task | None = None
+
+
+def current() -> FxTable:
+    return _table
+
+
+def _quantum(currency: str) -> Decimal:
+    return CASH_INCREMENTS.get(currency) or Decimal(1).scaleb(-MINOR_UNITS.get(currency, 2))
+
+
+def convert_many(amounts: list[Decimal | None], src: str, dst: str, table: FxTable) -> list[Decimal | None] | None:
+    """
+    Convert a flat list of amounts from `src` to `dst` in one pass: the rate and the rounding
+    quantum are resolved once per call, not per amount. None if the pair isn't in the table.
+    """
+    rate = table.rate(src, dst)
+    if rate is None:
+        return None
+    q = _quantum(dst)
+    if q.as_tuple().digits == (1,):   # a power of ten: plain minor-unit rounding
+        return [None if a is None else (a * rate).quantize(q, ROUND_HALF_EVEN) for a in amounts]
+    # cash increment (0.05, 5...): round to a multiple of it
+    return [None if a is None else ((a * rate) / q).quantize(Decimal(1), ROUND_HALF_EVEN) * q for a in amounts]
+
+
+def parse_rates(doc: dict) -> FxTable:
+    base = doc.get("base", FX_BASE)
+    rates = {k.upper(): Decimal(str(v)) for k, v in doc["rates"].items()}
+    rates[base] = Decimal(1)
+    if any(v <= 0 for v in rates.values()):
+        raise ValueError("FX rates must be positive")
+    version = str(doc.get("version") or doc.get("timestamp") or rates_digest(base, rates))
+    return FxTable(base, rates, version, time.time())
+
+
+def rates_digest(base: str, rates: dict[str, Decimal]) -> str:
+    """Same rates, same digest, in every worker and across restarts (unlike hash(), which is salted)."""
+    canonical = json.dumps(
+        {"base": base, "rates": {k: format(v.normalize(), "f") for k, v in rates.items()}},
+        sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+async def _fetch() -> dict | None:
+    if FX_RATES_FILE:
+        return json.loads(await asyncio.to_thread(Path(FX_RATES_FILE).read_text))
+    if FX_RATES_URL:
+        import httpx
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            r = await client.get(FX_RATES_URL)
+            r.raise_for_status()
+            return r.json()
+    return None
+
+
+async def refresh() -> bool:
+    """Load and swap in a new table; the old one stays in place on any error."""
+    global _table
+    try:
+        doc = await _fetch()
+        if doc is None:
+            return False
+        table = parse_rates(doc)
+    except Exception as e:
+        log.warning("FX refresh failed, keeping version %s: %s", _table.version, e)
+        return False
+    if table.version != _table.version:
+        log.info("FX rates %s -> %s (%s currencies)", _table.version, table.version, len(table.rates))
+    _table = table
+    return True
+
+
+async def _refresher() -> None:
+    while True:
+        await refresh()
+        await asyncio.sleep(FX_REFRESH_SECONDS)
+
+
+async def start_fx_refresh() -> None:
+    global _task
+    if _task is None and (FX_RATES_FILE or FX_RATES_URL):
+        _task = asyncio.create_task(_refresher())
+
+
+async def stop_fx_refresh() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
+
+
+def apply_currency(products: Iterable, currency: str, table: FxTable) -> None:
+    """
+    Re-price read models (ProductListItem / ProductDetailRead) in place. All amounts of a page
+    are gathered per source currency and converted together. Products whose currency the table
+    doesn't know keep their prices; `currency` on each product says which one applies.
+    """
+    groups: dict[str, tuple[list, list]] = {}
+    for p in products:
+        objs, amounts = groups.setdefault(p.default_currency, ([], []))
+        objs.append(p)
+        listing = getattr(p, "listing", None)
+        if listing is not None:
+            amounts += (listing.min_price, listing.max_price)
+        for v in getattr(p, "variants", ()):
+            amounts += (v.price, v.compare_at)
+    for src, (objs, amounts) in groups.items():
+        converted = convert_many(amounts, src, currency, table)
+        if converted is None:
+            for p in objs:
+                p.currency = src
+            continue
+        it = iter(converted)
+        for p in objs:
+            p.currency = currency
+            listing = getattr(p, "listing", None)
+            if listing is not None:
+                listing.min_price, listing.max_price = next(it), next(it)
+            for v in getattr(p, "variants", ()):
+                v.price, v.compare_at = next(it), next(it)
@@ -1,42 +1,236 @@
+import os
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from datetime import datetime
 from uuid import UUID
-from fastapi import APIRouter, Depends, Query, status, HTTPException
+from fastapi import APIRouter, Depends, Query, status, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, joinedload, raiseload, contains_eager
 from sqlalchemy.exc import IntegrityError
+from pydantic import TypeAdapter
 
-from lib.db.postgres import get_session
-from src.models import Product, ProductVariant                      # <-- import Variant too
+from lib.db.postgres import get_session, get_read_session, read_session
+from lib.observability.metrics import CacheStats
+from lib.http.conditional import (
+    weak_etag, is_not_modified, has_conditional_headers, validator_headers, not_modified
+)
+from src.models import Product, ProductVariant, ProductListing      # <-- import Variant too
 from src.catalog.basemodels import (
-    ProductCreate, ProductRead, ProductDetailRead
+    ProductCreate, ProductListItem, ProductDetailRead, ProductBatchIn, ProductBatchRead, SuggestionRead,
+    VariantBulkUpdateIn, VariantBulkUpdateRead,
 )
+from src.catalog import fx, suggest, export, bulk
 
 router = APIRouter()
 
-@router.get("/products", response_model=list[ProductRead])
+# Sent with every catalog read; validators (ETag / Last-Modified) let clients and nginx revalidate cheaply.
+DETAIL_CACHE_CONTROL = os.getenv("CATALOG_DETAIL_CACHE_CONTROL", "public, max-age=0, must-revalidate")
+LIST_CACHE_CONTROL = os.getenv("CATALOG_LIST_CACHE_CONTROL", "public, max-age=0, must-revalidate")
+# Upper bound on ids per batch request (cart / wishlist sized).
+BATCH_MAX_IDS = int(os.getenv("CATALOG_BATCH_MAX_IDS", "100"))
+# Converted listing pages kept as serialized JSON, keyed by their ETag (members, versions, currency, FX version).
+FX_PAGE_CACHE_SIZE = int(os.getenv("CATALOG_FX_PAGE_CACHE_SIZE", "512"))
+
+# ?currency=XXX on reads: prices are converted with the current FX table (see src/catalog/fx.py)
+CurrencyQuery = Query(None, pattern=r"^[A-Z]{3}$", description="ISO 4217 code to price the response in")
+
+_fx_pages: OrderedDict[str, bytes] = OrderedDict()
+_fx_page_stats = CacheStats("fx_list_pages")
+_list_adapter = TypeAdapter(list[ProductListItem])
+
+# sort=<field> ascending, sort=-<field> descending; all served from product_listing
+LIST_SORTS = {
+    "min_price": ProductListing.min_price,
+    "max_price": ProductListing.max_price,
+    "variant_count": ProductListing.variant_count,
+}
+
+# Statement builders are shared with src/catalog/warmup.py, which runs them at startup so
+# the compiled-statement and prepared-statement caches are hot before traffic arrives.
+
+def list_stmt(q: str | None, limit: int, sort: str | None, on_sale: bool | None):
+    # listing summaries come from product_listing; product_variants is never touched here (raiseload says so)
+    stmt = (
+        select(Product)
+        .outerjoin(ProductListing, ProductListing.product_id == Product.id)
+        .options(contains_eager(Product.listing), raiseload(Product.variants))
+        .limit(limit)
+    )
+    if q:
+        stmt = stmt.where(Product.title.ilike(f"%{q}%"))
+    if on_sale is not None:
+        stmt = stmt.where(ProductListing.on_sale.is_(on_sale))
+    if sort:
+        col = LIST_SORTS[sort.lstrip("-")]
+        order = col.desc() if sort.startswith("-") else col.asc()
+        stmt = stmt.order_by(order.nulls_last(), Product.id)
+    return stmt
+
+def detail_stmt():
+    # variants in one extra query; the image manifest rides along on the product row
+    return select(Product).options(selectinload(Product.variants), joinedload(Product.media))
+
+def updated_at_stmt(product_id: UUID):
+    return select(Product.updated_at).where(Product.id == product_id)
+
+def _fx_table(currency: str | None) -> fx.FxTable | None:
+    # one table per request, so every price on the page uses the same rates
+    if currency is None:
+        return None
+    table = fx.current()
+    if not table.supports(currency):
+        raise HTTPException(status_code=422, detail=f"Unsupported currency {currency}")
+    return table
+
+def _fx_key(currency: str | None, table: fx.FxTable | None) -> tuple:
+    return () if table is None else (currency, table.version)
+
+def _converted_page(etag: str, items, currency: str, table: fx.FxTable) -> bytes:
+    body = _fx_pages.get(etag)
+    if body is not None:
+        _fx_page_stats.hits.value += 1
+        _fx_pages.move_to_end(etag)
+        return body
+    _fx_page_stats.misses.value += 1
+    models = [ProductListItem.model_validate(p) for p in items]
+    fx.apply_currency(models, currency, table)
+    body = _list_adapter.dump_json(models)
+    _fx_pages[etag] = body
+    if len(_fx_pages) > FX_PAGE_CACHE_SIZE:
+        _fx_pages.popitem(last=False)
+    return body
+
+@router.get("/products", response_model=list[ProductListItem])
 async def list_products(
+    request: Request,
+    response: Response,
     q: str | None = None,
     limit: int = Query(20, le=100),
-    session: AsyncSession = Depends(get_session),
+    sort: str | None = Query(None, pattern=r"^-?(min_price|max_price|variant_count)$"),
+    on_sale: bool | None = None,
+    currency: str | None = CurrencyQuery,
+    session: AsyncSession = Depends(get_read_session),
 ):
-    stmt = select(Product).limit(limit)
-    if q:
-        stmt = stmt.where(Product.title.ilike(f"%{q}%"))
+    table = _fx_table(currency)
+    stmt = list_stmt(q, limit, sort, on_sale)
     res = await session.execute(stmt)
-    return res.scalars().unique().all()
+    items = res.scalars().unique().all()
 
-@router.get("/products/{product_id}", response_model=ProductDetailRead)
-async def get_product(product_id: UUID, session: AsyncSession = Depends(get_session)):
-    stmt = (
-        select(Product)
-        .options(selectinload(Product.variants))
-        .where(Product.id == product_id)
+    # the page is identified by its members and their versions; a 304 skips serialization and transfer
+    last_modified = max((p.updated_at for p in items), default=None)
+    etag = weak_etag(
+        q, limit, sort, on_sale, *_fx_key(currency, table), *(f"{p.id}:{p.updated_at.timestamp()}" for p in items)
     )
-    res = await session.execute(stmt)
+    headers = validator_headers(etag, last_modified, LIST_CACHE_CONTROL)
+    # ETag only: a product dropping off the page would not move max(updated_at)
+    if is_not_modified(request, etag):
+        return not_modified(headers)
+    if table is not None:
+        return Response(_converted_page(etag, items, currency, table), media_type="application/json", headers=headers)
+    response.headers.update(headers)
+    return items
+
+@router.get("/suggest", response_model=list[SuggestionRead])
+async def suggest_products(q: str = Query(..., max_length=100), limit: int = Query(8, ge=1, le=20)):
+    # answered from the in-memory prefix index (src/catalog/suggest.py); no database session
+    return [{"id": d.id, "title": d.title, "slug": d.slug, "brand": d.brand} for d in suggest.search(q, limit)]
+
+@router.get("/export")
+async def export_catalog(
+    request: Request,
+    fmt: str = Query("ndjson", alias="format", pattern=r"^(ndjson|csv)$"),
+    compression: str | None = Query(None, pattern=r"^(gzip|zstd)$"),
+    updated_since: datetime | None = Query(None, description="Only products changed after this time"),
+):
+    if compression == "zstd" and not export.zstd_available():
+        raise HTTPException(status_code=422, detail="zstd compression is not available")
+    # the slot and the session outlive this handler; ExportResponse closes them when the response ends
+    stack = AsyncExitStack()
+    try:
+        await stack.enter_async_context(export.EXPORT_LIMITER.slot())
+        session = await stack.enter_async_context(read_session())
+    except BaseException:
+        await stack.aclose()
+        raise
+    return export.ExportResponse(
+        export.export_chunks(session, fmt, compression, updated_since, request.is_disconnected),
+        stack,
+        media_type=export.media_type(fmt, compression),
+        headers={"Content-Disposition": f'attachment; filename="{export.filename(fmt, compression)}"'},
+    )
+
+async def _load_batch(session: AsyncSession, ids: list[UUID], currency: str | None = None) -> ProductBatchRead:
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {BATCH_MAX_IDS} ids per batch")
+    table = _fx_table(currency)
+    if not ids:
+        return ProductBatchRead()
+    # two queries whatever the batch size: products, then all their variants (selectin)
+    res = await session.execute(detail_stmt().where(Product.id.in_(ids)))
+    found = {p.id: p for p in res.scalars().all()}
+    items = [ProductDetailRead.model_validate(found[i]) for i in ids if i in found]
+    if table is not None:
+        fx.apply_currency(items, currency, table)
+    return ProductBatchRead(items=items, missing=[i for i in ids if i not in found])
+
+@router.get("/products:batch", response_model=ProductBatchRead)
+async def get_products_batch(
+    ids: str = Query(..., description="Comma-separated product ids"),
+    currency: str | None = CurrencyQuery,
+    session: AsyncSession = Depends(get_read_session),
+):
+    try:
+        parsed = [UUID(i) for i in ids.split(",") if i.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be comma-separated UUIDs")
+    return await _load_batch(session, parsed, currency)
+
+@router.post("/products:batch", response_model=ProductBatchRead)
+async def post_products_batch(
+    payload: ProductBatchIn,
+    currency: str | None = CurrencyQuery,
+    session: AsyncSession = Depends(get_read_session),
+):
+    # same as GET, for id lists that would overflow a URL
+    return await _load_batch(session, payload.ids, currency)
+
+def _product_etag(product_id, updated_at, fx_key: tuple = ()) -> str:
+    # variant triggers and the media event consumer bump products.updated_at, keeping this honest
+    return weak_etag(product_id, updated_at.timestamp(), *fx_key)
+
+@router.get("/products/{product_id}", response_model=ProductDetailRead)
+async def get_product(
+    product_id: UUID,
+    request: Request,
+    response: Response,
+    currency: str | None = CurrencyQuery,
+    session: AsyncSession = Depends(get_read_session),
+):
+    table = _fx_table(currency)
+    fx_key = _fx_key(currency, table)
+    # Conditional request: answer from updated_at alone, before loading the product and its variants.
+    if has_conditional_headers(request):
+        updated_at = (await session.execute(updated_at_stmt(product_id))).scalar_one_or_none()
+        if updated_at is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        headers = validator_headers(_product_etag(product_id, updated_at, fx_key), updated_at, DETAIL_CACHE_CONTROL)
+        # converted prices also move with the FX table, which Last-Modified doesn't see: ETag only then
+        if is_not_modified(request, headers["ETag"], updated_at if table is None else None):
+            return not_modified(headers)
+
+    res = await session.execute(detail_stmt().where(Product.id == product_id))
     p = res.scalar_one_or_none()
     if not p:
         raise HTTPException(status_code=404, detail="Product not found")
-    return p
+    suggest.record_view(p.id)
+    response.headers.update(validator_headers(_product_etag(p.id, p.updated_at, fx_key), p.updated_at, DETAIL_CACHE_CONTROL))
+    if table is None:
+        return p
+    out = ProductDetailRead.model_validate(p)
+    fx.apply_currency([out], currency, table)
+    return out
 
 @router.post("/products", status_code=status.HTTP_201_CREATED, response_model=ProductDetailRead)
 async def create_product(payload: ProductCreate, session: AsyncSession = Depends(get_session)):
@@ -51,14 +245,26 @@ async def create_product(payload: ProductCreate, session: AsyncSession = Depends
             session.add(ProductVariant(product_id=p.id, **v.model_dump(exclude_unset=True)))
 
         await session.commit()
-
-        # reload with variants for response
-        res = await session.execute(
-            select(Product).options(selectinload(Product.variants)).where(Product.id == p.id)
+        await suggest.publish_product_change(
+            suggest.make_doc(p.id, p.title, p.brand, p.slug, [v.sku for v in payload.variants])
         )
+
+        # reload with variants and (empty) images for the response
+        res = await session.execute(detail_stmt().where(Product.id == p.id))
         return res.scalar_one()
 
     except IntegrityError as e:
         await session.rollback()
         # likely duplicate slug or sku
         raise HTTPException(status_code=409, detail="Duplicate slug or sku") from e
+
+@router.post("/variants:bulk-update", response_model=VariantBulkUpdateRead)
+async def bulk_update_variants(payload: VariantBulkUpdateIn, session: AsyncSession = Depends(get_session)):
+    items = payload.items
+    if len(items) > bulk.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"At most {bulk.BULK_MAX_ITEMS} items per request")
+    if len({i.sku for i in items}) != len(items):
+        raise HTTPException(status_code=422, detail="Duplicate sku in items")
+    # chunks commit independently; the per-SKU results say what was applied
+    results = await bulk.apply_variant_updates(session, items)
+    return VariantBulkUpdateRead(results=results, updated=sum(r.status == "updated" for r in results))
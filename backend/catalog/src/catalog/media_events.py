@@ -0,0 +1,169 @@
+# src/catalog/media_events.py
+"""
+Consumes media_storage's image manifest events (Redis stream) into `product_media`.
+
+Each event carries a product's full manifest with a monotonically increasing version, so
+applying is an upsert that only moves forward; redelivery and reordering are harmless.
+A changed manifest also bumps products.updated_at so product ETags change with it.
+
+An event that can't be applied (its product isn't in the catalog yet, the database is
+down) stays unacknowledged. Entries idle in the group's pending list for
+MEDIA_EVENTS_RETRY_IDLE_SECONDS are claimed back with XAUTOCLAIM and tried again; after
+MEDIA_EVENTS_MAX_DELIVERIES attempts they are moved to MEDIA_EVENTS_DEAD_STREAM and acked.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+
+from sqlalchemy import update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+
+from lib.db.postgres import SessionLocal
+from lib.redis.index import get_client
+from src.models import Product, ProductMedia
+
+log = logging.getLogger("catalog.media_events")
+
+MEDIA_EVENTS_STREAM = os.getenv("MEDIA_EVENTS_STREAM", "media:events")
+MEDIA_EVENTS_GROUP = os.getenv("MEDIA_EVENTS_GROUP", "catalog")
+# stable per host so a restarted container picks up its own unacknowledged events
+CONSUMER = os.getenv("MEDIA_EVENTS_CONSUMER", socket.gethostname())
+BATCH = int(os.getenv("MEDIA_EVENTS_BATCH", "100"))
+RETRY_IDLE_MS = int(float(os.getenv("MEDIA_EVENTS_RETRY_IDLE_SECONDS", "30")) * 1000)
+MAX_DELIVERIES = int(os.getenv("MEDIA_EVENTS_MAX_DELIVERIES", "10"))
+DEAD_STREAM = os.getenv("MEDIA_EVENTS_DEAD_STREAM", "media:events:dead")
+DEAD_MAXLEN = int(os.getenv("MEDIA_EVENTS_DEAD_MAXLEN", "10000"))
+
+_task: asyncio.Task | None = None
+
+
+class UnknownProduct(Exception):
+    """The manifest's product isn't in the catalog (yet)."""
+
+
+async def apply_manifest(product_id: uuid.UUID, version: int, images: list[dict]) -> bool:
+    """
+    Store the manifest unless a newer one is already there; True if it was applied.
+    Raises UnknownProduct when there is no product to attach it to.
+    """
+    stmt = pg_insert(ProductMedia).values(product_id=product_id, images=images, version=version)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProductMedia.product_id],
+        set_={"images": stmt.excluded.images, "version": stmt.excluded.version, "updated_at": func.now()},
+        where=ProductMedia.version < stmt.excluded.version,
+    )
+    async with SessionLocal() as session:
+        try:
+            applied = (await session.execute(stmt)).rowcount == 1
+            if applied:
+                await session.execute(
+                    update(Product).where(Product.id == product_id).values(updated_at=func.now())
+                )
+            await session.commit()
+            return applied
+        except IntegrityError:
+            await session.rollback()
+            raise UnknownProduct(product_id)
+
+
+async def _handle(fields: dict) -> None:
+    if fields.get("type") != "product.images":
+        return
+    manifest = json.loads(fields["data"])
+    await apply_manifest(uuid.UUID(fields["product_id"]), int(manifest["version"]), manifest["images"])
+
+
+async def _process(r, entry_id: str, fields: dict) -> None:
+    """Apply one entry and ack it; on failure leave it pending for `_reclaim` to retry."""
+    try:
+        await _handle(fields)
+    except (KeyError, ValueError) as e:
+        log.warning("dropping malformed media event %s: %s", entry_id, e)
+    except UnknownProduct as e:
+        log.info("media event %s for unknown product %s; will retry", entry_id, e)
+        return
+    except Exception as e:
+        log.warning("media event %s failed, will retry: %s", entry_id, e)
+        return
+    await r.xack(MEDIA_EVENTS_STREAM, MEDIA_EVENTS_GROUP, entry_id)
+
+
+async def _dead_letter(r, entry_id: str, deliveries: int) -> None:
+    entries = await r.xrange(MEDIA_EVENTS_STREAM, entry_id, entry_id)
+    fields = entries[0][1] if entries else {}    # trimmed from the stream meanwhile
+    await r.xadd(DEAD_STREAM, {**fields, "source_id": entry_id, "deliveries": deliveries},
+                 maxlen=DEAD_MAXLEN, approximate=True)
+    await r.xack(MEDIA_EVENTS_STREAM, MEDIA_EVENTS_GROUP, entry_id)
+    log.warning("media event %s moved to %s after %s deliveries", entry_id, DEAD_STREAM, deliveries)
+
+
+async def _reclaim(r) -> None:
+    """Retry entries left pending (by us or a consumer that went away) for RETRY_IDLE_MS."""
+    for p in await r.xpending_range(MEDIA_EVENTS_STREAM, MEDIA_EVENTS_GROUP, min="-", max="+",
+                                    count=BATCH, idle=RETRY_IDLE_MS):
+        if p["times_delivered"] >= MAX_DELIVERIES:
+            await _dead_letter(r, p["message_id"], p["times_delivered"])
+    start = "0-0"
+    while True:
+        start, entries, deleted = (await r.xautoclaim(
+            MEDIA_EVENTS_STREAM, MEDIA_EVENTS_GROUP, CONSUMER, RETRY_IDLE_MS, start_id=start, count=BATCH,
+        ))[:3]
+        for entry_id in deleted:         # trimmed from the stream while pending; nothing to retry
+            await r.xack(MEDIA_EVENTS_STREAM, MEDIA_EVENTS_GROUP, entry_id)
+        for entry_id, fields in entries:
+            await _process(r, entry_id, fields)
+        if start in ("0-0", b"0-0"):
+            return
+
+
+async def _consume() -> None:
+    backoff = 0.5
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            r = await get_client()
+            try:
+                await r.xgroup_create(MEDIA_EVENTS_STREAM, MEDIA_EVENTS_GROUP, id="0", mkstream=True)
+            except Exception as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+            # first our own pending entries (crash / restart), then new ones
+            cursor = "0"
+            next_reclaim = loop.time()
+            while True:
+                resp = await r.xreadgroup(
+                    MEDIA_EVENTS_GROUP, CONSUMER, {MEDIA_EVENTS_STREAM: cursor}, count=BATCH, block=5000
+                )
+                entries = resp[0][1] if resp else []
+                if cursor != ">":
+                    # walk our pending history once; what fails again stays pending for _reclaim
+                    cursor = entries[-1][0] if entries else ">"
+                for entry_id, fields in entries:
+                    await _process(r, entry_id, fields)
+                if loop.time() >= next_reclaim:
+                    await _reclaim(r)
+                    next_reclaim = loop.time() + RETRY_IDLE_MS / 2000
+                backoff = 0.5
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("media event consumer error: %s", e)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+async def start_media_consumer() -> None:
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_consume())
+
+
+async def stop_media_consumer() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
@@ -0,0 +1,456 @@
+# src/catalog/suggest.py
+"""
+Search-as-you-type suggestions from an in-memory prefix index.
+
+The index is a sorted array of normalized keys (full title, title words, full brand, brand
+words, SKUs) with a parallel array of document numbers; answering never touches Postgres.
+Documents are numbered most popular first, so within one key the entries are already in
+popularity order: a prefix lookup bisects to the first matching key and takes the first few
+entries of each key it covers, jumping over the rest (bounded work however broad the prefix).
+Results are cached per query until the index next changes. Popularity comes from product
+detail views, counted in-process, merged into a shared Redis zset and read back as weights.
+
+Lifecycle:
+- built from Postgres at startup (a warm-up step) and rebuilt every SUGGEST_REBUILD_SECONDS
+  as a safety net; a build fills a fresh index and swaps it in;
+- kept current between builds by `catalog:products` stream events, which every replica reads
+  (plain XREAD, not a consumer group). Replaced documents are tombstoned and new entries go to
+  a small sorted delta searched alongside the main arrays. Once a quarter of the entries are
+  dead or the delta outgrows SUGGEST_DELTA_MAX, a background task rebuilds the arrays from the
+  in-memory documents in a worker thread, replays the changes made meanwhile and swaps it in;
+- bounded by SUGGEST_MEMORY_MB (estimated): the most popular products are indexed first and
+  whatever does not fit is left out and counted.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import math
+import os
+import re
+import sys
+import unicodedata
+import uuid
+from array import array
+from collections import Counter, OrderedDict
+from typing import NamedTuple
+
+from sqlalchemy import select
+
+from lib.db.postgres import SessionLocal
+from lib.observability.metrics import REGISTRY
+from lib.redis.index import get_client
+from src.models import Product, ProductVariant
+
+log = logging.getLogger("catalog.suggest")
+
+SUGGEST_MEMORY_BYTES = int(float(os.getenv("SUGGEST_MEMORY_MB", "64")) * 1024 * 1024)
+SUGGEST_SCAN_KEYS = int(os.getenv("SUGGEST_SCAN_KEYS", "32"))        # distinct keys visited per lookup
+SUGGEST_CACHE_SIZE = int(os.getenv("SUGGEST_CACHE_SIZE", "4096"))
+SUGGEST_REBUILD_SECONDS = float(os.getenv("SUGGEST_REBUILD_SECONDS", "3600"))
+SUGGEST_POPULARITY_SECONDS = float(os.getenv("SUGGEST_POPULARITY_SECONDS", "30"))
+SUGGEST_POPULAR_MAX = int(os.getenv("SUGGEST_POPULAR_MAX", "50000"))  # weights kept for the top N products
+SUGGEST_DELTA_MAX = int(os.getenv("SUGGEST_DELTA_MAX", "4096"))       # entries added since the last build
+PRODUCT_EVENTS_STREAM = os.getenv("PRODUCT_EVENTS_STREAM", "catalog:products")
+PRODUCT_EVENTS_MAXLEN = int(os.getenv("PRODUCT_EVENTS_MAXLEN", "100000"))
+POPULARITY_KEY = os.getenv("SUGGEST_POPULARITY_KEY", "catalog:popularity")
+
+ENTRIES = REGISTRY.gauge("suggest_index_entries", "Keys in the suggestion index.").labels()
+BYTES = REGISTRY.gauge("suggest_index_bytes", "Estimated size of the suggestion index.").labels()
+DROPPED = REGISTRY.gauge("suggest_index_dropped_products", "Products left out by the memory budget.").labels()
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def normalize(text: str) -> list[str]:
+    """Case-folded, accent-free words: 'Crème Brûlée' -> ['creme', 'brulee']."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _WORD.findall(text.casefold())
+
+
+class Doc(NamedTuple):
+    id: str
+    title: str
+    brand: str | None
+    slug: str
+    skus: tuple[str, ...]
+    words: tuple[str, ...]       # every normalized word, for multi-word filtering
+
+
+def make_doc(id, title: str, brand: str | None, slug: str, skus) -> Doc:
+    skus = tuple(skus)
+    words = normalize(" ".join([title, brand or "", *skus]))
+    return Doc(str(id), title, brand, slug, skus, tuple(dict.fromkeys(words)))
+
+
+def _doc_keys(doc: Doc) -> set[str]:
+    keys = set()
+    for text in (doc.title, doc.brand, *doc.skus):
+        if text:
+            words = normalize(text)
+            if words:
+                keys.add(" ".join(words))
+                keys.update(words)
+    return keys
+
+
+def _cost(key: str) -> int:
+    return sys.getsizeof(key) + 8 + 4      # the string, its list slot, its refs slot
+
+
+class SuggestIndex:
+    def __init__(self, weights: dict[str, float] | None = None, budget: int = SUGGEST_MEMORY_BYTES):
+        self.keys: list[str] = []
+        self.refs = array("I")
+        # entries added since the build, kept apart so an upsert never shifts the main arrays
+        self.delta_keys: list[str] = []
+        self.delta_refs: list[int] = []
+        self.docs: list[Doc | None] = []
+        self.by_id: dict[str, int] = {}
+        self.weights: dict[str, float] = weights or {}
+        self.budget = budget
+        self.bytes = 0
+        self.dead = 0                # entries pointing at tombstoned docs
+        self.dropped = 0             # products left out for lack of budget
+        self.journal: list[tuple[str, object]] | None = None    # changes recorded while a compaction runs
+        self._cache: OrderedDict[tuple, list[Doc]] = OrderedDict()
+
+    @classmethod
+    def build(cls, docs: list[Doc], weights: dict[str, float], budget: int = SUGGEST_MEMORY_BYTES) -> "SuggestIndex":
+        idx = cls(weights, budget)
+        pairs: list[tuple[str, int]] = []
+        # most popular first, so the budget cuts off the long tail
+        for doc in sorted(docs, key=lambda d: -weights.get(d.id, 0.0)):
+            keys = _doc_keys(doc)
+            cost = sum(map(_cost, keys))
+            if idx.bytes + cost > budget:
+                idx.dropped += 1
+                continue
+            n = len(idx.docs)
+            idx.docs.append(doc)
+            idx.by_id[doc.id] = n
+            idx.bytes += cost
+            pairs += ((k, n) for k in keys)
+        pairs.sort()
+        idx.keys = [k for k, _ in pairs]
+        idx.refs = array("I", (n for _, n in pairs))
+        idx._publish()
+        return idx
+
+    def set_weights(self, weights: dict[str, float]) -> None:
+        # re-ranks results; entry order keeps the build-time popularity until the next build
+        self.weights = weights
+        self._cache.clear()
+
+    def _publish(self) -> None:
+        self._cache.clear()
+        ENTRIES.set(len(self.keys) + len(self.delta_keys) - self.dead)
+        BYTES.set(self.bytes)
+        DROPPED.set(self.dropped)
+
+    def upsert(self, doc: Doc) -> bool:
+        """Index `doc`, replacing any previous version; False if it doesn't fit the budget."""
+        self.remove(doc.id)
+        if self.journal is not None:
+            self.journal.append(("upsert", doc))
+        keys = _doc_keys(doc)
+        cost = sum(map(_cost, keys))
+        if self.bytes + cost > self.budget:
+            self.dropped += 1
+            self._publish()
+            return False
+        n = len(self.docs)
+        self.docs.append(doc)
+        self.by_id[doc.id] = n
+        self.bytes += cost
+        for k in keys:
+            i = bisect.bisect_right(self.delta_keys, k)
+            self.delta_keys.insert(i, k)
+            self.delta_refs.insert(i, n)
+        self._publish()
+        return True
+
+    def remove(self, product_id: str) -> None:
+        n = self.by_id.pop(product_id, None)
+        if n is None:
+            return
+        if self.journal is not None:
+            self.journal.append(("remove", product_id))
+        keys = _doc_keys(self.docs[n])
+        self.docs[n] = None
+        self.dead += len(keys)
+        self.bytes -= sum(map(_cost, keys))
+        self._publish()
+
+    def needs_compaction(self) -> bool:
+        return self.dead * 4 > len(self.keys) + len(self.delta_keys) or len(self.delta_keys) > SUGGEST_DELTA_MAX
+
+    def compacted(self, live: list[Doc]) -> "SuggestIndex":
+        """A fresh index of `live` without tombstones or delta; touches no shared state, so it can run in a thread."""
+        fresh = SuggestIndex.build(live, self.weights, self.budget)
+        fresh.dropped += self.dropped
+        return fresh
+
+    def _scan(self, prefix: str, out: dict[int, None], per_key: int) -> None:
+        self._scan_run(self.keys, self.refs, prefix, out, per_key)
+        if self.delta_keys:
+            self._scan_run(self.delta_keys, self.delta_refs, prefix, out, per_key)
+
+    def _scan_run(self, keys, refs, prefix: str, out: dict[int, None], per_key: int) -> None:
+        docs = self.docs
+        i, stop = bisect.bisect_left(keys, prefix), len(keys)
+        for _ in range(SUGGEST_SCAN_KEYS):
+            if i >= stop or not keys[i].startswith(prefix):
+                return
+            run_end = bisect.bisect_right(keys, keys[i], i)
+            taken = 0
+            while i < run_end and taken < per_key:
+                n = refs[i]
+                if docs[n] is not None:
+                    out[n] = None
+                    taken += 1
+                i += 1
+            i = run_end
+
+    def search(self, q: str, limit: int = 10) -> list[Doc]:
+        words = normalize(q)
+        if not words:
+            return []
+        ck = (" ".join(words), limit)
+        hit = self._cache.get(ck)
+        if hit is not None:
+            self._cache.move_to_end(ck)
+            return hit
+        found: dict[int, None] = {}
+        # the query as a prefix of a whole title / brand / SKU ("nike air m", "ab-12")
+        self._scan(ck[0], found, limit)
+        if len(words) > 1 and len(found) < limit:
+            # words in any order: last one as a prefix, the others must prefix some word of the doc
+            rest = words[:-1]
+            extra: dict[int, None] = {}
+            self._scan(words[-1], extra, limit * 4)
+            for n in extra:
+                dw = self.docs[n].words
+                if all(any(w.startswith(r) for w in dw) for r in rest):
+                    found[n] = None
+        w = self.weights
+        docs = [self.docs[n] for n in found]
+        docs.sort(key=lambda d: (-w.get(d.id, 0.0), len(d.title), d.title))
+        docs = docs[:limit]
+        self._cache[ck] = docs
+        if len(self._cache) > SUGGEST_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return docs
+
+
+_index = SuggestIndex()
+_built = False
+_cursor = "$"          # stream id the event reader continues from
+_generation = 0        # bumped per build, so a read that straddles a swap is replayed
+_build_lock = asyncio.Lock()
+_compact_wanted = asyncio.Event()
+_views: Counter = Counter()
+_tasks: list[asyncio.Task] = []
+
+
+def search(q: str, limit: int = 10) -> list[Doc]:
+    return _index.search(q, limit)
+
+
+def record_view(product_id) -> None:
+    """Counted in-process; merged into Redis by the popularity loop."""
+    _views[str(product_id)] += 1
+
+
+# ---------- loading ----------
+
+async def _load_docs() -> list[Doc]:
+    async with SessionLocal() as session:
+        products = (await session.execute(select(Product.id, Product.title, Product.brand, Product.slug))).all()
+        skus: dict = {}
+        for pid, sku in (await session.execute(select(ProductVariant.product_id, ProductVariant.sku))).all():
+            skus.setdefault(pid, []).append(sku)
+    return [make_doc(p.id, p.title, p.brand, p.slug, skus.get(p.id, ())) for p in products]
+
+
+async def _load_weights() -> dict[str, float]:
+    try:
+        r = await get_client()
+        top = await r.zrevrange(POPULARITY_KEY, 0, SUGGEST_POPULAR_MAX - 1, withscores=True)
+    except Exception as e:
+        log.warning("suggest popularity unavailable: %s", e)
+        return dict(_index.weights)
+    return {pid: math.log1p(score) for pid, score in top}
+
+
+async def _stream_tip() -> str:
+    try:
+        r = await get_client()
+        last = await r.xrevrange(PRODUCT_EVENTS_STREAM, count=1)
+        return last[0][0] if last else "0"
+    except Exception:
+        return "$"
+
+
+async def rebuild() -> None:
+    async with _build_lock:
+        await _build()
+
+
+async def ensure_built() -> None:
+    async with _build_lock:
+        if not _built:
+            await _build()
+
+
+async def _build() -> None:
+    """Build a fresh index from Postgres, swap it in and replay change events from before the load."""
+    global _index, _built, _cursor, _generation
+    tip = await _stream_tip()     # taken first: events after it are replayed on top (upserts are idempotent)
+    docs = await _load_docs()
+    weights = await _load_weights()
+    _index = await asyncio.to_thread(SuggestIndex.build, docs, weights)
+    _built = True
+    _cursor, _generation = tip, _generation + 1
+    log.info("suggest index built: %s products, %s keys, ~%s KiB, %s over budget",
+             len(_index.by_id), len(_index.keys), _index.bytes // 1024, _index.dropped)
+
+
+async def _compact() -> None:
+    """Rebuild the arrays from the in-memory docs off the event loop; changes made meanwhile are replayed."""
+    global _index
+    async with _build_lock:
+        old = _index
+        if not old.needs_compaction():
+            return
+        live = list(filter(None, old.docs))
+        old.journal = []
+        try:
+            fresh = await asyncio.to_thread(old.compacted, live)
+        finally:
+            journal, old.journal = old.journal, None
+        for op, arg in journal:
+            if op == "upsert":
+                fresh.upsert(arg)
+            else:
+                fresh.remove(arg)
+        fresh.set_weights(old.weights)
+        _index = fresh
+    log.info("suggest index compacted: %s products, %s keys", len(fresh.by_id), len(fresh.keys))
+
+
+def _changed() -> None:
+    if _index.needs_compaction():
+        _compact_wanted.set()
+
+
+# ---------- product change events ----------
+
+async def publish_product_change(doc: Doc | None, product_id=None) -> None:
+    """Apply locally and tell the other replicas; `doc=None` removes `product_id`."""
+    if doc is not None:
+        _index.upsert(doc)
+        fields = {"type": "product.upsert", "product_id": doc.id, "data": json.dumps(doc._asdict())}
+    else:
+        _index.remove(str(product_id))
+        fields = {"type": "product.delete", "product_id": str(product_id)}
+    _changed()
+    try:
+        r = await get_client()
+        await r.xadd(PRODUCT_EVENTS_STREAM, fields, maxlen=PRODUCT_EVENTS_MAXLEN, approximate=True)
+    except Exception as e:
+        # other replicas catch up at their next rebuild
+        log.warning("could not publish product change %s: %s", fields["product_id"], e)
+
+
+def _apply(fields: dict) -> None:
+    kind = fields.get("type")
+    if kind == "product.upsert":
+        d = json.loads(fields["data"])
+        _index.upsert(make_doc(d["id"], d["title"], d.get("brand"), d["slug"], d.get("skus") or ()))
+    elif kind == "product.delete":
+        _index.remove(str(uuid.UUID(fields["product_id"])))
+    _changed()
+
+
+async def _follow() -> None:
+    global _cursor
+    backoff = 0.5
+    while True:
+        try:
+            await ensure_built()
+            r = await get_client()
+            gen = _generation
+            resp = await r.xread({PRODUCT_EVENTS_STREAM: _cursor}, count=500, block=5000)
+            if gen != _generation:
+                continue           # a rebuild swapped the index meanwhile and reset the cursor
+            for _stream, entries in resp or ():
+                for entry_id, fields in entries:
+                    try:
+                        _apply(fields)
+                    except (KeyError, ValueError) as e:
+                        log.warning("dropping malformed product event %s: %s", entry_id, e)
+                    _cursor = entry_id
+            backoff = 0.5
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("product event reader error: %s", e)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+async def _rebuild_loop() -> None:
+    while True:
+        await asyncio.sleep(SUGGEST_REBUILD_SECONDS)
+        try:
+            await rebuild()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("suggest rebuild failed, keeping the current index: %s", e)
+
+
+async def _compact_loop() -> None:
+    while True:
+        await _compact_wanted.wait()
+        _compact_wanted.clear()
+        try:
+            await _compact()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("suggest compaction failed, keeping the current index: %s", e)
+
+
+async def _popularity_loop() -> None:
+    global _views
+    while True:
+        await asyncio.sleep(SUGGEST_POPULARITY_SECONDS)
+        views, _views = _views, Counter()
+        try:
+            r = await get_client()
+            if views:
+                async with r.pipeline(transaction=False) as pipe:
+                    for pid, n in views.items():
+                        pipe.zincrby(POPULARITY_KEY, n, pid)
+                    await pipe.execute()
+            # ranking only; the index entries themselves don't depend on weights
+            _index.set_weights(await _load_weights())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _views.update(views)
+            log.warning("suggest popularity sync failed: %s", e)
+
+
+async def start_suggest() -> None:
+    if not _tasks:
+        _tasks.extend(asyncio.create_task(fn()) for fn in (_follow, _rebuild_loop, _compact_loop, _popularity_loop))
+
+
+async def stop_suggest() -> None:
+    for t in _tasks:
+        t.cancel()
+    _tasks.clear()
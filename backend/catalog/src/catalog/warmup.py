@@ -0,0 +1,37 @@
+# src/catalog/warmup.py
+"""What "warm" means for catalog: pooled DB connections primed with the hot read statements, FX rates and the suggestion index loaded."""
+import os
+from uuid import UUID
+
+from lib.db.postgres import engine, read_engines
+from lib.lifecycle.index import start_warmup, warm_pool
+from src.models import Product
+from . import fx, suggest
+from .index import list_stmt, detail_stmt, updated_at_stmt
+
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "4"))
+
+_NIL = UUID(int=0)
+
+
+async def _prime_statements(session) -> None:
+    # the default listing page, product detail, batch and the conditional-GET probe
+    await session.execute(list_stmt(None, 20, None, None))
+    await session.execute(detail_stmt().where(Product.id == _NIL))
+    await session.execute(detail_stmt().where(Product.id.in_([_NIL])))
+    await session.execute(updated_at_stmt(_NIL))
+
+
+async def _db() -> None:
+    for e in (engine, *read_engines):
+        await warm_pool(e, WARMUP_DB_CONNECTIONS, _prime_statements)
+
+
+async def _fx() -> None:
+    # with a rate source configured, don't take ?currency= traffic on the base-only table
+    if (fx.FX_RATES_FILE or fx.FX_RATES_URL) and not await fx.refresh():
+        raise RuntimeError("FX rates not loaded")
+
+
+async def start_catalog_warmup() -> None:
+    await start_warmup([("db", _db), ("fx", _fx), ("suggest", suggest.ensure_built)])
@@ -0,0 +1,26 @@
+from __future__ import annotations
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from uuid import UUID
+from datetime import datetime
+
+class HoldItem(BaseModel):
+    variant_id: UUID
+    quantity: int = Field(gt=0)
+
+class HoldCreate(BaseModel):
+    items: List[HoldItem] = Field(min_length=1)
+    ttl_seconds: Optional[float] = Field(None, gt=0)     # defaults to INVENTORY_HOLD_TTL_SECONDS
+
+class HoldRead(BaseModel):
+    hold_id: UUID
+    expires_at: datetime
+
+class StockRead(BaseModel):
+    variant_id: UUID
+    on_hand: int
+    reserved: int
+    available: int
+
+class StockUpdate(BaseModel):
+    on_hand: int = Field(ge=0)
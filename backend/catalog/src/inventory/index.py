@@ -0,0 +1,59 @@
+import datetime as dt
+from uuid import UUID
+from fastapi import APIRouter, HTTPException, Response, status
+
+from .basemodels import HoldCreate, HoldRead, StockRead, StockUpdate
+from .module import get_store, OUTCOMES, HOLD_TTL_SECONDS, HOLD_MAX_TTL_SECONDS
+from .store import InsufficientStock, HoldExpired
+
+router = APIRouter()
+
+@router.post("/inventory/holds", status_code=status.HTTP_201_CREATED, response_model=HoldRead)
+async def create_hold(payload: HoldCreate):
+    """Reserve every item or none; the hold is released automatically after ttl_seconds."""
+    items: dict[UUID, int] = {}
+    for it in payload.items:
+        items[it.variant_id] = items.get(it.variant_id, 0) + it.quantity
+    ttl = min(payload.ttl_seconds or HOLD_TTL_SECONDS, HOLD_MAX_TTL_SECONDS)
+    store = await get_store()
+    try:
+        hold_id, deadline_ms = await store.reserve(items, ttl)
+    except InsufficientStock as e:
+        OUTCOMES.labels("reserve", "insufficient").value += 1
+        raise HTTPException(status_code=409, detail={"error": "insufficient_stock", "variant_id": str(e.variant_id)})
+    OUTCOMES.labels("reserve", "ok").value += 1
+    return HoldRead(hold_id=hold_id, expires_at=dt.datetime.fromtimestamp(deadline_ms / 1000, dt.timezone.utc))
+
+@router.post("/inventory/holds/{hold_id}/commit", status_code=status.HTTP_204_NO_CONTENT)
+async def commit_hold(hold_id: UUID):
+    store = await get_store()
+    try:
+        committed = await store.commit(hold_id)
+    except HoldExpired:
+        OUTCOMES.labels("commit", "expired").value += 1
+        raise HTTPException(status_code=410, detail="Hold expired")
+    if not committed:
+        OUTCOMES.labels("commit", "unknown").value += 1
+        raise HTTPException(status_code=404, detail="Hold not found")
+    OUTCOMES.labels("commit", "ok").value += 1
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.delete("/inventory/holds/{hold_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def release_hold(hold_id: UUID):
+    # idempotent: releasing an unknown / already settled hold is not an error
+    store = await get_store()
+    OUTCOMES.labels("release", "ok" if await store.release(hold_id) else "unknown").value += 1
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("/inventory/variants/{variant_id}", response_model=StockRead)
+async def get_stock(variant_id: UUID):
+    s = await (await get_store()).get(variant_id)
+    return StockRead(variant_id=variant_id, on_hand=s.on_hand, reserved=s.reserved, available=s.available)
+
+@router.put("/inventory/variants/{variant_id}", response_model=StockRead)
+async def set_stock(variant_id: UUID, payload: StockUpdate):
+    """Set on-hand stock (restock / stock count); persisted by the write-behind."""
+    store = await get_store()
+    await store.set_on_hand(variant_id, payload.on_hand)
+    s = await store.get(variant_id)
+    return StockRead(variant_id=variant_id, on_hand=s.on_hand, reserved=s.reserved, available=s.available)
@@ -0,0 +1,138 @@
+# src/inventory/module.py
+"""
+Persistence and housekeeping around the Redis stock counters (see store.py).
+
+- write-behind: variants whose on_hand changed are collected in a Redis set and flushed to
+  the `inventory` table in batches every INVENTORY_FLUSH_SECONDS (and on shutdown);
+- reconciliation: on startup every persisted row is loaded into Redis unless Redis already
+  has that variant (so a restarted or emptied Redis is re-seeded, a live one wins);
+- reaping: holds past their deadline are released every INVENTORY_REAP_SECONDS.
+"""
+import asyncio
+import logging
+import os
+import uuid
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from lib.db.postgres import SessionLocal
+from lib.observability.metrics import REGISTRY
+from lib.redis.index import get_client
+from src.models import Inventory, ProductVariant
+from .store import InventoryStore
+
+log = logging.getLogger("catalog.inventory")
+
+HOLD_TTL_SECONDS = float(os.getenv("INVENTORY_HOLD_TTL_SECONDS", "600"))
+HOLD_MAX_TTL_SECONDS = float(os.getenv("INVENTORY_HOLD_MAX_TTL_SECONDS", "3600"))
+FLUSH_INTERVAL = float(os.getenv("INVENTORY_FLUSH_SECONDS", "1.0"))
+FLUSH_BATCH = int(os.getenv("INVENTORY_FLUSH_BATCH", "1000"))
+REAP_INTERVAL = float(os.getenv("INVENTORY_REAP_SECONDS", "1.0"))
+RECONCILE_BATCH = int(os.getenv("INVENTORY_RECONCILE_BATCH", "5000"))
+
+OUTCOMES = REGISTRY.counter("inventory_operations_total", "Inventory operations by outcome.", ("op", "outcome"))
+FLUSHED = REGISTRY.counter("inventory_flushed_rows_total", "Stock rows written behind to Postgres.").labels()
+
+_store: InventoryStore | None = None
+_tasks: list[asyncio.Task] = []
+
+
+async def get_store() -> InventoryStore:
+    global _store
+    if _store is None:
+        _store = InventoryStore(await get_client())
+    return _store
+
+
+async def flush_dirty(store: InventoryStore) -> int:
+    """Persist every changed variant; on DB failure they go back into the dirty set."""
+    total = 0
+    while True:
+        batch = await store.pop_dirty(FLUSH_BATCH)
+        if not batch:
+            return total
+        try:
+            async with SessionLocal() as session:
+                ids = [uuid.UUID(v) for v in batch]
+                # variants deleted since their stock last changed are dropped rather than failing the batch
+                live = set((await session.execute(select(ProductVariant.id).where(ProductVariant.id.in_(ids)))).scalars())
+                rows = [{"variant_id": v, "on_hand": batch[str(v)]} for v in ids if v in live]
+                if rows:
+                    stmt = pg_insert(Inventory).values(rows)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[Inventory.variant_id],
+                        set_={"on_hand": stmt.excluded.on_hand, "updated_at": func.now()},
+                    )
+                    await session.execute(stmt)
+                    await session.commit()
+        except Exception:
+            await store.mark_dirty(batch)
+            raise
+        total += len(batch)
+        FLUSHED.value += len(batch)
+
+
+async def reconcile(store: InventoryStore) -> int:
+    """Seed Redis from Postgres for variants it doesn't know; returns how many were loaded."""
+    loaded, after = 0, None
+    while True:
+        stmt = select(Inventory.variant_id, Inventory.on_hand).order_by(Inventory.variant_id).limit(RECONCILE_BATCH)
+        if after is not None:
+            stmt = stmt.where(Inventory.variant_id > after)
+        async with SessionLocal() as session:
+            rows = (await session.execute(stmt)).all()
+        if not rows:
+            break
+        loaded += await store.load([(r.variant_id, r.on_hand) for r in rows])
+        after = rows[-1].variant_id
+    log.info("inventory reconciled: %s variants seeded into redis", loaded)
+    return loaded
+
+
+async def _every(interval: float, name: str, fn) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await fn(await get_store())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("inventory %s failed: %s", name, e)
+
+
+async def _startup() -> None:
+    backoff = 0.5
+    while True:
+        try:
+            store = await get_store()
+            await reconcile(store)
+            await flush_dirty(store)   # anything left over from before a restart
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # until this succeeds, variants Redis doesn't know simply have no stock (no oversell)
+            log.warning("inventory reconciliation failed, retrying in %.1fs: %s", backoff, e)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+async def start_inventory() -> None:
+    if _tasks:
+        return
+    _tasks.extend([
+        asyncio.create_task(_startup()),
+        asyncio.create_task(_every(FLUSH_INTERVAL, "flush", flush_dirty)),
+        asyncio.create_task(_every(REAP_INTERVAL, "reap", lambda s: s.reap())),
+    ])
+
+
+async def stop_inventory() -> None:
+    for t in _tasks:
+        t.cancel()
+    _tasks.clear()
+    try:
+        await flush_dirty(await get_store())
+    except Exception as e:
+        log.warning("final inventory flush failed: %s", e)
@@ -0,0 +1,184 @@
+# src/inventory/store.py
+"""
+Live stock counters in Redis.
+
+Per variant a hash `<prefix>:stock:<variant_id>` holds `on_hand` (units not yet sold) and
+`reserved` (units held by open checkouts); available = on_hand - reserved. A hold is a hash
+`<prefix>:hold:<hold_id>` (variant_id -> qty) plus its deadline in the `<prefix>:holds` zset.
+Reserve / commit / release are single Lua scripts, so concurrent checkouts can never take
+more than is available. Expired holds are released by `reap` (and refused by `commit`).
+
+All keys share the `{inv}` hash tag, so the scripts stay on one slot under Redis Cluster.
+This module only needs a redis.asyncio client (or fakeredis); persistence lives in module.py.
+"""
+import time
+import uuid
+from typing import NamedTuple
+
+DEFAULT_PREFIX = "{inv}"
+
+# KEYS: holds zset, hold hash, stock hashes... | ARGV: hold_id, deadline_ms, then (variant_id, qty) pairs
+_RESERVE_LUA = """
+local n = #KEYS - 2
+for i = 1, n do
+  local on_hand = tonumber(redis.call('HGET', KEYS[i + 2], 'on_hand') or '0')
+  local reserved = tonumber(redis.call('HGET', KEYS[i + 2], 'reserved') or '0')
+  if on_hand - reserved < tonumber(ARGV[2 + 2 * i]) then
+    return i
+  end
+end
+for i = 1, n do
+  redis.call('HINCRBY', KEYS[i + 2], 'reserved', ARGV[2 + 2 * i])
+  redis.call('HSET', KEYS[2], ARGV[1 + 2 * i], ARGV[2 + 2 * i])
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+return 0
+"""
+
+# KEYS: holds zset, hold hash, dirty set | ARGV: hold_id, now_ms, stock key prefix, mode ("commit" | "release")
+# Returns 1 committed / released, -1 commit refused because the hold had expired (it is released), 0 unknown hold.
+_SETTLE_LUA = """
+local deadline = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not deadline then
+  return 0
+end
+local commit = ARGV[4] == 'commit' and tonumber(deadline) >= tonumber(ARGV[2])
+local items = redis.call('HGETALL', KEYS[2])
+for i = 1, #items, 2 do
+  local key = ARGV[3] .. items[i]
+  redis.call('HINCRBY', key, 'reserved', -tonumber(items[i + 1]))
+  if commit then
+    redis.call('HINCRBY', key, 'on_hand', -tonumber(items[i + 1]))
+    redis.call('SADD', KEYS[3], items[i])
+  end
+end
+redis.call('DEL', KEYS[2])
+redis.call('ZREM', KEYS[1], ARGV[1])
+if ARGV[4] == 'commit' and not commit then
+  return -1
+end
+return 1
+"""
+
+# KEYS: stock hash | ARGV: on_hand — only seeds counters Redis doesn't have (Redis wins otherwise)
+_LOAD_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  return 0
+end
+redis.call('HSET', KEYS[1], 'on_hand', ARGV[1], 'reserved', 0)
+return 1
+"""
+
+
+class InsufficientStock(Exception):
+    def __init__(self, variant_id: uuid.UUID):
+        super().__init__(f"Insufficient stock for variant {variant_id}")
+        self.variant_id = variant_id
+
+
+class HoldExpired(Exception):
+    pass
+
+
+class Stock(NamedTuple):
+    on_hand: int
+    reserved: int
+
+    @property
+    def available(self) -> int:
+        return self.on_hand - self.reserved
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class InventoryStore:
+    def __init__(self, redis, prefix: str = DEFAULT_PREFIX):
+        self.redis = redis
+        self.prefix = prefix
+        self.holds_key = f"{prefix}:holds"
+        self.dirty_key = f"{prefix}:dirty"
+        self._stock_prefix = f"{prefix}:stock:"
+        self._reserve = redis.register_script(_RESERVE_LUA)
+        self._settle = redis.register_script(_SETTLE_LUA)
+        self._load = redis.register_script(_LOAD_LUA)
+
+    def stock_key(self, variant_id) -> str:
+        return f"{self._stock_prefix}{variant_id}"
+
+    def hold_key(self, hold_id) -> str:
+        return f"{self.prefix}:hold:{hold_id}"
+
+    async def reserve(self, items: dict[uuid.UUID, int], ttl_seconds: float) -> tuple[uuid.UUID, int]:
+        """All-or-nothing hold on `items`; returns (hold_id, deadline_ms) or raises InsufficientStock."""
+        hold_id = uuid.uuid4()
+        deadline = _now_ms() + int(ttl_seconds * 1000)
+        variants = list(items)
+        args = [str(hold_id), deadline]
+        for v in variants:
+            args += [str(v), int(items[v])]
+        failed = await self._reserve(
+            keys=[self.holds_key, self.hold_key(hold_id), *(self.stock_key(v) for v in variants)], args=args
+        )
+        if failed:
+            raise InsufficientStock(variants[int(failed) - 1])
+        return hold_id, deadline
+
+    async def _settle_hold(self, hold_id, mode: str) -> int:
+        return int(await self._settle(
+            keys=[self.holds_key, self.hold_key(hold_id), self.dirty_key],
+            args=[str(hold_id), _now_ms(), self._stock_prefix, mode],
+        ))
+
+    async def commit(self, hold_id: uuid.UUID) -> bool:
+        """Turn a hold into a sale; False if unknown, HoldExpired if its deadline passed."""
+        res = await self._settle_hold(hold_id, "commit")
+        if res == -1:
+            raise HoldExpired()
+        return res == 1
+
+    async def release(self, hold_id: uuid.UUID) -> bool:
+        return await self._settle_hold(hold_id, "release") == 1
+
+    async def reap(self, limit: int = 500) -> int:
+        """Release holds whose deadline has passed; returns how many were released."""
+        expired = await self.redis.zrangebyscore(self.holds_key, "-inf", _now_ms(), start=0, num=limit)
+        released = 0
+        for hold_id in expired:
+            released += await self._settle_hold(hold_id, "release") == 1
+        return released
+
+    async def get(self, variant_id: uuid.UUID) -> Stock:
+        on_hand, reserved = await self.redis.hmget(self.stock_key(variant_id), "on_hand", "reserved")
+        return Stock(int(on_hand or 0), int(reserved or 0))
+
+    async def set_on_hand(self, variant_id: uuid.UUID, on_hand: int) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.stock_key(variant_id), "on_hand", on_hand)
+            pipe.sadd(self.dirty_key, str(variant_id))
+            await pipe.execute()
+
+    async def load(self, rows: list[tuple[uuid.UUID, int]]) -> int:
+        """Seed counters from persisted rows, skipping variants Redis already tracks."""
+        if not rows:
+            return 0
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for variant_id, on_hand in rows:
+                await self._load(keys=[self.stock_key(variant_id)], args=[on_hand], client=pipe)
+            return sum(int(r) for r in await pipe.execute())
+
+    async def pop_dirty(self, count: int) -> dict[str, int]:
+        """Take up to `count` changed variants with their current on_hand (for the write-behind)."""
+        ids = await self.redis.spop(self.dirty_key, count)
+        if not ids:
+            return {}
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for v in ids:
+                pipe.hget(self.stock_key(v), "on_hand")
+            values = await pipe.execute()
+        return {v: int(x or 0) for v, x in zip(ids, values)}
+
+    async def mark_dirty(self, variant_ids) -> None:
+        if variant_ids:
+            await self.redis.sadd(self.dirty_key, *map(str, variant_ids))
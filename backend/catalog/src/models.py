@@ -2,7 +2,7 @@
 
 from datetime import datetime
 from sqlalchemy import (
-    String, Text, Enum as SAEnum, DateTime, func, Integer, ForeignKey, Index
+    String, Text, Enum as SAEnum, DateTime, func, Integer, ForeignKey, Index, Boolean, BigInteger, JSON
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
@@ -36,6 +36,19 @@ class Product(Base):
         cascade="all, delete-orphan",
         lazy="selectin",
     )
+    # maintained by triggers on product_variants; only loaded where asked for (contains_eager),
+    # and touching it anywhere else raises rather than quietly reading None
+    listing: Mapped["ProductListing | None"] = relationship(
+        "ProductListing", uselist=False, viewonly=True, lazy="raise",
+    )
+    # image manifest fed by media_storage events; joined in explicitly by the detail reads (same rule)
+    media: Mapped["ProductMedia | None"] = relationship(
+        "ProductMedia", uselist=False, viewonly=True, lazy="raise",
+    )
+
+    @property
+    def images(self) -> list[dict]:
+        return self.media.images if self.media is not None else []
 
 
 class ProductVariant(Base):
@@ -54,5 +67,43 @@ class ProductVariant(Base):
 
     price: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
     compare_at: Mapped[Decimal | None] = mapped_column(Numeric(12, 2), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     product: Mapped["Product"] = relationship("Product", back_populates="variants")
+
+
+class ProductListing(Base):
+    """Per-product variant summary for listing cards. Written only by DB triggers (see migration e6f1a3c8d2b7)."""
+    __tablename__ = "product_listing"
+
+    product_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True,
+    )
+    min_price: Mapped[Decimal | None] = mapped_column(Numeric(12, 2), nullable=True, index=True)
+    max_price: Mapped[Decimal | None] = mapped_column(Numeric(12, 2), nullable=True, index=True)
+    on_sale: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false", nullable=False)
+    variant_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ProductMedia(Base):
+    """Latest image manifest per product as published by media_storage (highest version wins)."""
+    __tablename__ = "product_media"
+
+    product_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True,
+    )
+    images: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class Inventory(Base):
+    """Persisted stock per variant. Redis holds the live counters; this is the write-behind copy."""
+    __tablename__ = "inventory"
+
+    variant_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("product_variants.id", ondelete="CASCADE"), primary_key=True,
+    )
+    on_hand: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
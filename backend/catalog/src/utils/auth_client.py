@@ -30,6 +30,28 @@ AUTH_INTROSPECT_URL = os.getenv(
 )
 AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT_SECONDS", "3.0"))
 DUMP_RESP_BODY = os.getenv("AUTH_DUMP_RESP_BODY", "0") in ("1", "true", "True")
+AUTH_MAX_CONNECTIONS = int(os.getenv("AUTH_MAX_CONNECTIONS", "100"))
+AUTH_MAX_KEEPALIVE = int(os.getenv("AUTH_MAX_KEEPALIVE", "20"))
+
+# One pooled client per process: keeps TCP connections to auth alive between requests.
+_http: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(
+            timeout=AUTH_TIMEOUT,
+            limits=httpx.Limits(max_connections=AUTH_MAX_CONNECTIONS, max_keepalive_connections=AUTH_MAX_KEEPALIVE),
+        )
+    return _http
+
+
+async def close_http_client() -> None:
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
 
 
 def _access_from_cookie_header(cookie_header: str) -> Optional[str]:
@@ -78,8 +100,7 @@ async def introspect_access_token(token: str) -> UUID:
     """POST token to auth introspection; return user_id as UUID or raise HTTPException."""
     log.debug("Calling auth introspection URL=%s token=%s", AUTH_INTROSPECT_URL, _mask(token))
     try:
-        async with httpx.AsyncClient(timeout=AUTH_TIMEOUT) as client:
-            r = await client.post(AUTH_INTROSPECT_URL, json={"token": token})
+        r = await get_http_client().post(AUTH_INTROSPECT_URL, json={"token": token})
     except httpx.HTTPError as e:
         log.error("Auth service request failed: %s", e)
         raise HTTPException(status_code=503, detail="Auth service unavailable") from e
@@ -0,0 +1,119 @@
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import Update
+
+from src.catalog import bulk
+from src.catalog.basemodels import VariantUpdate
+from src.catalog.index import router
+from src.catalog.suggest import PRODUCT_EVENTS_STREAM
+
+pytestmark = pytest.mark.asyncio
+
+T0 = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+class _Rows(list):
+    def all(self):
+        return list(self)
+
+
+class VariantTable:
+    """
+    Stands in for the session: runs the chunk UPDATE's matching rules over variants held in
+    memory, since the statement's unnest() needs Postgres. Records executes and commits in order.
+    """
+
+    def __init__(self, variants: dict[str, uuid.UUID]):
+        self.rows = {sku: {"product_id": pid, "updated_at": T0} for sku, pid in variants.items()}
+        self.log: list[tuple] = []
+        self.sql: list[str] = []
+        self._clock = T0
+
+    async def execute(self, stmt, params=None):
+        if isinstance(stmt, Update):
+            self.sql.append(str(stmt.compile(dialect=postgresql.dialect())))
+            self.log.append(("update", list(params["sku"])))
+            out = _Rows()
+            for sku, expected in zip(params["sku"], params["expected"]):
+                row = self.rows.get(sku)
+                if row and expected in (None, row["updated_at"]):
+                    self._clock += timedelta(seconds=1)
+                    row["updated_at"] = self._clock
+                    out.append(SimpleNamespace(sku=sku, product_id=row["product_id"], updated_at=self._clock))
+            return out
+        [skus] = stmt.compile().params.values()        # select(sku, updated_at).where(sku.in_(missing))
+        self.log.append(("select", list(skus)))
+        return _Rows((s, self.rows[s]["updated_at"]) for s in skus if s in self.rows)
+
+    async def commit(self):
+        self.log.append(("commit",))
+
+
+async def _events(redis) -> list[dict]:
+    return [fields for _, fields in await redis.xrange(PRODUCT_EVENTS_STREAM)]
+
+
+async def test_results_report_conflicts_and_unknown_skus_in_request_order(redis):
+    p = uuid.uuid4()
+    table = VariantTable({"A": p, "B": p})
+    items = [
+        VariantUpdate(sku="NOPE", price="1.00"),
+        VariantUpdate(sku="B", price="2.00", expected_updated_at=T0 - timedelta(days=1)),   # stale
+        VariantUpdate(sku="A", price="3.00", expected_updated_at=T0),
+    ]
+    results = await bulk.apply_variant_updates(table, items)
+    assert [(r.sku, r.status) for r in results] == [("NOPE", "not_found"), ("B", "conflict"), ("A", "updated")]
+    assert results[0].updated_at is None
+    assert results[1].updated_at == T0                            # the current value, to retry against
+    assert results[2].updated_at == table.rows["A"]["updated_at"] > T0
+
+
+async def test_each_chunk_commits_and_publishes_its_own_invalidation(redis, monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_CHUNK", 2)
+    p1, p2 = uuid.uuid4(), uuid.uuid4()
+    table = VariantTable({"A": p1, "B": p1, "C": p2})
+    items = [VariantUpdate(sku=s, price="5.00") for s in ("A", "B", "C", "D")]
+    results = await bulk.apply_variant_updates(table, items)
+
+    assert [r.status for r in results] == ["updated", "updated", "updated", "not_found"]
+    assert table.log == [
+        ("update", ["A", "B"]), ("commit",),
+        ("update", ["C", "D"]), ("commit",), ("select", ["D"]),
+    ]
+    # one prepared statement for every chunk
+    assert len(set(table.sql)) == 1 and "unnest" in table.sql[0]
+    assert await _events(redis) == [
+        {"type": "product.invalidate", "product_ids": json.dumps([str(p1)])},
+        {"type": "product.invalidate", "product_ids": json.dumps([str(p2)])},
+    ]
+
+
+async def test_chunk_that_changes_nothing_publishes_nothing(redis):
+    results = await bulk.apply_variant_updates(VariantTable({}), [VariantUpdate(sku="X", price="1.00")])
+    assert [r.status for r in results] == ["not_found"]
+    assert await _events(redis) == []
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(router, prefix="/catalog")
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def test_duplicate_skus_are_rejected_before_anything_is_applied(client, monkeypatch):
+    async def never(*_):
+        raise AssertionError("applied")
+
+    monkeypatch.setattr(bulk, "apply_variant_updates", never)
+    body = {"items": [{"sku": "A", "price": "1.00"}, {"sku": "A", "price": "2.00"}]}
+    async with client:
+        r = await client.post("/catalog/variants:bulk-update", json=body)
+    assert r.status_code == 422 and r.json()["detail"] == "Duplicate sku in items"
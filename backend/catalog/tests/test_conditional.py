@@ -0,0 +1,102 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from starlette.requests import Request
+
+from lib.http.conditional import (
+    has_conditional_headers, http_date, is_not_modified, not_modified, validator_headers, weak_etag,
+)
+
+MODIFIED = datetime(2024, 5, 1, 12, 30, 15, 250000, tzinfo=timezone.utc)
+
+
+def _request(**headers) -> Request:
+    raw = [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def test_weak_etag_is_stable_and_separates_parts():
+    assert weak_etag("a", 1) == weak_etag("a", 1)
+    assert weak_etag("a", 1).startswith('W/"')
+    assert weak_etag("a", 1) != weak_etag("a", 2)
+    assert weak_etag("ab", "c") != weak_etag("a", "bc")
+
+
+def test_if_none_match_uses_weak_comparison():
+    etag = weak_etag("x")
+    opaque = etag[2:]
+    assert is_not_modified(_request(if_none_match=etag), etag)
+    assert is_not_modified(_request(if_none_match=opaque), etag)
+    assert is_not_modified(_request(if_none_match=f'"other", {etag}'), etag)
+    assert is_not_modified(_request(if_none_match="*"), etag)
+    assert not is_not_modified(_request(if_none_match='W/"other"'), etag)
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    req = _request(if_none_match='W/"other"', if_modified_since=http_date(MODIFIED + timedelta(days=1)))
+    assert not is_not_modified(req, weak_etag("x"), MODIFIED)
+
+
+def test_if_modified_since_at_second_resolution():
+    etag = weak_etag("x")
+    assert is_not_modified(_request(if_modified_since=http_date(MODIFIED)), etag, MODIFIED)
+    assert not is_not_modified(_request(if_modified_since=http_date(MODIFIED - timedelta(seconds=1))), etag, MODIFIED)
+    naive = MODIFIED.replace(tzinfo=None)
+    assert is_not_modified(_request(if_modified_since=http_date(naive)), etag, naive)
+    assert not is_not_modified(_request(if_modified_since="not a date"), etag, MODIFIED)
+    assert not is_not_modified(_request(if_modified_since=http_date(MODIFIED)), etag)   # no Last-Modified
+
+
+def test_validator_headers_and_304():
+    headers = validator_headers('W/"1"', MODIFIED, "max-age=0, must-revalidate")
+    assert headers == {
+        "ETag": 'W/"1"',
+        "Last-Modified": "Wed, 01 May 2024 12:30:15 GMT",
+        "Cache-Control": "max-age=0, must-revalidate",
+    }
+    assert validator_headers('W/"1"', None, None) == {"ETag": 'W/"1"'}
+    resp = not_modified(headers)
+    assert resp.status_code == 304 and resp.body == b"" and resp.headers["etag"] == 'W/"1"'
+    assert has_conditional_headers(_request(if_none_match="*"))
+    assert not has_conditional_headers(_request())
+
+
+# ---------- catalog reads ----------
+
+@pytest.mark.asyncio
+async def test_product_detail_answers_304_until_it_changes(db, redis):
+    from src.catalog.index import router
+    from src.models import Product, ProductVariant
+
+    async with db() as session:
+        product = Product(slug=f"p-{uuid.uuid4().hex[:8]}", title="P")
+        product.variants = [ProductVariant(sku=f"s-{uuid.uuid4().hex[:8]}", title="V", price=Decimal("9.50"))]
+        session.add(product)
+        await session.commit()
+        product_id = product.id
+
+    app = FastAPI()
+    app.include_router(router, prefix="/catalog")
+    url = f"/catalog/products/{product_id}"
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        first = await client.get(url)
+        assert first.status_code == 200
+        etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+
+        assert (await client.get(url, headers={"If-None-Match": etag})).status_code == 304
+        assert (await client.get(url, headers={"If-Modified-Since": last_modified})).status_code == 304
+
+        async with db() as session:
+            p = await session.get(Product, product_id)
+            p.updated_at = p.updated_at + timedelta(seconds=5)
+            await session.commit()
+        changed = await client.get(url, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert changed.json()["id"] == str(product_id)
+
+        assert (await client.get(f"/catalog/products/{uuid.uuid4()}", headers={"If-None-Match": etag})).status_code == 404
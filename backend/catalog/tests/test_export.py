@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from src.catalog import export
+from src.catalog.index import router as catalog_router
+
+pytestmark = pytest.mark.asyncio
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(catalog_router, prefix="/catalog")
+    return app
+
+
+async def _abandoned_export(app: FastAPI, spec_version: str) -> None:
+    """One GET /catalog/export whose client is gone before the body is iterated."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": spec_version}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/catalog/export", "raw_path": b"/catalog/export",
+        "query_string": b"", "root_path": "", "headers": [], "client": ("test", 1), "server": ("test", 80),
+    }
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if spec_version != "2.0":
+            raise OSError("connection reset")   # 2.4+: the server reports a gone client as a failed send
+        if message.get("status") == 200:
+            await asyncio.sleep(3600)   # stalls on the response start until the disconnect cancels it
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        pass
+
+
+@pytest.mark.parametrize("spec_version", ["2.0", "2.4"])
+async def test_abandoned_exports_release_their_slot_and_session(db, spec_version):
+    app = _app()
+    for _ in range(export.EXPORT_MAX_CONCURRENT + 1):
+        await _abandoned_export(app, spec_version)
+    assert not export.EXPORT_LIMITER._sem.locked()
+    from lib.db.postgres import engine
+    assert engine.pool.checkedout() == 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        r = await client.get("/catalog/export")
+    assert r.status_code == 200
+    assert r.content == b""
+
+
+async def test_export_streams_ndjson_and_frees_the_slot(db):
+    from src.models import Product, ProductVariant
+
+    async with db() as session:
+        p = Product(slug="mug", title="Mug", brand="Acme", status="active", default_currency="EUR")
+        p.variants = [ProductVariant(sku="MUG-1", title="Red", price=10)]
+        session.add(p)
+        await session.commit()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://test") as client:
+        r = await client.get("/catalog/export")
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    [line] = r.text.splitlines()
+    row = json.loads(line)
+    assert row["slug"] == "mug" and [v["sku"] for v in row["variants"]] == ["MUG-1"]
+    assert not export.EXPORT_LIMITER._sem.locked()
@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+from decimal import Decimal
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from src.catalog import fx
+
+DOC = {"base": "USD", "rates": {"EUR": "0.9", "JPY": 150, "CHF": "0.8812"}}
+
+
+def test_version_defaults_to_a_stable_digest_of_the_rates():
+    v = fx.parse_rates(DOC).version
+    assert v == fx.parse_rates({"base": "USD", "rates": {"chf": "0.88120", "JPY": "150.0", "EUR": 0.9}}).version
+    assert v != fx.parse_rates({"base": "USD", "rates": {**DOC["rates"], "EUR": "0.91"}}).version
+    assert fx.parse_rates({**DOC, "version": "2024-05-01"}).version == "2024-05-01"
+
+    code = "import json, sys; from src.catalog import fx; print(fx.parse_rates(json.loads(sys.argv[1])).version)"
+    other = {
+        seed: subprocess.run(
+            [sys.executable, "-c", code, json.dumps(DOC)], capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONHASHSEED": seed}, cwd=os.path.dirname(os.path.dirname(__file__)),
+        ).stdout.strip()
+        for seed in ("1", "2")
+    }
+    assert other == {"1": v, "2": v}
+
+
+def test_convert_many_rounds_to_the_target_unit(monkeypatch):
+    table = fx.parse_rates(DOC)
+    assert fx.convert_many([Decimal("10.00"), None, Decimal("0.05")], "USD", "EUR", table) == [
+        Decimal("9.00"), None, Decimal("0.04"),        # 0.045 -> banker's rounding
+    ]
+    assert fx.convert_many([Decimal("9.99")], "USD", "JPY", table) == [Decimal("1498")]
+    assert fx.convert_many([Decimal("9.00")], "EUR", "USD", table) == [Decimal("10.00")]
+    monkeypatch.setitem(fx.CASH_INCREMENTS, "CHF", Decimal("0.05"))
+    assert fx.convert_many([Decimal("10.00")], "USD", "CHF", table) == [Decimal("8.80")]
+    assert fx.convert_many([Decimal("1")], "USD", "GBP", table) is None
+
+
+def _product(currency, *prices):
+    variants = [SimpleNamespace(price=Decimal(p), compare_at=None) for p in prices]
+    return SimpleNamespace(default_currency=currency, currency=None, listing=None, variants=variants)
+
+
+def test_apply_currency_converts_once_per_source_currency(monkeypatch):
+    table = fx.parse_rates(DOC)
+    calls = []
+    real = fx.convert_many
+
+    def spy(amounts, src, dst, t):
+        calls.append((src, len(amounts)))
+        return real(amounts, src, dst, t)
+
+    monkeypatch.setattr(fx, "convert_many", spy)
+    usd1, eur, usd2, odd = _product("USD", "10"), _product("EUR", "9"), _product("USD", "1", "2"), _product("XXX", "5")
+    fx.apply_currency([usd1, eur, usd2, odd], "EUR", table)
+    assert sorted(calls) == [("EUR", 2), ("USD", 6), ("XXX", 2)]     # price + compare_at per variant
+    assert [v.price for v in usd2.variants] == [Decimal("0.90"), Decimal("1.80")]
+    assert usd1.currency == eur.currency == usd2.currency == "EUR"
+    assert odd.currency == "XXX" and odd.variants[0].price == Decimal("5")   # unknown source: left alone
+
+
+@pytest.mark.asyncio
+async def test_etags_change_with_the_fx_version(db, redis, monkeypatch):
+    from src.catalog import suggest
+    from src.catalog.index import router
+
+    monkeypatch.setattr(suggest, "_index", suggest.SuggestIndex())
+    monkeypatch.setattr(fx, "_table", fx.parse_rates(DOC))
+    app = FastAPI()
+    app.include_router(router, prefix="/catalog")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        body = {"title": "Mug", "slug": "mug", "variants": [{"sku": "MUG-1", "title": "Red", "price": "10.00"}]}
+        pid = (await client.post("/catalog/products", json=body)).json()["id"]
+        urls = ["/catalog/products?currency=EUR", f"/catalog/products/{pid}?currency=EUR"]
+        before = {u: (await client.get(u)).headers["etag"] for u in urls}
+        for u in urls:
+            assert (await client.get(u, headers={"If-None-Match": before[u]})).status_code == 304
+
+        monkeypatch.setattr(fx, "_table", fx.parse_rates({"base": "USD", "rates": {"EUR": "0.95"}}))
+        for u in urls:
+            r = await client.get(u, headers={"If-None-Match": before[u]})
+            assert r.status_code == 200 and r.headers["etag"] != before[u]
+        r = await client.get(urls[1])
+        assert r.json()["variants"][0]["price"] == "9.50" and r.json()["currency"] == "EUR"
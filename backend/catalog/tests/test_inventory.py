@@ -0,0 +1,167 @@
+import asyncio
+import uuid
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from src.inventory import module
+from src.inventory.store import HoldExpired, InsufficientStock, InventoryStore
+from src.models import Inventory, Product, ProductVariant
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def store(redis):
+    return InventoryStore(redis, prefix="{inv-test}")
+
+
+async def _stocked(store, **on_hand) -> dict[str, uuid.UUID]:
+    ids = {name: uuid.uuid4() for name in on_hand}
+    for name, qty in on_hand.items():
+        await store.set_on_hand(ids[name], qty)
+    await store.redis.delete(store.dirty_key)
+    return ids
+
+
+async def test_reserve_holds_stock(store):
+    v = await _stocked(store, a=5)
+    await store.reserve({v["a"]: 3}, ttl_seconds=60)
+    stock = await store.get(v["a"])
+    assert (stock.on_hand, stock.reserved, stock.available) == (5, 3, 2)
+
+
+async def test_reserve_is_all_or_nothing(store):
+    v = await _stocked(store, a=5, b=1)
+    with pytest.raises(InsufficientStock) as exc:
+        await store.reserve({v["a"]: 2, v["b"]: 2}, ttl_seconds=60)
+    assert exc.value.variant_id == v["b"]
+    assert (await store.get(v["a"])).reserved == 0
+    assert (await store.get(v["b"])).reserved == 0
+
+
+async def test_concurrent_reserves_never_oversell(store):
+    v = await _stocked(store, a=10)
+
+    async def shopper():
+        try:
+            await store.reserve({v["a"]: 1}, ttl_seconds=60)
+            return True
+        except InsufficientStock:
+            return False
+
+    results = await asyncio.gather(*(shopper() for _ in range(25)))
+    assert sum(results) == 10
+    assert (await store.get(v["a"])).available == 0
+
+
+async def test_commit_sells_and_marks_dirty(store):
+    v = await _stocked(store, a=5)
+    hold_id, _ = await store.reserve({v["a"]: 2}, ttl_seconds=60)
+    assert await store.commit(hold_id) is True
+    assert await store.get(v["a"]) == (3, 0)
+    assert await store.redis.smembers(store.dirty_key) == {str(v["a"])}
+    assert await store.commit(hold_id) is False      # already settled
+
+
+async def test_release_returns_stock(store):
+    v = await _stocked(store, a=5)
+    hold_id, _ = await store.reserve({v["a"]: 2}, ttl_seconds=60)
+    assert await store.release(hold_id) is True
+    assert await store.get(v["a"]) == (5, 0)
+    assert await store.redis.scard(store.dirty_key) == 0
+    assert await store.release(hold_id) is False
+
+
+async def test_expired_hold_cannot_be_committed(store):
+    v = await _stocked(store, a=5)
+    hold_id, _ = await store.reserve({v["a"]: 2}, ttl_seconds=-1)
+    with pytest.raises(HoldExpired):
+        await store.commit(hold_id)
+    assert await store.get(v["a"]) == (5, 0)
+
+
+async def test_reap_releases_expired_holds(store):
+    v = await _stocked(store, a=5)
+    await store.reserve({v["a"]: 1}, ttl_seconds=-1)
+    live, _ = await store.reserve({v["a"]: 1}, ttl_seconds=60)
+    assert await store.reap() == 1
+    assert await store.get(v["a"]) == (5, 1)
+    assert await store.commit(live) is True
+
+
+async def test_load_only_seeds_unknown_variants(store):
+    v = await _stocked(store, a=5)
+    fresh = uuid.uuid4()
+    assert await store.load([(v["a"], 99), (fresh, 7)]) == 1
+    assert (await store.get(v["a"])).on_hand == 5      # Redis wins over the persisted copy
+    assert (await store.get(fresh)).on_hand == 7
+
+
+# ---------- write-behind ----------
+
+async def _variants(Session, n: int) -> list[uuid.UUID]:
+    async with Session() as session:
+        product = Product(slug=f"p-{uuid.uuid4().hex[:8]}", title="P")
+        product.variants = [
+            ProductVariant(sku=f"sku-{uuid.uuid4().hex[:8]}", title=f"V{i}", price=Decimal("1.00"))
+            for i in range(n)
+        ]
+        session.add(product)
+        await session.commit()
+        return [v.id for v in product.variants]
+
+
+async def _persisted(Session) -> dict[uuid.UUID, int]:
+    async with Session() as session:
+        return dict((await session.execute(select(Inventory.variant_id, Inventory.on_hand))).all())
+
+
+async def test_flush_writes_changed_stock(store, db):
+    a, b = await _variants(db, 2)
+    await store.set_on_hand(a, 5)
+    await store.set_on_hand(b, 2)
+    hold_id, _ = await store.reserve({a: 2}, ttl_seconds=60)
+    await store.commit(hold_id)
+
+    assert await module.flush_dirty(store) == 2
+    assert await _persisted(db) == {a: 3, b: 2}
+    assert await store.redis.scard(store.dirty_key) == 0
+
+    await store.set_on_hand(b, 9)
+    assert await module.flush_dirty(store) == 1
+    assert await _persisted(db) == {a: 3, b: 9}
+
+
+async def test_flush_skips_deleted_variants(store, db):
+    (a,) = await _variants(db, 1)
+    gone = uuid.uuid4()
+    await store.set_on_hand(a, 4)
+    await store.set_on_hand(gone, 1)
+    await module.flush_dirty(store)
+    assert await _persisted(db) == {a: 4}
+
+
+async def test_flush_failure_keeps_variants_dirty(store, db, monkeypatch):
+    (a,) = await _variants(db, 1)
+    await store.set_on_hand(a, 4)
+
+    def broken():
+        raise ConnectionError("database down")
+
+    monkeypatch.setattr(module, "SessionLocal", broken)
+    with pytest.raises(ConnectionError):
+        await module.flush_dirty(store)
+    assert await store.redis.smembers(store.dirty_key) == {str(a)}
+
+
+async def test_reconcile_seeds_redis_from_the_table(store, db):
+    a, b = await _variants(db, 2)
+    async with db() as session:
+        session.add_all([Inventory(variant_id=a, on_hand=6), Inventory(variant_id=b, on_hand=1)])
+        await session.commit()
+    await store.set_on_hand(b, 3)
+    assert await module.reconcile(store) == 1
+    assert (await store.get(a)).on_hand == 6
+    assert (await store.get(b)).on_hand == 3
@@ -0,0 +1,26 @@
+import asyncio
+import time
+
+import pytest
+from jose import jwt
+
+from lib.security import jwt as local_jwt, revocation
+
+
+@pytest.mark.asyncio
+async def test_lifespan_runs_the_revocation_listener_that_decode_relies_on(db, redis, monkeypatch):
+    import main
+
+    monkeypatch.setattr(revocation, "_revoked", {})
+    exp = int(time.time()) + 60
+    token = jwt.encode({"sub": "u1", "jti": "j1", "exp": exp}, local_jwt.SECRET, algorithm=local_jwt.ALGO)
+    async with main.app.router.lifespan_context(main.app):
+        assert local_jwt.decode(token)["sub"] == "u1"
+        await revocation.revoke("j1", exp)          # what the auth service does on logout
+        revocation._revoked.clear()                  # so only the listener can bring it back
+        for _ in range(200):
+            if local_jwt.decode(token) is None:
+                break
+            await asyncio.sleep(0.01)
+        assert local_jwt.decode(token) is None
+    assert revocation._task is None
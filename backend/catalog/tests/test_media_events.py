@@ -0,0 +1,101 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from src.catalog import media_events as events
+from src.models import Product, ProductMedia
+
+pytestmark = pytest.mark.asyncio
+
+STREAM, GROUP = events.MEDIA_EVENTS_STREAM, events.MEDIA_EVENTS_GROUP
+
+
+async def _publish(redis, product_id, version: int = 1) -> str:
+    manifest = {"product_id": str(product_id), "version": version, "images": [{"filename": f"v{version}.jpg"}]}
+    return await redis.xadd(STREAM, {"type": "product.images", "product_id": str(product_id), "data": json.dumps(manifest)})
+
+
+async def _deliver(redis) -> None:
+    """One XREADGROUP of new entries, handled the way the consumer loop does."""
+    resp = await redis.xreadgroup(GROUP, events.CONSUMER, {STREAM: ">"})
+    for entry_id, fields in (resp[0][1] if resp else []):
+        await events._process(redis, entry_id, fields)
+
+
+async def _pending(redis) -> int:
+    return (await redis.xpending(STREAM, GROUP))["pending"]
+
+
+@pytest_asyncio.fixture
+async def group(redis, monkeypatch):
+    monkeypatch.setattr(events, "RETRY_IDLE_MS", 1)
+    await redis.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+    return redis
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    """apply_manifest against a set of known product ids (SQLite doesn't enforce the FK)."""
+    known, applied = set(), []
+
+    async def apply(product_id, version, images):
+        if product_id not in known:
+            raise events.UnknownProduct(product_id)
+        applied.append((product_id, version))
+        return True
+
+    monkeypatch.setattr(events, "apply_manifest", apply)
+    return known, applied
+
+
+async def test_unknown_product_stays_pending_and_is_retried(group, catalog):
+    known, applied = catalog
+    product_id = uuid.uuid4()
+    await _publish(group, product_id)
+    await _deliver(group)
+    assert applied == [] and await _pending(group) == 1
+
+    known.add(product_id)
+    await asyncio.sleep(0.01)
+    await events._reclaim(group)
+    assert applied == [(product_id, 1)] and await _pending(group) == 0
+
+
+async def test_entries_go_to_dead_letter_after_max_deliveries(group, catalog, monkeypatch):
+    monkeypatch.setattr(events, "MAX_DELIVERIES", 3)
+    product_id = uuid.uuid4()
+    entry_id = await _publish(group, product_id)
+    await _deliver(group)
+    for _ in range(3):
+        await asyncio.sleep(0.01)
+        await events._reclaim(group)
+
+    assert await _pending(group) == 0
+    [(_, dead)] = await group.xrange(events.DEAD_STREAM)
+    assert dead["source_id"] == entry_id
+    assert dead["product_id"] == str(product_id)
+    assert dead["deliveries"] == "3"
+
+
+async def test_malformed_entries_are_acked(group, catalog):
+    await group.xadd(STREAM, {"type": "product.images", "product_id": "not-a-uuid", "data": "{}"})
+    await _deliver(group)
+    assert await _pending(group) == 0
+
+
+async def test_apply_manifest_only_moves_forward(db):
+    async with db() as session:
+        product = Product(slug=f"p-{uuid.uuid4().hex[:8]}", title="P")
+        session.add(product)
+        await session.commit()
+        product_id = product.id
+
+    assert await events.apply_manifest(product_id, 2, [{"filename": "b.jpg"}]) is True
+    assert await events.apply_manifest(product_id, 1, [{"filename": "a.jpg"}]) is False
+    assert await events.apply_manifest(product_id, 3, [{"filename": "c.jpg"}]) is True
+    async with db() as session:
+        media = await session.get(ProductMedia, product_id)
+        assert (media.version, media.images) == (3, [{"filename": "c.jpg"}])
@@ -0,0 +1,41 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.exc import InvalidRequestError
+
+from src.catalog import suggest
+from src.catalog.index import list_stmt, router
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(suggest, "_index", suggest.SuggestIndex())
+    app = FastAPI()
+    app.include_router(router, prefix="/catalog")
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def test_create_then_list_without_touching_unloaded_relationships(db, redis, client):
+    body = {"title": "Mug", "slug": "mug", "variants": [{"sku": "MUG-1", "title": "Red", "price": "10.00"}]}
+    async with client:
+        r = await client.post("/catalog/products", json=body)
+        assert r.status_code == 201, r.text
+        assert r.json()["images"] == [] and [v["sku"] for v in r.json()["variants"]] == ["MUG-1"]
+        r = await client.get("/catalog/products")
+        assert r.status_code == 200 and [p["slug"] for p in r.json()] == ["mug"]
+
+
+async def test_listing_query_refuses_lazy_variant_loads(db):
+    from src.models import Product
+
+    async with db() as session:
+        session.add(Product(slug="mug", title="Mug", status="active", default_currency="EUR"))
+        await session.commit()
+    async with db() as session:
+        [p] = (await session.execute(list_stmt(None, 10, None, None))).scalars().unique().all()
+        with pytest.raises(InvalidRequestError):
+            p.variants
+        with pytest.raises(InvalidRequestError):
+            p.media
@@ -0,0 +1,123 @@
+import hashlib
+import hmac
+import json
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from lib.observability import profiling
+
+pytestmark = pytest.mark.asyncio
+
+SECRET = "test-secret"
+
+
+@pytest.fixture(autouse=True)
+def settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SECRET", SECRET)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path)
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0)
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL", 0.001)
+    monkeypatch.setattr(profiling, "_busy", False)
+    return tmp_path
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    profiling.setup_profiling(app)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def _tampered(token: str) -> str:
+    expires, sig = token.split(".")
+    return f"{expires}.{sig[:-1]}{'0' if sig[-1] != '0' else '1'}"
+
+
+def test_header_is_expiry_signed_with_the_secret():
+    token = profiling.sign(ttl=60)
+    expires, sig = token.split(".")
+    assert 0 < int(expires) - time.time() <= 60
+    assert sig == hmac.new(SECRET.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    assert profiling.verify(token)
+
+
+@pytest.mark.parametrize("token", [
+    pytest.param(lambda: profiling.sign(ttl=-1), id="expired"),
+    pytest.param(lambda: _tampered(profiling.sign()), id="bad-signature"),
+    pytest.param(lambda: "9" + profiling.sign(), id="extended-expiry"),
+    pytest.param(lambda: "soon." + profiling.sign().split(".")[1], id="not-a-timestamp"),
+    pytest.param(lambda: "", id="empty"),
+])
+def test_expired_or_tampered_headers_are_rejected(token):
+    assert not profiling.verify(token())
+
+
+def test_headers_are_rejected_without_a_secret(monkeypatch):
+    token = profiling.sign()
+    monkeypatch.setattr(profiling, "PROFILE_SECRET", "")
+    assert not profiling.verify(token)
+
+
+async def test_signed_request_is_profiled_and_served_back(client, settings):
+    async with client:
+        r = await client.get("/ping", headers={"X-Profile": profiling.sign()})
+        assert r.status_code == 200
+        profile_id = r.headers["x-profile-id"]
+        meta = json.loads((settings / f"{profile_id}.json").read_text())
+        assert meta["trigger"] == "header" and meta["status"] == 200 and meta["route"] == "/ping"
+
+        assert (await client.get("/admin/profiles")).status_code == 403
+        listing = await client.get("/admin/profiles", headers={"X-Profile": profiling.sign()})
+        assert [p["id"] for p in listing.json()["items"]] == [profile_id]
+        folded = await client.get(f"/admin/profiles/{profile_id}", headers={"X-Profile": profiling.sign()})
+        assert folded.status_code == 200 and folded.headers["content-type"].startswith("text/plain")
+
+
+@pytest.mark.parametrize("header", [lambda: profiling.sign(ttl=-1), lambda: _tampered(profiling.sign())], ids=["expired", "tampered"])
+async def test_invalid_header_passes_through_unprofiled(client, settings, header):
+    async with client:
+        r = await client.get("/ping", headers={"X-Profile": header()})
+        assert r.status_code == 200 and "x-profile-id" not in r.headers
+        assert (await client.get("/admin/profiles", headers={"X-Profile": header()})).status_code == 403
+    assert list(settings.iterdir()) == []
+
+
+async def test_one_in_n_requests_is_sampled(client, settings, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 4)
+    draws = iter([0.1, 0.5, 0.3, 0.2499, 0.25, 0.9])           # sampled when draw * 4 < 1
+    monkeypatch.setattr(profiling.random, "random", lambda: next(draws))
+    async with client:
+        sampled = ["x-profile-id" in (await client.get("/ping")).headers for _ in range(6)]
+    assert sampled == [True, False, False, True, False, False]
+    assert sorted(m["trigger"] for m in profiling.list_profiles()) == ["sample", "sample"]
+
+
+async def test_rate_zero_never_samples(client, settings, monkeypatch):
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.0)
+    async with client:
+        assert "x-profile-id" not in (await client.get("/ping")).headers
+
+
+class _Engine:
+    def dump(self, path):
+        path.write_text("main;handler 1\n")
+        return 1
+
+
+def test_profile_dir_keeps_only_the_newest_profiles(settings, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MAX_FILES", 3)
+    ids = [f"{1760000000000 + i}-{i:08x}" for i in range(5)]
+    for profile_id in ids:
+        profiling._save(_Engine(), profile_id, {"id": profile_id})
+    assert sorted(p.name for p in settings.iterdir()) == sorted(
+        f"{i}{ext}" for i in ids[2:] for ext in (".json", ".folded")
+    )
+    assert [m["id"] for m in profiling.list_profiles()] == ids[:1:-1]     # newest first
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from lib.db import postgres as pg
+from src.models import Base, Product
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def replica(db, tmp_path, monkeypatch):
+    """An empty second database standing in for a replica, in sync as far as the lag check knows."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    r = pg._Replica(engine)
+    r.lag, r.checked_at = 0.0, time.monotonic()
+    monkeypatch.setattr(pg, "_replicas", [r])
+    yield r
+    await engine.dispose()
+
+
+async def _in_request(fn):
+    """Run `fn` with its own routing state, as each request does."""
+    return await asyncio.create_task(fn())
+
+
+async def _slugs(session) -> list[str]:
+    return list((await session.execute(select(Product.slug))).scalars())
+
+
+async def test_reads_go_to_the_primary_once_the_request_has_written(replica):
+    async def request():
+        async with pg.read_session() as reads:
+            assert reads.sync_session.get_bind(clause=select(Product)) is replica.engine.sync_engine
+            assert reads.sync_session.get_bind(clause=insert(Product)) is pg.engine.sync_engine
+            assert await _slugs(reads) == []
+
+            async with pg.SessionLocal() as writes:
+                writes.add(Product(slug="mug", title="Mug", status="active", default_currency="EUR"))
+                await writes.flush()
+                await writes.commit()
+
+            # the session opened before the write follows it too
+            assert reads.sync_session.get_bind(clause=select(Product)) is pg.engine.sync_engine
+            assert await _slugs(reads) == ["mug"]
+        async with pg.read_session() as later:
+            assert later.sync_session.reader is None
+            assert await _slugs(later) == ["mug"]
+
+    await _in_request(request)
+
+    async def next_request():
+        async with pg.read_session() as reads:
+            return reads.sync_session.reader
+
+    assert await _in_request(next_request) is replica.engine
+
+
+@pytest.mark.parametrize("lag, primary", [(0.0, False), (pg.REPLICA_MAX_LAG, False), (pg.REPLICA_MAX_LAG + 0.5, True)])
+async def test_lagging_replica_falls_back_to_the_primary(replica, lag, primary):
+    replica.lag = lag
+    chosen = await pg._pick_reader()
+    assert chosen is (pg.engine if primary else replica.engine)
+
+
+async def test_unreachable_replica_falls_back_to_the_primary(replica):
+    replica.lag = None     # never checked: the first pick measures it, and SQLite can't answer the lag query
+    async with pg.read_session() as reads:
+        assert reads.sync_session.reader is pg.engine
+    assert replica.lag == float("inf")
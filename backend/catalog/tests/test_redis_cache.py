@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+import lib.redis.index as redis_index
+from lib.redis.index import TrackedCache
+
+pytestmark = pytest.mark.asyncio
+
+# fakeredis has no CLIENT TRACKING, so these drive the cache the way its tracking loop does:
+# `active` once tracking is on, `invalidate(keys)` for each message from __redis__:invalidate
+
+
+@pytest.fixture
+def cache(redis):
+    c = TrackedCache("test", ["hot:"], max_entries=3, ttl=60)
+    c.active = True
+    return c
+
+
+async def test_hit_is_served_locally_until_invalidated(cache, redis):
+    await redis.set("hot:a", "1")
+    assert await cache.get("hot:a") == "1"
+    await redis.set("hot:a", "2")
+    assert await cache.get("hot:a") == "1"
+    cache.invalidate(["hot:a"])
+    assert await cache.get("hot:a") == "2"
+
+
+async def test_flush_invalidation_drops_everything(cache, redis):
+    await redis.mset({"hot:a": "1", "hot:b": "1"})
+    await cache.get("hot:a")
+    await cache.get("hot:b")
+    await redis.mset({"hot:a": "2", "hot:b": "2"})
+    cache.invalidate(None)
+    assert [await cache.get("hot:a"), await cache.get("hot:b")] == ["2", "2"]
+
+
+async def test_misses_are_cached_too(cache, redis):
+    assert await cache.get("hot:missing") is None
+    await redis.set("hot:missing", "now")
+    assert await cache.get("hot:missing") is None
+    cache.invalidate(["hot:missing"])
+    assert await cache.get("hot:missing") == "now"
+
+
+async def test_untracked_keys_and_inactive_cache_read_through(cache, redis):
+    await redis.set("cold:a", "1")
+    assert await cache.get("cold:a") == "1"
+    await redis.set("cold:a", "2")
+    assert await cache.get("cold:a") == "2"
+
+    cache.active = False
+    await redis.set("hot:a", "1")
+    assert await cache.get("hot:a") == "1"
+    await redis.set("hot:a", "2")
+    assert await cache.get("hot:a") == "2"
+    assert not cache._entries
+
+
+async def test_invalidation_during_fetch_is_not_cached(cache, redis, monkeypatch):
+    await redis.set("hot:a", "old")
+    real_get = redis.get
+
+    async def racing_get(key):
+        value = await real_get(key)
+        await redis.set(key, "new")
+        cache.invalidate([key])      # arrives while the old value is still in flight
+        return value
+
+    monkeypatch.setattr(redis, "get", racing_get)
+    assert await cache.get("hot:a") == "old"
+    monkeypatch.setattr(redis, "get", real_get)
+    assert await cache.get("hot:a") == "new"
+
+
+async def test_oldest_entries_are_evicted(cache, redis):
+    await redis.mset({f"hot:{k}": k for k in "abcd"})
+    for k in "abc":
+        await cache.get(f"hot:{k}")
+    await cache.get("hot:a")          # most recently used now
+    await cache.get("hot:d")
+    assert list(cache._entries) == ["hot:c", "hot:a", "hot:d"]
+
+
+async def test_entries_expire_after_ttl(cache, redis):
+    cache.ttl = 0.01
+    await redis.set("hot:a", "1")
+    await cache.get("hot:a")
+    await redis.set("hot:a", "2")
+    await asyncio.sleep(0.02)
+    assert await cache.get("hot:a") == "2"
+
+
+# ---------- batched helpers ----------
+
+async def test_chunked_helpers_cover_every_key(redis):
+    mapping = {f"k:{i}": str(i) for i in range(7)}
+    await redis_index.set_many(mapping, ttl=60, chunk=3)
+    assert await redis_index.mget_many([*mapping, "k:none"], chunk=3) == [*mapping.values(), None]
+    assert 0 < await redis.pttl("k:6") <= 60_000
+    assert await redis_index.pipelined([lambda p, k=k: p.incr(k) for k in mapping], chunk=2) == list(range(1, 8))
+    assert await redis_index.delete_many([*mapping, "k:none"], chunk=3) == 7
+    assert await redis.dbsize() == 0
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from src.catalog import suggest
+from src.catalog.suggest import SuggestIndex, make_doc
+
+DOCS = [
+    make_doc("1", "Air Max 90", "Nike", "air-max-90", ["NK-AM90"]),
+    make_doc("2", "Air Force 1", "Nike", "air-force-1", ["NK-AF1"]),
+    make_doc("3", "Crème Brûlée Torch", "Chef's Co", "torch", ["CB-1"]),
+    make_doc("4", "Airpods Case", "Generic", "airpods-case", []),
+]
+
+
+def _ids(docs) -> list[str]:
+    return [d.id for d in docs]
+
+
+def test_prefix_lookup_over_titles_brands_words_and_skus():
+    idx = SuggestIndex.build(DOCS, {})
+    assert set(_ids(idx.search("air"))) == {"1", "2", "4"}
+    assert set(_ids(idx.search("nike"))) == {"1", "2"}
+    assert _ids(idx.search("creme bru")) == ["3"]          # accents and case folded
+    assert _ids(idx.search("nk-af")) == ["2"]
+    assert _ids(idx.search("max nike")) == ["1"]           # words in any order
+    assert idx.search("zzz") == [] and idx.search("  ") == []
+
+
+def test_popularity_ranks_results_then_shorter_titles():
+    idx = SuggestIndex.build(DOCS, {})
+    assert _ids(idx.search("air")) == ["1", "2", "4"]      # equal weight: shortest title first
+    idx.set_weights({"4": 2.0, "2": 1.0})
+    assert _ids(idx.search("air")) == ["4", "2", "1"]
+    assert _ids(idx.search("air", limit=1)) == ["4"]
+
+
+def test_upsert_replaces_and_remove_tombstones():
+    idx = SuggestIndex.build(DOCS, {})
+    keys = list(idx.keys)
+    assert idx.upsert(make_doc("2", "Blazer Mid", "Nike", "blazer", ["NK-BZ"]))
+    assert idx.keys == keys                                # new entries go to the delta, not the main arrays
+    assert "2" not in _ids(idx.search("air")) and _ids(idx.search("blaz")) == ["2"]
+    idx.remove("1")
+    assert _ids(idx.search("air")) == ["4"]
+    assert idx.dead > 0 and idx.by_id.keys() == {"2", "3", "4"}
+    idx.remove("missing")
+
+
+def test_compaction_is_wanted_once_a_quarter_is_dead_or_the_delta_is_full(monkeypatch):
+    idx = SuggestIndex.build(DOCS, {})
+    assert not idx.needs_compaction()
+    idx.remove("1")
+    idx.remove("2")
+    assert idx.needs_compaction()
+    idx = SuggestIndex.build(DOCS, {})
+    monkeypatch.setattr(suggest, "SUGGEST_DELTA_MAX", 3)
+    idx.upsert(make_doc("5", "Zoom Fly", "Nike", "zoom", ["NK-ZF"]))
+    assert idx.needs_compaction()
+
+
+@pytest.mark.asyncio
+async def test_compaction_runs_in_a_thread_and_replays_changes_made_meanwhile(monkeypatch):
+    idx = SuggestIndex.build(DOCS, {"3": 1.0})
+    idx.remove("1")
+    idx.remove("2")
+    monkeypatch.setattr(suggest, "_index", idx)
+
+    real = SuggestIndex.compacted
+
+    def slow_compacted(self, live):
+        time.sleep(0.2)                                   # the event loop keeps serving meanwhile
+        return real(self, live)
+
+    monkeypatch.setattr(SuggestIndex, "compacted", slow_compacted)
+    task = asyncio.create_task(suggest._compact())
+    await asyncio.sleep(0.05)
+    assert suggest._index is idx and idx.journal == []
+    idx.upsert(make_doc("6", "Air Zoom", "Nike", "air-zoom", []))
+    idx.remove("4")
+    await task
+
+    fresh = suggest._index
+    assert fresh is not idx and idx.journal is None
+    assert fresh.by_id.keys() == {"3", "6"}
+    assert _ids(fresh.search("air")) == ["6"]
+    assert fresh.dead == len(suggest._doc_keys(DOCS[3]))      # only the replayed remove's entries
+    assert fresh.weights == {"3": 1.0}
@@ -0,0 +1,60 @@
+# media_storage/events.py
+"""
+Image manifest events for other services.
+
+Every change to a product's images publishes the product's full manifest to the Redis
+stream MEDIA_EVENTS_STREAM, so consumers just keep the highest `version` per product and
+never need to replay history. Publishes that fail (Redis down) are retried in the
+background with the then-current manifest.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Callable
+
+from lib.redis.index import get_client
+
+log = logging.getLogger("media.events")
+
+MEDIA_EVENTS_STREAM = os.getenv("MEDIA_EVENTS_STREAM", "media:events")
+MEDIA_EVENTS_MAXLEN = int(os.getenv("MEDIA_EVENTS_MAXLEN", "100000"))
+RETRY_INTERVAL = float(os.getenv("MEDIA_EVENTS_RETRY_SECONDS", "5"))
+
+_unpublished: set[str] = set()
+_retry_task: asyncio.Task | None = None
+
+
+async def publish_manifest(product_id: str, manifest: dict) -> None:
+    try:
+        r = await get_client()
+        await r.xadd(
+            MEDIA_EVENTS_STREAM,
+            {"type": "product.images", "product_id": product_id, "data": json.dumps(manifest)},
+            maxlen=MEDIA_EVENTS_MAXLEN,
+            approximate=True,
+        )
+        _unpublished.discard(product_id)
+    except Exception as e:
+        log.warning("manifest publish for %s failed, will retry: %s", product_id, e)
+        _unpublished.add(product_id)
+
+
+async def _retry(load_manifest: Callable[[str], dict]) -> None:
+    while True:
+        await asyncio.sleep(RETRY_INTERVAL)
+        for product_id in list(_unpublished):
+            await publish_manifest(product_id, load_manifest(product_id))
+
+
+async def start_retry(load_manifest: Callable[[str], dict]) -> None:
+    global _retry_task
+    if _retry_task is None:
+        _retry_task = asyncio.create_task(_retry(load_manifest))
+
+
+async def stop_retry() -> None:
+    global _retry_task
+    if _retry_task is not None:
+        _retry_task.cancel()
+        _retry_task = None
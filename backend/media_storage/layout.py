@@ -0,0 +1,73 @@
+# media_storage/layout.py
+"""
+On-disk layout of owner buckets.
+
+Each owner's files live in a hash-sharded directory, `<subdir>/ab/cd/<owner_id>/`, where
+`ab`, `cd` are the leading hex digits of sha256(owner_id): MEDIA_SHARD_LEVELS levels of
+MEDIA_SHARD_WIDTH digits each (0 levels is the old flat `<subdir>/<owner_id>/`). With 2x2
+the owners spread over 65536 leaf directories, so no single directory grows with the user
+count. Public URLs keep the flat form, `/media/<subdir>/<owner_id>/<file>`; `ShardedStaticFiles`
+and `candidates()` map them onto the disk.
+
+Owners not yet moved by migrate_layout.py still sit in the flat location. New files always
+go to the sharded directory; reads and deletes look there first and then at the flat one,
+so the service runs unchanged while a migration is in progress.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+from starlette.staticfiles import StaticFiles
+
+SHARD_LEVELS = int(os.getenv("MEDIA_SHARD_LEVELS", "2"))
+SHARD_WIDTH = int(os.getenv("MEDIA_SHARD_WIDTH", "2"))
+
+
+def shard(owner_id: str) -> tuple[str, ...]:
+    digest = hashlib.sha256(owner_id.encode()).hexdigest()
+    return tuple(digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_LEVELS))
+
+
+def is_shard_name(name: str) -> bool:
+    """A first-level shard directory (as opposed to an unmigrated owner directory)."""
+    return SHARD_LEVELS > 0 and len(name) == SHARD_WIDTH and all(c in "0123456789abcdef" for c in name)
+
+
+def owner_dir(root: Path, subdir: str, owner_id: str) -> Path:
+    """Where the owner's files are written."""
+    return root.joinpath(subdir, *shard(owner_id), owner_id)
+
+
+def legacy_dir(root: Path, subdir: str, owner_id: str) -> Path:
+    return root / subdir / owner_id
+
+
+def owner_dirs(root: Path, subdir: str, owner_id: str) -> list[Path]:
+    """
+    Every directory that may hold the owner's files, flat one first: the migration only moves
+    files flat -> sharded, so listing in this order sees each file at least once.
+    """
+    new, old = owner_dir(root, subdir, owner_id), legacy_dir(root, subdir, owner_id)
+    return [new] if new == old else [old, new]
+
+
+def candidates(rel: str) -> list[str]:
+    """
+    Disk paths (relative to MEDIA_ROOT) for a public `<subdir>/<owner_id>/<rest>` path, sharded
+    first. Paths that aren't inside an owner bucket map to themselves.
+    """
+    parts = rel.replace(os.sep, "/").split("/")
+    if SHARD_LEVELS == 0 or len(parts) < 3:
+        return [rel]
+    return [os.path.join(parts[0], *shard(parts[1]), *parts[1:]), rel]
+
+
+class ShardedStaticFiles(StaticFiles):
+    """StaticFiles serving the public flat URLs out of the sharded tree (flat tree as fallback)."""
+
+    def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+        for candidate in candidates(path):
+            full_path, stat = super().lookup_path(candidate)
+            if stat is not None:
+                return full_path, stat
+        return "", None
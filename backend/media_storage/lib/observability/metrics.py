@@ -0,0 +1,360 @@
+"""
+Minimal Prometheus text-format metrics.
+
+Series are allocated once (per route, per pool, per cache) and then updated
+with plain attribute arithmetic, so the per-request cost is two dict lookups
+and one bisect. Pool / loop gauges are refreshed only when /metrics is scraped.
+"""
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from typing import Callable
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+UNMATCHED_ROUTE = "<unmatched>"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ---------- primitives ----------
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, n: float = 1.0) -> None:
+        self.value += n
+
+
+class Gauge(Counter):
+    __slots__ = ()
+
+    def dec(self, n: float = 1.0) -> None:
+        self.value -= n
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Family:
+    """A named metric with a fixed label set; children are created once per label tuple."""
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.children: dict[tuple, Counter | Gauge | Histogram] = {}
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            if self.kind == "histogram":
+                child = Histogram(self.buckets)
+            elif self.kind == "gauge":
+                child = Gauge()
+            else:
+                child = Counter()
+            self.children[values] = child
+        return child
+
+    def render(self, out: list[str]) -> None:
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in self.children.items():
+            if self.kind != "histogram":
+                out.append(f"{self.name}{_labels(self.labelnames, values)} {child.value}")
+                continue
+            acc = 0
+            for bound, n in zip(child.bounds, child.counts):
+                acc += n
+                le = 'le="%s"' % bound
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {acc}")
+            acc += child.counts[-1]
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, values)} {child.sum}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, values)} {acc}")
+
+
+class Registry:
+    def __init__(self):
+        self.families: list[Family] = []
+        self.collectors: list[Callable[[], None]] = []
+
+    def _add(self, fam: Family) -> Family:
+        self.families.append(fam)
+        return fam
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Family:
+        return self._add(Family(name, help, "counter", labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple = ()) -> Family:
+        return self._add(Family(name, help, "gauge", labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Family:
+        return self._add(Family(name, help, "histogram", labelnames, buckets))
+
+    def on_collect(self, fn: Callable[[], None]) -> None:
+        """Register a callback that refreshes gauges right before a scrape."""
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self.collectors:
+            try:
+                fn()
+            except Exception:
+                pass
+        out: list[str] = []
+        for fam in self.families:
+            fam.render(out)
+        out.append("")
+        return "\n".join(out)
+
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_seconds", "Request latency by route.", ("method", "route"))
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "Requests by route and status class.", ("method", "route", "status"))
+HTTP_INFLIGHT = REGISTRY.gauge("http_requests_in_flight", "Requests currently being served.").labels()
+
+DB_POOL = REGISTRY.gauge("db_pool_connections", "SQLAlchemy pool connections by state.", ("pool", "state"))
+DB_POOL_CHECKOUTS = REGISTRY.counter("db_pool_checkouts_total", "SQLAlchemy pool checkouts.", ("pool",))
+DB_POOL_OVERFLOW_CHECKOUTS = REGISTRY.counter("db_pool_overflow_checkouts_total", "Checkouts served beyond pool_size.", ("pool",))
+DB_POOL_HOLD = REGISTRY.histogram("db_pool_hold_seconds", "Time a connection stays checked out.", ("pool",))
+
+REDIS_POOL = REGISTRY.gauge("redis_pool_connections", "Redis pool connections by state.", ("pool", "state"))
+HTTPX_POOL = REGISTRY.gauge("httpx_pool_connections", "httpx pool connections by state.", ("pool", "state"))
+
+CACHE_REQUESTS = REGISTRY.counter("cache_requests_total", "Cache lookups by result.", ("cache", "result"))
+CACHE_HIT_RATIO = REGISTRY.gauge("cache_hit_ratio", "hits / (hits + misses) since start.", ("cache",))
+
+LOOP_LAG = REGISTRY.histogram("event_loop_lag_seconds", "Scheduling delay of a periodic timer.", (), LAG_BUCKETS).labels()
+LOOP_LAG_LAST = REGISTRY.gauge("event_loop_lag_last_seconds", "Most recent event-loop lag sample.").labels()
+
+
+# ---------- caches ----------
+
+class CacheStats:
+    """Preallocated hit/miss counters for one named cache."""
+    __slots__ = ("hits", "misses")
+
+    def __init__(self, name: str):
+        self.hits = CACHE_REQUESTS.labels(name, "hit")
+        self.misses = CACHE_REQUESTS.labels(name, "miss")
+        ratio = CACHE_HIT_RATIO.labels(name)
+
+        def _refresh():
+            total = self.hits.value + self.misses.value
+            ratio.set(self.hits.value / total if total else 0.0)
+        REGISTRY.on_collect(_refresh)
+
+
+# ---------- HTTP ----------
+
+class _RouteSeries:
+    __slots__ = ("latency", "by_status")
+
+    def __init__(self, method: str, route: str):
+        self.latency = HTTP_LATENCY.labels(method, route)
+        self.by_status = [HTTP_REQUESTS.labels(method, route, f"{i}xx") for i in range(1, 6)]
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware; labels by the matched route template, not the raw path."""
+
+    def __init__(self, app):
+        self.app = app
+        self._series: dict[str, dict[str, _RouteSeries]] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_INFLIGHT.value += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_INFLIGHT.value -= 1
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            method = scope["method"]
+            by_method = self._series.get(route)
+            if by_method is None:
+                by_method = self._series[route] = {}
+            series = by_method.get(method)
+            if series is None:
+                series = by_method[method] = _RouteSeries(method, route)
+            series.latency.observe(elapsed)
+            series.by_status[min(max(status // 100, 1), 5) - 1].value += 1
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+# ---------- pools ----------
+
+def _pool_waiters(pool) -> int:
+    # AsyncAdaptedQueuePool keeps an asyncio.Queue; its getters are tasks waiting for a connection.
+    try:
+        return len(pool._pool._queue._getters)
+    except Exception:
+        return 0
+
+
+def instrument_engine(engine, name: str = "primary") -> None:
+    """Track checkouts / hold time via pool events and expose pool gauges on scrape."""
+    from sqlalchemy import event
+
+    pool = engine.sync_engine.pool
+    checkouts = DB_POOL_CHECKOUTS.labels(name)
+    overflow_checkouts = DB_POOL_OVERFLOW_CHECKOUTS.labels(name)
+    hold = DB_POOL_HOLD.labels(name)
+    gauges = {state: DB_POOL.labels(name, state) for state in ("size", "checked_out", "checked_in", "overflow", "waiting")}
+    has_stats = hasattr(pool, "checkedout")
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        checkouts.value += 1
+        record.info["metrics_checkout_at"] = time.perf_counter()
+        if has_stats and pool.checkedout() > pool.size():
+            overflow_checkouts.value += 1
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        started = record.info.pop("metrics_checkout_at", None)
+        if started is not None:
+            hold.observe(time.perf_counter() - started)
+
+    def _refresh():
+        if not has_stats:
+            return
+        gauges["size"].set(pool.size())
+        gauges["checked_out"].set(pool.checkedout())
+        gauges["checked_in"].set(pool.checkedin())
+        gauges["overflow"].set(max(pool.overflow(), 0))
+        gauges["waiting"].set(_pool_waiters(pool))
+    REGISTRY.on_collect(_refresh)
+
+
+def instrument_redis(get_client: Callable, name: str = "default") -> None:
+    """`get_client` returns the (possibly not yet created) redis.asyncio client."""
+    gauges = {state: REDIS_POOL.labels(name, state) for state in ("created", "in_use", "idle", "max")}
+
+    def _refresh():
+        client = get_client()
+        if client is None:
+            return
+        pool = client.connection_pool
+        gauges["created"].set(getattr(pool, "_created_connections", 0))
+        gauges["in_use"].set(len(getattr(pool, "_in_use_connections", ())))
+        gauges["idle"].set(len(getattr(pool, "_available_connections", ())))
+        gauges["max"].set(getattr(pool, "max_connections", 0) or 0)
+    REGISTRY.on_collect(_refresh)
+
+
+def instrument_httpx(get_client: Callable, name: str = "default") -> None:
+    """`get_client` returns the (possibly not yet created) httpx.AsyncClient."""
+    gauges = {state: HTTPX_POOL.labels(name, state) for state in ("open", "idle", "active")}
+
+    def _refresh():
+        client = get_client()
+        if client is None:
+            return
+        conns = getattr(getattr(client, "_transport", None), "_pool", None)
+        conns = getattr(conns, "connections", None) or []
+        idle = sum(1 for c in conns if c.is_idle())
+        gauges["open"].set(len(conns))
+        gauges["idle"].set(idle)
+        gauges["active"].set(len(conns) - idle)
+    REGISTRY.on_collect(_refresh)
+
+
+# ---------- event loop ----------
+
+_lag_task: asyncio.Task | None = None
+
+
+async def _watch_loop_lag(interval: float) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - t0 - interval, 0.0)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.value = lag
+
+
+async def start_loop_lag_monitor() -> None:
+    global _lag_task
+    if _lag_task is None:
+        _lag_task = asyncio.create_task(_watch_loop_lag(LOOP_LAG_INTERVAL))
+
+
+async def stop_loop_lag_monitor() -> None:
+    global _lag_task
+    if _lag_task is not None:
+        _lag_task.cancel()
+        _lag_task = None
+
+
+@asynccontextmanager
+async def loop_lag_monitor():
+    """The lag monitor for the duration of the block; enter it from the app's lifespan."""
+    await start_loop_lag_monitor()
+    try:
+        yield
+    finally:
+        await stop_loop_lag_monitor()
+
+
+def setup_metrics(app, path: str = "/metrics") -> None:
+    """
+    Add the middleware (call after other add_middleware so it wraps them) and the endpoint.
+    The lag monitor is not tied to the app: run `loop_lag_monitor()` in its lifespan.
+    """
+    app.add_middleware(MetricsMiddleware)
+    app.add_route(path, metrics_endpoint, include_in_schema=False)
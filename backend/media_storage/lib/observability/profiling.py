@@ -0,0 +1,284 @@
+"""
+Opt-in per-request profiling for production debugging.
+
+A request is profiled when it carries a valid signed `X-Profile` header, or by sampling
+1 in PROFILE_SAMPLE_RATE requests (0 = never). At most one request per process is profiled
+at a time; anything else passes straight through, so the cost of the middleware when idle
+is one header lookup.
+
+Engines (PROFILE_ENGINE):
+- "sampler" (default): a thread samples the event-loop thread's stack every
+  PROFILE_INTERVAL seconds and writes folded stacks (`frame;frame;frame count` per line),
+  which flamegraph.pl, inferno and speedscope read directly. Being statistical, its
+  overhead does not depend on how many calls the request makes.
+- "cprofile": deterministic cProfile over the request, saved as pstats (snakeviz, flameprof).
+Both see the whole event-loop thread while the request runs, including other requests'
+work interleaved with it; that is usually exactly what explains a p99 spike.
+
+Profiles go to PROFILE_DIR as a bounded ring (oldest dropped past PROFILE_MAX_FILES), each
+with a JSON sidecar (method, route, status, duration, trigger). The profiled response gets
+an `X-Profile-Id` header. `GET /admin/profiles` lists them and `GET /admin/profiles/{id}`
+fetches one; both need the same signed header.
+
+The header is `<expires unix ts>.<hex HMAC-SHA256 of the ts under PROFILE_SECRET>`; without a
+secret, header triggering and the admin routes are disabled. Mint one with
+
+    PROFILE_SECRET=... python -m lib.observability.profiling --ttl 600
+"""
+import argparse
+import asyncio
+import cProfile
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter as Tally
+from pathlib import Path
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, Response
+
+from lib.observability.metrics import REGISTRY
+
+log = logging.getLogger("profiling")
+
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))     # 1 in N requests; 0 = off
+PROFILE_ENGINE = os.getenv("PROFILE_ENGINE", "sampler")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(Path(tempfile.gettempdir()) / "profiles")))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+PROFILE_MAX_DEPTH = 128
+HEADER = "x-profile"
+_HEADER_KEY = HEADER.encode()
+
+PROFILES = REGISTRY.counter("profiles_captured_total", "Requests profiled, by trigger.", ("trigger",))
+
+_ID_RE = re.compile(r"^\d{13}-[0-9a-f]{8}$")
+_EXT = {"sampler": ".folded", "cprofile": ".prof"}
+_busy = False
+
+
+# ---------- signed trigger ----------
+
+def _signature(expires: str) -> str:
+    return hmac.new(PROFILE_SECRET.encode(), expires.encode(), hashlib.sha256).hexdigest()
+
+
+def sign(ttl: float = 600.0) -> str:
+    expires = str(int(time.time() + ttl))
+    return f"{expires}.{_signature(expires)}"
+
+
+def verify(token: str | None) -> bool:
+    if not PROFILE_SECRET or not token:
+        return False
+    expires, _, sig = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(sig, _signature(expires))
+
+
+# ---------- engines ----------
+
+class _Sampler:
+    """Folded stacks of one thread, sampled from a helper thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Tally[str] = Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: Path) -> int:
+        path.write_text("".join(f"{stack} {n}\n" for stack, n in self.stacks.items()))
+        return sum(self.stacks.values())
+
+
+class _CProfile:
+    def __init__(self):
+        self._prof = cProfile.Profile()
+
+    def start(self) -> None:
+        self._prof.enable()
+
+    def stop(self) -> None:
+        self._prof.disable()
+
+    def dump(self, path: Path) -> int:
+        self._prof.dump_stats(path)
+        return 0
+
+
+def _engine():
+    if PROFILE_ENGINE == "cprofile":
+        return _CProfile()
+    return _Sampler(threading.get_ident(), PROFILE_INTERVAL)
+
+
+# ---------- ring buffer ----------
+
+def _save(engine, profile_id: str, meta: dict) -> None:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    ext = _EXT.get(PROFILE_ENGINE, ".folded")
+    meta["samples"] = engine.dump(PROFILE_DIR / f"{profile_id}{ext}")
+    meta["file"] = f"{profile_id}{ext}"
+    (PROFILE_DIR / f"{profile_id}.json").write_text(json.dumps(meta))
+    # ids start with a millisecond timestamp, so name order is age order
+    for old in sorted(PROFILE_DIR.glob("*.json"))[:-PROFILE_MAX_FILES or None]:
+        for p in PROFILE_DIR.glob(f"{old.stem}.*"):
+            p.unlink(missing_ok=True)
+
+
+def list_profiles() -> list[dict]:
+    out = []
+    for p in sorted(PROFILE_DIR.glob("*.json"), reverse=True):
+        try:
+            out.append(json.loads(p.read_text()))
+        except (OSError, ValueError):
+            continue     # dropped by the ring between glob and read
+    return out
+
+
+# ---------- middleware ----------
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware; profiles the requests picked by `_trigger`, passes the rest through."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _trigger(self, scope) -> str | None:
+        if _busy or scope["path"].startswith("/admin/profiles"):
+            return None
+        if PROFILE_SECRET:
+            for name, value in scope["headers"]:
+                if name == _HEADER_KEY:
+                    return "header" if verify(value.decode("latin-1")) else None
+        if PROFILE_SAMPLE_RATE > 0 and random.random() * PROFILE_SAMPLE_RATE < 1:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trigger = self._trigger(scope)
+        if trigger is None:
+            return await self.app(scope, receive, send)
+
+        global _busy
+        _busy = True
+        profile_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        engine = _engine()
+        started_at, start = time.time(), time.perf_counter()
+        try:
+            engine.start()
+        except Exception as e:   # e.g. another profiler (debugger, coverage) already installed
+            log.warning("could not start profiler: %s", e)
+            _busy = False
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            engine.stop()
+            meta = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(scope.get("route"), "path", None),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "started_at": started_at,
+                "trigger": trigger,
+                "engine": PROFILE_ENGINE,
+            }
+            try:
+                await asyncio.to_thread(_save, engine, profile_id, meta)
+                PROFILES.labels(trigger).value += 1
+            except Exception as e:
+                log.warning("could not save profile %s: %s", profile_id, e)
+            finally:
+                _busy = False
+
+
+# ---------- admin ----------
+
+def _forbidden(request: Request) -> Response | None:
+    if not PROFILE_SECRET:
+        return Response(status_code=404)
+    if not verify(request.headers.get(HEADER)):
+        return JSONResponse({"detail": "Valid X-Profile header required"}, status_code=403)
+    return None
+
+
+async def profiles_endpoint(request: Request) -> Response:
+    denied = _forbidden(request)
+    if denied is not None:
+        return denied
+    items = await asyncio.to_thread(list_profiles)
+    return JSONResponse({"count": len(items), "items": items})
+
+
+async def profile_endpoint(request: Request) -> Response:
+    denied = _forbidden(request)
+    if denied is not None:
+        return denied
+    profile_id = request.path_params["profile_id"]
+    if _ID_RE.match(profile_id):
+        for ext, media_type in ((".folded", "text/plain; charset=utf-8"), (".prof", "application/octet-stream")):
+            path = PROFILE_DIR / f"{profile_id}{ext}"
+            if path.is_file():
+                return FileResponse(path, media_type=media_type, filename=path.name)
+    return JSONResponse({"detail": "Profile not found"}, status_code=404)
+
+
+def setup_profiling(app, prefix: str = "/admin/profiles") -> None:
+    """Add the middleware and admin routes; call before setup_metrics so profiling time shows in latency."""
+    app.add_middleware(ProfilingMiddleware)
+    app.add_route(prefix, profiles_endpoint, include_in_schema=False)
+    app.add_route(prefix + "/{profile_id}", profile_endpoint, include_in_schema=False)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(prog="python -m lib.observability.profiling", description="Mint an X-Profile header value.")
+    ap.add_argument("--ttl", type=float, default=600.0, help="seconds the token stays valid")
+    args = ap.parse_args()
+    if not PROFILE_SECRET:
+        ap.error("PROFILE_SECRET is not set")
+    print(sign(args.ttl))
@@ -0,0 +1,319 @@
+"""
+Shared Redis client.
+
+- `get_client()`: one lazily created client per process on a bounded, blocking connection
+  pool (waits up to REDIS_POOL_TIMEOUT for a free connection instead of opening unbounded
+  ones), with socket timeouts, keepalive, periodic connection health checks and retries with
+  exponential backoff on connection errors. Every command is timed into
+  `redis_command_duration_seconds{command}`.
+- `mget_many` / `set_many` / `delete_many` / `pipelined`: multi-key work in chunked,
+  non-transactional pipelines (one round trip per REDIS_PIPELINE_CHUNK commands).
+- `TrackedCache`: opt-in client-side cache for hot read-mostly keys, kept coherent by
+  server-assisted invalidation (CLIENT TRACKING).
+- `start_health_check()`: background PING that drives `redis_up` and logs outages once.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from lib.observability.metrics import REGISTRY, CacheStats
+
+log = logging.getLogger("redis")
+
+def _build_redis_url() -> str:
+    dsn = os.getenv("REDIS_URL", "").strip()
+    if dsn:
+        return dsn
+    host = os.getenv("REDIS_HOST", "redis")
+    port = os.getenv("REDIS_PORT", "6379")
+    db   = os.getenv("REDIS_DB", "0")
+    return f"redis://{host}:{port}/{db}"
+
+REDIS_URL = _build_redis_url()
+MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "2.0"))
+SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2.0"))
+CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1.0"))
+HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "15"))   # per connection, before reuse
+RETRIES = int(os.getenv("REDIS_RETRIES", "3"))
+RETRY_BACKOFF_BASE = float(os.getenv("REDIS_RETRY_BACKOFF_BASE", "0.05"))
+RETRY_BACKOFF_CAP = float(os.getenv("REDIS_RETRY_BACKOFF_CAP", "1.0"))
+PIPELINE_CHUNK = int(os.getenv("REDIS_PIPELINE_CHUNK", "500"))
+PING_INTERVAL = float(os.getenv("REDIS_PING_INTERVAL", "5.0"))
+
+COMMAND_LATENCY = REGISTRY.histogram("redis_command_duration_seconds", "Redis command latency.", ("command",))
+COMMAND_ERRORS = REGISTRY.counter("redis_command_errors_total", "Redis commands that raised.", ("command",))
+REDIS_UP = REGISTRY.gauge("redis_up", "1 if the last health-check PING succeeded.").labels()
+
+_series: dict[str, tuple] = {}
+
+
+def _observe(command: str, started: float, failed: bool) -> None:
+    s = _series.get(command)
+    if s is None:
+        s = _series[command] = (COMMAND_LATENCY.labels(command), COMMAND_ERRORS.labels(command))
+    s[0].observe(time.perf_counter() - started)
+    if failed:
+        s[1].value += 1
+
+
+class _TimedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started, failed = time.perf_counter(), True
+        try:
+            res = await super().execute(raise_on_error)
+            failed = False
+            return res
+        finally:
+            _observe("PIPELINE", started, failed)
+
+
+class TimedRedis(redis.Redis):
+    """redis.asyncio.Redis that records per-command latency and errors."""
+
+    async def execute_command(self, *args, **options):
+        started, failed = time.perf_counter(), True
+        try:
+            res = await super().execute_command(*args, **options)
+            failed = False
+            return res
+        finally:
+            _observe(str(args[0]).upper(), started, failed)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> _TimedPipeline:
+        return _TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+_client: TimedRedis | None = None
+
+def _pool() -> redis.BlockingConnectionPool:
+    return redis.BlockingConnectionPool.from_url(
+        REDIS_URL,
+        decode_responses=True,
+        max_connections=MAX_CONNECTIONS,
+        timeout=POOL_TIMEOUT,
+        socket_timeout=SOCKET_TIMEOUT,
+        socket_connect_timeout=CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=HEALTH_CHECK_INTERVAL,
+        retry=Retry(ExponentialBackoff(cap=RETRY_BACKOFF_CAP, base=RETRY_BACKOFF_BASE), RETRIES),
+        retry_on_error=[RedisConnectionError, RedisTimeoutError],
+    )
+
+async def get_client() -> TimedRedis:
+    global _client
+    if _client is None:
+        _client = TimedRedis(connection_pool=_pool())
+    return _client
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
+        await client.connection_pool.disconnect()
+
+async def ping() -> bool:
+    r = await get_client()
+    try:
+        return await r.ping()
+    except Exception:
+        return False
+
+
+# ---------- batched multi-key helpers ----------
+
+def _chunks(items: list, size: int) -> Iterable[list]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+async def pipelined(calls: Iterable[Callable[[Any], Any]], chunk: int = PIPELINE_CHUNK) -> list:
+    """Queue `call(pipe)` for each call on non-transactional pipelines; results in order."""
+    r = await get_client()
+    out: list = []
+    for part in _chunks(list(calls), chunk):
+        async with r.pipeline(transaction=False) as pipe:
+            for call in part:
+                call(pipe)
+            out += await pipe.execute()
+    return out
+
+async def mget_many(keys: list[str], chunk: int = PIPELINE_CHUNK) -> list[str | None]:
+    """MGET in slices of `chunk` keys, so huge key lists don't block the server."""
+    r = await get_client()
+    out: list = []
+    for part in _chunks(keys, chunk):
+        out += await r.mget(part)
+    return out
+
+async def set_many(mapping: dict[str, Any], ttl: float | None = None, chunk: int = PIPELINE_CHUNK) -> None:
+    px = int(ttl * 1000) if ttl else None
+    await pipelined([lambda p, k=k, v=v: p.set(k, v, px=px) for k, v in mapping.items()], chunk)
+
+async def delete_many(keys: list[str], chunk: int = PIPELINE_CHUNK) -> int:
+    """UNLINK (non-blocking delete) in slices; returns how many keys existed."""
+    r = await get_client()
+    n = 0
+    for part in _chunks(keys, chunk):
+        n += await r.unlink(*part)
+    return n
+
+
+# ---------- health ----------
+
+_health_task: asyncio.Task | None = None
+
+async def _health_loop() -> None:
+    was_up, backoff = True, 0.5
+    while True:
+        up = await ping()
+        REDIS_UP.set(1 if up else 0)
+        if up != was_up:
+            (log.info if up else log.warning)("redis %s", "reachable again" if up else "unreachable")
+            was_up = up
+        if up:
+            backoff = 0.5
+            await asyncio.sleep(PING_INTERVAL)
+        else:
+            # probe quickly at first, then back off; pooled connections reconnect on their next command
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+async def start_health_check() -> None:
+    global _health_task
+    if _health_task is None:
+        _health_task = asyncio.create_task(_health_loop())
+
+async def stop_health_check() -> None:
+    global _health_task
+    if _health_task is not None:
+        _health_task.cancel()
+        _health_task = None
+
+
+# ---------- client-side cache ----------
+
+class TrackedCache:
+    """
+    Local copies of string keys under `prefixes`, invalidated by Redis itself.
+
+    Uses CLIENT TRACKING in BCAST mode with REDIRECT: one dedicated connection turns tracking
+    on for the prefixes and redirects invalidations to a second connection subscribed to
+    `__redis__:invalidate`, so the pooled connections need no tracking state. (This is the
+    RESP2-compatible form of RESP3 client-side caching; redis.asyncio has no RESP3 push hook.)
+
+    Until both connections are up, and after either drops, reads go straight to Redis and the
+    local copy is emptied, so a missed invalidation can never serve a stale value for long:
+    entries also expire after `ttl` seconds as a last resort.
+    """
+
+    def __init__(self, name: str, prefixes: Iterable[str], max_entries: int = 10000, ttl: float = 300.0):
+        self.name = name
+        self.prefixes = tuple(prefixes)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.active = False
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[str, bool] = {}     # key -> invalidated while being fetched
+        self._stats = CacheStats(f"redis_{name}")
+        self._task: asyncio.Task | None = None
+
+    def _tracked(self, key: str) -> bool:
+        return key.startswith(self.prefixes)
+
+    def invalidate(self, keys: Iterable[str] | None) -> None:
+        if keys is None:
+            self._entries.clear()
+            for k in self._inflight:
+                self._inflight[k] = True
+            return
+        for k in keys:
+            self._entries.pop(k, None)
+            if k in self._inflight:
+                self._inflight[k] = True
+
+    async def get(self, key: str) -> Any:
+        if not (self.active and self._tracked(key)):
+            return await (await get_client()).get(key)
+        hit = self._entries.get(key)
+        if hit is not None and hit[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self._stats.hits.value += 1
+            return hit[1]
+        self._stats.misses.value += 1
+        self._inflight[key] = False
+        try:
+            value = await (await get_client()).get(key)
+            # an invalidation that raced the read means `value` may already be stale: don't keep it
+            if self.active and not self._inflight.get(key):
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _run(self) -> None:
+        backoff = 0.5
+        pool = (await get_client()).connection_pool
+        while True:
+            listener = tracker = None
+            try:
+                listener = pool.make_connection()
+                await listener.connect()
+                await listener.send_command("CLIENT", "ID")
+                listener_id = await listener.read_response()
+                await listener.send_command("SUBSCRIBE", "__redis__:invalidate")
+                await listener.read_response()
+
+                tracker = pool.make_connection()
+                await tracker.connect()
+                args = ["CLIENT", "TRACKING", "ON", "REDIRECT", listener_id, "BCAST"]
+                for p in self.prefixes:
+                    args += ["PREFIX", p]
+                await tracker.send_command(*args)
+                await tracker.read_response()
+
+                self.invalidate(None)
+                self.active = True
+                backoff = 0.5
+                log.info("client-side cache %s tracking %s", self.name, ", ".join(self.prefixes))
+                while True:
+                    msg = await listener.read_response(timeout=PING_INTERVAL)   # None on timeout
+                    if msg is None:
+                        # quiet period: make sure the tracking connection is still alive
+                        await tracker.send_command("PING")
+                        await tracker.read_response()
+                        continue
+                    if isinstance(msg, list) and len(msg) == 3 and msg[0] == "message":
+                        self.invalidate(msg[2])     # None => flush everything (FLUSHDB, tracking reset)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("client-side cache %s lost tracking, retrying in %.1fs: %s", self.name, backoff, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                self.active = False
+                self.invalidate(None)
+                for c in (listener, tracker):
+                    if c is not None:
+                        await c.disconnect()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -1,30 +1,47 @@
 # media_storage/main.py
 import os
 import re
-import imghdr
+import time
+import json
 import asyncio
+import logging
+from contextlib import AsyncExitStack, asynccontextmanager
 from uuid import uuid4
 from typing import List, Optional
 from pathlib import Path
 from typing import Dict
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query
-from fastapi.staticfiles import StaticFiles
 from starlette import status
 
+from lib.observability.metrics import setup_metrics, loop_lag_monitor, instrument_redis
+from lib.observability.profiling import setup_profiling
+import lib.redis.index as redis_index
+from processing import JobStore, UploadQueue, QueueFull, strip_metadata, write_derivatives, image_info, UPLOAD_RETRY_AFTER
+from events import publish_manifest, start_retry, stop_retry
+from sniff import ImageKind, MAX_PIXELS, MIME_TYPES, sniff, sniff_file
+from layout import ShardedStaticFiles, candidates, owner_dir, owner_dirs
+
 # === MEDIA PATH: in the same directory as this file by default ===
 BASE_DIR = Path(__file__).resolve().parent
 DEFAULT_MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_ROOT = Path(os.getenv("MEDIA_ROOT", str(DEFAULT_MEDIA_ROOT))).resolve()
 MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
+# Raw bytes of async uploads wait here; kept outside MEDIA_ROOT so nothing unprocessed is served.
+SPOOL_ROOT = Path(os.getenv("UPLOAD_SPOOL_DIR", str(BASE_DIR / "spool"))).resolve()
+# Per-product image manifests (alt text, dimensions, blurhash); also not publicly served.
+META_ROOT = Path(os.getenv("MEDIA_META_DIR", str(BASE_DIR / "meta"))).resolve()
 
-ALLOWED_MIME = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+ALLOWED_MIME = set(MIME_TYPES.values())
 MAX_BYTES = 10 * 1024 * 1024  # 10 MB
+SPOOL_CHUNK = 1024 * 1024
 
 # Filename prefix like 000001-, 000002-, ... (keeps order stable by lexicographic sort)
 POSITION_PAD = 6
 FNAME_RE = re.compile(rf"^(\d{{{POSITION_PAD}}})-")
 
+log = logging.getLogger("media")
+
 # In-process locks to avoid race conditions (one per owner bucket)
 _locks: dict[str, asyncio.Lock] = {}
 
@@ -37,28 +54,127 @@ def _get_lock(key: str) -> asyncio.Lock:
     return lock
 
 
-app = FastAPI(title="media_storage")
-app.mount("/media", StaticFiles(directory=str(MEDIA_ROOT)), name="media")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Background work starts in order; the exit stack stops it in reverse, also when a later start fails."""
+    async with AsyncExitStack() as stack:
+        stack.push_async_callback(redis_index.close_client)      # after everything that publishes
+        await stack.enter_async_context(loop_lag_monitor())
+        await redis_index.start_health_check()
+        stack.push_async_callback(redis_index.stop_health_check)
+        await start_retry(load_manifest)
+        stack.push_async_callback(stop_retry)
+        await upload_queue.start()
+        stack.push_async_callback(upload_queue.stop)
+        yield
+
+
+app = FastAPI(title="media_storage", lifespan=lifespan)
+setup_profiling(app)
+setup_metrics(app)
+# URLs stay /media/<subdir>/<owner_id>/<file>; files live in hash-sharded directories (layout.py)
+app.mount("/media", ShardedStaticFiles(directory=str(MEDIA_ROOT)), name="media")
 
 
 def ensure_dir(path: Path) -> None:
     path.mkdir(parents=True, exist_ok=True)
 
 
-def ext_from_bytes(filename: str, content: bytes) -> str:
+def check_image(name: str, data: bytes, complete: bool = True) -> ImageKind:
     """
-    Determine extension from content; fallback to filename.
+    Type and size from the headers of `data`, rejecting anything that isn't a supported image
+    or would decode to more than MAX_PIXELS. With `complete=False` (just the first chunk of an
+    upload) a size that isn't in those bytes yet is let through, to be checked on the full file.
     """
-    kind = imghdr.what(None, h=content)  # 'jpeg','png','gif', None for webp
-    if kind == "jpeg":
-        return "jpg"
-    if kind in {"png", "gif"}:
-        return kind
-    # imghdr doesn’t detect webp reliably → fallback to filename
-    ext = Path(filename).suffix.lower().lstrip(".")
-    if ext == "jpeg":
-        ext = "jpg"
-    return ext if ext in {"jpg", "png", "gif", "webp"} else "bin"
+    kind = sniff(data)
+    if kind is None:
+        raise HTTPException(400, f"Unsupported image type: {name}")
+    if kind.pixels is None:
+        if complete:
+            raise HTTPException(400, f"Could not read image dimensions: {name}")
+    elif kind.pixels == 0:
+        raise HTTPException(400, f"Invalid image dimensions: {name}")
+    elif kind.pixels > MAX_PIXELS:
+        raise HTTPException(413, f"Image too large: {name} is {kind.width}x{kind.height}, limit is {MAX_PIXELS} pixels")
+    return kind
+
+
+def _next_position(dirs: list[Path]) -> int:
+    """One past the highest numeric prefix across the owner's folders (0 when empty)."""
+    max_pos = -1
+    for base_dir in dirs:
+        if not base_dir.exists():
+            continue
+        for p in base_dir.iterdir():
+            if p.is_file():
+                m = FNAME_RE.match(p.name)
+                if m:
+                    try:
+                        max_pos = max(max_pos, int(m.group(1)))
+                    except ValueError:
+                        pass
+    return max_pos + 1
+
+
+def write_atomic(path: Path, content: bytes) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def media_url(subdir: str, owner_id: str, fname: str) -> str:
+    rel = Path(subdir) / owner_id / fname
+    return f"/media/{rel.as_posix()}"                      # public path for browser
+
+
+# ---------- product image manifest ----------
+
+def _manifest_path(product_id: str) -> Path:
+    return META_ROOT / "products" / f"{product_id}.json"
+
+
+def _scan_images(product_id: str) -> list[dict]:
+    """Manifest entries rebuilt from the directory (products uploaded before manifests existed)."""
+    paths = [p for d in owner_dirs(MEDIA_ROOT, "products", product_id) if d.exists() for p in d.iterdir()]
+    items, seen = [], set()
+    for p in paths:
+        m = FNAME_RE.match(p.name)
+        if p.is_file() and m and p.name not in seen:
+            seen.add(p.name)
+            kind = sniff_file(p)
+            items.append({
+                "url": media_url("products", product_id, p.name),
+                "alt": None,
+                "filename": p.name,
+                "position": int(m.group(1)),
+                "content_type": kind and kind.mime,
+                "width": kind and kind.width, "height": kind and kind.height, "blurhash": None,
+                "derivatives": {},
+            })
+    return items
+
+
+def load_manifest(product_id: str) -> dict:
+    try:
+        return json.loads(_manifest_path(product_id).read_text())
+    except FileNotFoundError:
+        images = sorted(_scan_images(product_id), key=lambda x: x["position"])
+        return {"product_id": product_id, "version": 0, "images": images}
+
+
+def _rewrite_manifest(product_id: str, add: list[dict], remove: set[str]) -> dict:
+    """Apply a change and persist it with a new version; caller holds the product's lock."""
+    # entries being added replace any copy already there (a resumed job re-adding its items)
+    drop = remove | {i["filename"] for i in add}
+    images = [i for i in load_manifest(product_id)["images"] if i["filename"] not in drop]
+    images.extend(add)
+    images.sort(key=lambda x: x["position"])
+    manifest = {"product_id": product_id, "version": time.time_ns(), "images": images}
+    path = _manifest_path(product_id)
+    ensure_dir(path.parent)
+    write_atomic(path, json.dumps(manifest).encode())
+    return manifest
 
 
 async def save_images(
@@ -74,24 +190,12 @@ async def save_images(
     if not files:
         raise HTTPException(400, "No files provided")
 
-    base_dir = MEDIA_ROOT / subdir / owner_id
+    base_dir = owner_dir(MEDIA_ROOT, subdir, owner_id)
     ensure_dir(base_dir)
 
     # Lock per owner (product_id or user_id) so two concurrent uploads don't share the same number
     async with _get_lock(f"{subdir}:{owner_id}"):
-        # Find current max numeric prefix in the folder
-        max_pos = -1
-        if base_dir.exists():
-            for p in base_dir.iterdir():
-                if p.is_file():
-                    m = FNAME_RE.match(p.name)
-                    if m:
-                        try:
-                            max_pos = max(max_pos, int(m.group(1)))
-                        except ValueError:
-                            pass
-
-        next_pos = max_pos + 1  # next number to assign
+        next_pos = _next_position(owner_dirs(MEDIA_ROOT, subdir, owner_id))  # next number to assign
 
         saved = []
         try:
@@ -103,24 +207,17 @@ async def save_images(
                 if len(content) > MAX_BYTES:
                     raise HTTPException(413, f"File too large: {up.filename}")
 
-                ext = ext_from_bytes(up.filename, content)
-                if ext not in {"jpg", "png", "gif", "webp"}:
-                    raise HTTPException(400, f"Unsupported extension for: {up.filename}")
+                kind = check_image(up.filename, content)
 
                 prefix = str(next_pos).zfill(POSITION_PAD)  # "000001"
                 next_pos += 1
 
-                fname = f"{prefix}-{uuid4()}.{ext}"
+                fname = f"{prefix}-{uuid4()}.{kind.ext}"
                 abs_path = base_dir / fname
 
-                # Write atomically
-                tmp = abs_path.with_suffix(abs_path.suffix + ".tmp")
-                with open(tmp, "wb") as f:
-                    f.write(content)
-                os.replace(tmp, abs_path)
+                write_atomic(abs_path, content)
 
-                rel = Path(subdir) / owner_id / fname               # e.g. products/<product_id>/000001-<uuid>.jpg
-                url = f"/media/{rel.as_posix()}"                    # public path for browser
+                url = media_url(subdir, owner_id, fname)            # e.g. /media/products/<product_id>/000001-<uuid>.jpg
                 position = int(prefix)
 
                 saved.append({
@@ -128,6 +225,9 @@ async def save_images(
                     "alt": (alts[idx] if alts and idx < len(alts) else None),
                     "filename": fname,
                     "position": position,
+                    "content_type": kind.mime,
+                    **(await asyncio.to_thread(image_info, abs_path, (kind.width, kind.height))),
+                    "derivatives": {},
                 })
 
         except Exception:
@@ -139,6 +239,12 @@ async def save_images(
                     pass
             raise
 
+        manifest = None
+        if subdir == "products":
+            manifest = await asyncio.to_thread(_rewrite_manifest, owner_id, saved, set())
+
+    if manifest is not None:
+        await publish_manifest(owner_id, manifest)
     return saved
 
 
@@ -162,53 +268,185 @@ async def upload_profile_photo(
     return {"url": items[0]["url"]}
 
 
-def path_from_media_url(url: str) -> Path:
+# ---------- async uploads ----------
+
+async def _spool(up: UploadFile, dest: Path) -> None:
+    """
+    Stream one upload to disk in chunks, enforcing MAX_BYTES without buffering the file.
+    The first chunk is sniffed so non-images and oversized images are refused before queueing.
+    """
+    size = 0
+    with open(dest, "wb") as f:
+        while chunk := await up.read(SPOOL_CHUNK):
+            if size == 0:
+                check_image(up.filename or "", chunk, complete=False)
+            size += len(chunk)
+            if size > MAX_BYTES:
+                raise HTTPException(413, f"File too large: {up.filename}")
+            f.write(chunk)
+
+
+def _finalize_one(base_dir: Path, subdir: str, owner_id: str, spooled: Path, name: str, position: int) -> dict:
+    """Validate, strip metadata and write one spooled file plus its derivatives (runs in a thread)."""
+    content = spooled.read_bytes()
+    kind = check_image(name, content)
+    fname = f"{str(position).zfill(POSITION_PAD)}-{uuid4()}.{kind.ext}"
+    abs_path = base_dir / fname
+    write_atomic(abs_path, strip_metadata(content, kind.ext))
+    try:
+        derivatives = write_derivatives(abs_path, kind.ext)
+    except Exception as e:   # the original is still usable without resized copies
+        log.warning("derivatives failed for %s: %s", abs_path, e)
+        derivatives = {}
+    return {
+        "url": media_url(subdir, owner_id, fname),
+        "filename": fname,
+        "position": position,
+        "content_type": kind.mime,
+        **image_info(abs_path, (kind.width, kind.height)),
+        "derivatives": {w: media_url(subdir, owner_id, f"w{w}/{fname}") for w in derivatives},
+    }
+
+
+async def _process_upload_job(job: dict) -> None:
+    subdir, owner_id = job["subdir"], job["owner_id"]
+    base_dir = owner_dir(MEDIA_ROOT, subdir, owner_id)
+    ensure_dir(base_dir)
+    spool = job_store.spool_dir(job["id"])
+    # positions are assigned here, at finalize time, under the same per-owner lock as sync uploads
+    async with _get_lock(f"{subdir}:{owner_id}"):
+        next_pos = _next_position(owner_dirs(MEDIA_ROOT, subdir, owner_id))
+        # a resumed job carries on after the last file it recorded as processed
+        for f in job["files"][job["processed"]:]:
+            try:
+                item = await asyncio.to_thread(
+                    _finalize_one, base_dir, subdir, owner_id, spool / f["spool"], f["filename"], next_pos
+                )
+                item["alt"] = f["alt"]
+                job["items"].append(item)
+                next_pos += 1
+            except Exception as e:
+                job["errors"].append({"filename": f["filename"], "error": str(getattr(e, "detail", e))})
+            job["processed"] += 1
+            job_store.save(job)
+        manifest = None
+        if subdir == "products" and job["items"]:
+            manifest = await asyncio.to_thread(_rewrite_manifest, owner_id, job["items"], set())
+    if manifest is not None:
+        await publish_manifest(owner_id, manifest)
+
+
+job_store = JobStore(SPOOL_ROOT)
+upload_queue = UploadQueue(job_store, _process_upload_job)
+instrument_redis(lambda: redis_index._client)
+
+
+def _busy() -> HTTPException:
+    return HTTPException(503, "Upload queue is full, retry later", headers={"Retry-After": str(UPLOAD_RETRY_AFTER)})
+
+
+@app.post("/upload/products/{product_id}/async", status_code=status.HTTP_202_ACCEPTED)
+async def upload_product_images_async(
+    product_id: str,
+    files: List[UploadFile] = File(..., description="Repeat this key for multiple files"),
+    alts: Optional[List[str]] = Form(None, description="Optional alt text, one per file"),
+):
     """
-    Convert /media/... URL back to filesystem path under MEDIA_ROOT.
+    Land the raw bytes and return a job id; processing happens in the background.
+    Poll GET /upload/jobs/{job_id} for progress.
     """
+    if not files:
+        raise HTTPException(400, "No files provided")
+    if upload_queue.full():   # refuse before reading any bytes
+        raise _busy()
+    for up in files:
+        if up.content_type not in ALLOWED_MIME:
+            raise HTTPException(400, f"Unsupported content type: {up.content_type}")
+
+    job_id = job_store.new_id()
+    spool = job_store.spool_dir(job_id)
+    ensure_dir(spool)
+    try:
+        for idx, up in enumerate(files):
+            await _spool(up, spool / str(idx))
+        job = {
+            "id": job_id, "status": "queued", "subdir": "products", "owner_id": product_id,
+            "total": len(files), "processed": 0, "items": [], "errors": [],
+            "files": [
+                {"spool": str(idx), "filename": up.filename or "",
+                 "alt": (alts[idx] if alts and idx < len(alts) else None)}
+                for idx, up in enumerate(files)
+            ],
+            "created_at": time.time(),
+        }
+        upload_queue.submit(job)
+    except QueueFull:
+        job_store.discard_spool(job_id)
+        job.update(status="failed", error="queue full")
+        job_store.save(job)
+        raise _busy()
+    except Exception:
+        job_store.discard_spool(job_id)
+        raise
+    return {"job_id": job_id, "status": "queued", "status_url": f"/upload/jobs/{job_id}"}
+
+
+@app.get("/upload/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    job = job_store.load(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    job.pop("files", None)
+    return job
+
+
+def media_paths(url: str) -> list[Path]:
+    """Every filesystem path under MEDIA_ROOT a /media/... URL can map to, sharded layout first."""
     if not url.startswith("/media/"):
         raise HTTPException(400, "Invalid media URL")
     rel = url.removeprefix("/media/")  # e.g. products/<id>/<file>.jpg
-    return MEDIA_ROOT / Path(rel)
+    return [MEDIA_ROOT / c for c in candidates(rel)]
+
+
+def path_from_media_url(url: str) -> Path:
+    """
+    Convert /media/... URL back to filesystem path under MEDIA_ROOT: wherever the file is now
+    (sharded directory, or the flat one while unmigrated), else where it would be written.
+    """
+    paths = media_paths(url)
+    return next((p for p in paths if p.exists()), paths[0])
 
 
 @app.delete("/files", status_code=200)
 async def delete_file(url: str = Query(..., description="Media URL previously returned by this service")):
-    path = path_from_media_url(url)
-    try:
-        path.unlink()
-    except FileNotFoundError:
-        # idempotent delete
-        pass
+    paths = media_paths(url)
+    parts = Path(url.removeprefix("/media/")).parts
+    product_id = parts[1] if len(parts) == 3 and parts[0] == "products" else None
+    name = paths[0].name
+
+    async with _get_lock(f"products:{product_id}" if product_id else f"file:{paths[0]}"):
+        # flat location first: if the migration tool moves the file in between, the sharded
+        # unlink still catches it. Resized copies live next to the original as w<width>/<name>.
+        for path in reversed(paths):
+            for p in [path, *path.parent.glob(f"w*/{name}")]:
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    # idempotent delete
+                    pass
+        manifest = None
+        if product_id:
+            manifest = await asyncio.to_thread(_rewrite_manifest, product_id, [], {name})
+    if manifest is not None:
+        await publish_manifest(product_id, manifest)
     return {"ok": True}
 
 
 @app.get("/products/{product_id}/images")
 async def list_product_images(product_id: str) -> Dict[str, object]:
     """
-    List images under media/products/<product_id>/..., sorted by numeric prefix.
-    Returns: { count, items: [{url, alt, filename, position}] }
+    Images of a product from its manifest, sorted by position (no directory scan once written).
+    Returns: { count, items: [{url, alt, filename, position, width, height, blurhash, derivatives}] }
     """
-    base_dir = MEDIA_ROOT / "products" / product_id
-    if not base_dir.exists():
-        return {"count": 0, "items": []}
-
-    items = []
-    for p in sorted(base_dir.iterdir()):
-        if p.is_file():
-            m = FNAME_RE.match(p.name)
-            try:
-                pos = int(m.group(1)) if m else 0
-            except Exception:
-                pos = 0
-            rel = Path("products") / product_id / p.name
-            url = f"/media/{rel.as_posix()}"
-            items.append({
-                "url": url,
-                "alt": None,            # (no metadata store yet)
-                "filename": p.name,
-                "position": pos,
-            })
-
-    items.sort(key=lambda x: x["position"])
-    return {"count": len(items), "items": items}
\ No newline at end of file
+    items = (await asyncio.to_thread(load_manifest, product_id))["images"]
+    return {"count": len(items), "items": items}
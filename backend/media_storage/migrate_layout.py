@@ -0,0 +1,114 @@
+# media_storage/migrate_layout.py
+"""
+Online migration from the flat `<subdir>/<owner_id>/` layout to the hash-sharded one
+(layout.py), safe to run next to a live service and to interrupt and re-run.
+
+    python migrate_layout.py                          # products and profiles
+    python migrate_layout.py --subdir profiles --batch 200 --pause 1.0
+    python migrate_layout.py --dry-run
+
+Owners are moved in batches of --batch with a --pause between batches, so the disk keeps
+serving traffic. An owner directory is moved with one rename (atomic: a request sees it
+either at the flat path or the sharded one, and the service looks at both). If the sharded
+directory already exists, because uploads since the deploy were written there, the flat one
+is merged into it file by file. Nothing is copied, and public URLs do not change, so image
+manifests and URLs stored by other services stay valid.
+
+Run it with the service's MEDIA_SHARD_LEVELS / MEDIA_SHARD_WIDTH / MEDIA_ROOT.
+"""
+import argparse
+import errno
+import itertools
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+
+from layout import SHARD_LEVELS, is_shard_name, legacy_dir, owner_dir
+
+log = logging.getLogger("media.migrate_layout")
+
+BASE_DIR = Path(__file__).resolve().parent
+SUBDIRS = ("products", "profiles")
+
+
+def legacy_owners(root: Path, subdir: str) -> Iterator[str]:
+    """Owner directories still at the flat location."""
+    base = root / subdir
+    if not base.is_dir():
+        return
+    with os.scandir(base) as it:
+        for e in it:
+            if e.is_dir(follow_symlinks=False) and not is_shard_name(e.name):
+                yield e.name
+
+
+def _merge(src: Path, dst: Path) -> None:
+    for f in sorted(p for p in src.rglob("*") if not p.is_dir()):
+        target = dst / f.relative_to(src)
+        if target.exists():     # names carry a uuid, so this is a leftover of an interrupted run
+            log.warning("%s already exists, leaving %s in place", target, f)
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.rename(f, target)
+    for d in sorted((p for p in src.rglob("*") if p.is_dir()), key=lambda p: len(p.parts), reverse=True):
+        d.rmdir()
+    src.rmdir()
+
+
+def move_owner(root: Path, subdir: str, owner_id: str) -> str:
+    """Move one owner to its sharded directory; 'moved' (one rename) or 'merged'."""
+    src, dst = legacy_dir(root, subdir, owner_id), owner_dir(root, subdir, owner_id)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.rename(src, dst)
+        return "moved"
+    except OSError as e:
+        if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+            raise
+    _merge(src, dst)
+    return "merged"
+
+
+def migrate(root: Path, subdirs: tuple[str, ...], batch: int, pause: float, dry_run: bool = False) -> dict[str, int]:
+    counts = {"moved": 0, "merged": 0, "failed": 0}
+    for subdir in subdirs:
+        owners = legacy_owners(root, subdir)
+        while chunk := list(itertools.islice(owners, batch)):
+            for owner_id in chunk:
+                if dry_run:
+                    log.info("would move %s -> %s", legacy_dir(root, subdir, owner_id), owner_dir(root, subdir, owner_id))
+                    counts["moved"] += 1
+                    continue
+                try:
+                    counts[move_owner(root, subdir, owner_id)] += 1
+                except OSError as e:
+                    # e.g. a file written to the flat directory mid-merge; the next run picks it up
+                    log.warning("could not move %s/%s: %s", subdir, owner_id, e)
+                    counts["failed"] += 1
+            log.info("%s: %s", subdir, counts)
+            if pause and not dry_run:
+                time.sleep(pause)
+    return counts
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(prog="python migrate_layout.py", description="Move media to the sharded layout.")
+    p.add_argument("--root", type=Path, default=Path(os.getenv("MEDIA_ROOT", str(BASE_DIR / "media"))))
+    p.add_argument("--subdir", action="append", choices=SUBDIRS, help="repeatable; default: all")
+    p.add_argument("--batch", type=int, default=500, help="owners per batch")
+    p.add_argument("--pause", type=float, default=0.2, help="seconds to sleep between batches")
+    p.add_argument("--dry-run", action="store_true")
+    args = p.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(asctime)s %(message)s")
+    if SHARD_LEVELS == 0:
+        p.error("MEDIA_SHARD_LEVELS is 0: the flat layout is the configured one, nothing to migrate")
+    counts = migrate(args.root.resolve(), tuple(args.subdir or SUBDIRS), args.batch, args.pause, args.dry_run)
+    log.info("done: %s", counts)
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
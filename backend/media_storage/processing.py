@@ -0,0 +1,437 @@
+# media_storage/processing.py
+"""
+Background upload processing.
+
+Async uploads land their raw bytes in SPOOL_ROOT and return 202 straight away; a small
+pool of asyncio workers then validates, strips metadata, writes derivatives and assigns
+positions. Job state is a JSON file per job so any worker process can answer status.
+Blocking file / image work runs in threads so the event loop keeps serving requests.
+
+The process that queues a job holds an flock on its spool directory until the job finishes.
+On startup a queue picks up every unfinished job whose lock it can take (its owner exited,
+the kernel dropped the lock) and fails those whose spool is gone. On shutdown it stops
+taking uploads and gives the workers UPLOAD_DRAIN_SECONDS to finish what is queued; jobs
+cut off after that resume on the next start.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import math
+import os
+import shutil
+import struct
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from lib.observability.metrics import REGISTRY
+from sniff import MAX_PIXELS
+
+
+log = logging.getLogger("media.processing")
+
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_QUEUE_MAX = int(os.getenv("UPLOAD_QUEUE_MAX", "100"))
+UPLOAD_RETRY_AFTER = int(os.getenv("UPLOAD_RETRY_AFTER_SECONDS", "5"))
+JOB_TTL = float(os.getenv("UPLOAD_JOB_TTL_SECONDS", "86400"))
+UPLOAD_DRAIN_SECONDS = float(os.getenv("UPLOAD_DRAIN_SECONDS", "20"))
+DERIVATIVE_WIDTHS = tuple(int(w) for w in os.getenv("MEDIA_DERIVATIVE_WIDTHS", "320,768").split(",") if w.strip())
+
+_Image = False   # PIL.Image once imported, None if Pillow is missing
+
+
+def _pil():
+    """Pillow is imported on first use (it is slow to import and optional); None if absent."""
+    global _Image
+    if _Image is False:
+        try:
+            from PIL import Image
+            Image.MAX_IMAGE_PIXELS = MAX_PIXELS   # same bomb limit as the header check
+            _Image = Image
+        except ImportError:
+            _Image = None
+    return _Image
+
+
+QUEUE_DEPTH = REGISTRY.gauge("upload_queue_depth", "Upload jobs waiting for a worker.").labels()
+JOB_SECONDS = REGISTRY.histogram("upload_job_seconds", "Time to process one upload job.", ("status",))
+
+
+# ---------- metadata stripping ----------
+
+_JPEG_DROP = {0xE1, 0xED, 0xFE}   # APP1 (Exif/XMP), APP13 (IPTC), COM
+_PNG_DROP = {b"eXIf", b"tEXt", b"zTXt", b"iTXt", b"tIME"}
+
+
+def _exif_orientation(payload: bytes) -> int | None:
+    if not payload.startswith(b"Exif\x00\x00"):
+        return None
+    tiff = payload[6:]
+    try:
+        e = "<" if tiff[:2] == b"II" else ">"
+        ifd = struct.unpack(e + "I", tiff[4:8])[0]
+        (count,) = struct.unpack(e + "H", tiff[ifd:ifd + 2])
+        for k in range(count):
+            off = ifd + 2 + 12 * k
+            tag, _typ, _n = struct.unpack(e + "HHI", tiff[off:off + 8])
+            if tag == 0x0112:
+                return struct.unpack(e + "H", tiff[off + 8:off + 10])[0]
+    except struct.error:
+        pass
+    return None
+
+
+def _orientation_app1(orientation: int) -> bytes:
+    # minimal big-endian Exif: one IFD entry (Orientation, SHORT, 1)
+    body = (b"Exif\x00\x00" + b"MM\x00\x2a" + struct.pack(">I", 8)
+            + struct.pack(">H", 1) + struct.pack(">HHIH2x", 0x0112, 3, 1, orientation) + struct.pack(">I", 0))
+    return b"\xff\xe1" + struct.pack(">H", len(body) + 2) + body
+
+
+def _strip_jpeg(data: bytes) -> bytes:
+    out = bytearray(b"\xff\xd8")
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return data                     # not where a marker should be; leave the file alone
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xDA, 0xD9):          # start of scan / end of image: copy the rest verbatim
+            out += data[i:]
+            return bytes(out)
+        seg_end = i + 2 + int.from_bytes(data[i + 2:i + 4], "big")
+        if seg_end > n:
+            return data
+        if marker in _JPEG_DROP:
+            orientation = _exif_orientation(data[i + 4:seg_end]) if marker == 0xE1 else None
+            if orientation and orientation != 1:
+                out += _orientation_app1(orientation)   # keep display rotation, drop everything else
+        else:
+            out += data[i:seg_end]
+        i = seg_end
+    return data
+
+
+def _strip_png(data: bytes) -> bytes:
+    out = bytearray(data[:8])
+    i, n = 8, len(data)
+    while i + 12 <= n:
+        length = int.from_bytes(data[i:i + 4], "big")
+        end = i + 12 + length
+        if end > n:
+            return data
+        if data[i + 4:i + 8] not in _PNG_DROP:
+            out += data[i:end]
+        i = end
+    return bytes(out) if i == n else data
+
+
+def strip_metadata(data: bytes, ext: str) -> bytes:
+    """Drop EXIF / XMP / text metadata (GPS, camera serials...). WebP and GIF pass through."""
+    if ext == "jpg" and data[:2] == b"\xff\xd8":
+        return _strip_jpeg(data)
+    if ext == "png" and data[:8] == b"\x89PNG\r\n\x1a\n":
+        return _strip_png(data)
+    return data
+
+
+def write_derivatives(src: Path, ext: str) -> dict[str, Path]:
+    """Downscaled copies in <dir>/w<width>/<same name>; {} without Pillow or for GIFs."""
+    Image = _pil()
+    if Image is None or ext == "gif" or not DERIVATIVE_WIDTHS:
+        return {}
+    out = {}
+    with Image.open(src) as img:
+        for w in DERIVATIVE_WIDTHS:
+            if img.width <= w:
+                continue
+            dst = src.parent / f"w{w}" / src.name
+            dst.parent.mkdir(exist_ok=True)
+            copy = img.copy()
+            copy.thumbnail((w, img.height))
+            tmp = dst.with_suffix(dst.suffix + ".tmp")
+            copy.save(tmp, format=img.format)
+            os.replace(tmp, dst)
+            out[str(w)] = dst
+    return out
+
+
+_B83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _b83(value: int, length: int) -> str:
+    return "".join(_B83[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1))
+
+
+def _to_linear(c: int) -> float:
+    v = c / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _to_srgb(v: float) -> int:
+    v = min(max(v, 0.0), 1.0)
+    return int(v * 12.92 * 255 + 0.5) if v <= 0.0031308 else int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _blurhash(pixels: list, w: int, h: int, cx: int = 4, cy: int = 3) -> str:
+    """BlurHash of an RGB pixel list (row-major); callers pass a ~32px thumbnail."""
+    lin = [(_to_linear(r), _to_linear(g), _to_linear(b)) for r, g, b in pixels]
+    factors = []
+    for j in range(cy):
+        for i in range(cx):
+            norm = (1 if i == 0 and j == 0 else 2) / (w * h)
+            r = g = b = 0.0
+            for y in range(h):
+                by = math.cos(math.pi * j * y / h)
+                for x in range(w):
+                    basis = math.cos(math.pi * i * x / w) * by
+                    pr, pg, pb = lin[y * w + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            factors.append((r * norm, g * norm, b * norm))
+    dc, ac = factors[0], factors[1:]
+    out = _b83((cx - 1) + (cy - 1) * 9, 1)
+    if ac:
+        qmax = max(0, min(82, int(max(abs(v) for f in ac for v in f) * 166 - 0.5)))
+        max_value = (qmax + 1) / 166
+        out += _b83(qmax, 1)
+    else:
+        max_value = 1.0
+        out += _b83(0, 1)
+    out += _b83((_to_srgb(dc[0]) << 16) + (_to_srgb(dc[1]) << 8) + _to_srgb(dc[2]), 4)
+
+    def q(v):
+        return max(0, min(18, int(math.copysign(abs(v / max_value) ** 0.5, v) * 9 + 9.5)))
+    for r, g, b in ac:
+        out += _b83(q(r) * 19 * 19 + q(g) * 19 + q(b), 2)
+    return out
+
+
+def image_info(path: Path, size: tuple[int | None, int | None] = (None, None)) -> dict:
+    """
+    width / height / blurhash for the manifest. `size` comes from the sniffed headers, so
+    dimensions are known without Pillow; the blurhash needs a decode and is None without it.
+    """
+    info = {"width": size[0], "height": size[1], "blurhash": None}
+    Image = _pil()
+    if Image is None:
+        return info
+    try:
+        with Image.open(path) as img:
+            if info["width"] is None:
+                info["width"], info["height"] = img.size
+            thumb = img.convert("RGB")
+            thumb.thumbnail((32, 32))
+            info["blurhash"] = _blurhash(list(thumb.getdata()), *thumb.size)
+    except Exception as e:
+        log.warning("could not read image info for %s: %s", path, e)
+    return info
+
+
+# ---------- jobs ----------
+
+class JobStore:
+    """One JSON file per job under <root>/jobs; raw upload bytes under <root>/<job_id>/."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.jobs_dir = root / "jobs"
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._last_prune = 0.0
+
+    def new_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def spool_dir(self, job_id: str) -> Path:
+        return self.root / job_id
+
+    def _path(self, job_id: str) -> Path | None:
+        try:
+            return self.jobs_dir / f"{uuid.UUID(hex=job_id).hex}.json"
+        except ValueError:
+            return None
+
+    def save(self, job: dict) -> None:
+        path = self._path(job["id"])
+        job["updated_at"] = time.time()
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(job))
+        os.replace(tmp, path)
+
+    def load(self, job_id: str) -> dict | None:
+        path = self._path(job_id)
+        try:
+            return json.loads(path.read_text()) if path else None
+        except FileNotFoundError:
+            return None
+
+    def discard_spool(self, job_id: str) -> None:
+        shutil.rmtree(self.spool_dir(job_id), ignore_errors=True)
+
+    def claim(self, job_id: str) -> int | None:
+        """
+        Lock the job's spool for this process; the fd to `release`, or None if another live
+        process holds it or the spool is gone. The kernel drops the lock if the process dies.
+        """
+        try:
+            fd = os.open(self.spool_dir(job_id), os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    @staticmethod
+    def release(fd: int) -> None:
+        os.close(fd)   # closing the last fd drops the flock
+
+    def unfinished(self) -> list[dict]:
+        """Jobs still "queued" or "processing", oldest first."""
+        jobs = []
+        for p in self.jobs_dir.glob("*.json"):
+            try:
+                job = json.loads(p.read_text())
+            except (OSError, ValueError):
+                continue    # pruned or half-written
+            if job.get("status") in ("queued", "processing"):
+                jobs.append(job)
+        return sorted(jobs, key=lambda j: j.get("created_at", 0))
+
+    def prune(self) -> None:
+        """Forget jobs (and leftover spool) older than JOB_TTL; at most once a minute."""
+        now = time.time()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        for p in self.jobs_dir.glob("*.json"):
+            try:
+                if now - p.stat().st_mtime > JOB_TTL:
+                    p.unlink()
+                    self.discard_spool(p.stem)
+            except OSError:
+                pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class UploadQueue:
+    """Bounded local queue drained by `workers` asyncio tasks calling `handler(job)`."""
+
+    def __init__(self, store: JobStore, handler: Callable[[dict], Awaitable[None]],
+                 workers: int = UPLOAD_WORKERS, max_depth: int = UPLOAD_QUEUE_MAX):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_depth)
+        self._tasks: list[asyncio.Task] = []
+        self._claims: dict[str, int] = {}     # job id -> locked spool fd
+        self._closing = False
+
+    def full(self) -> bool:
+        return self._closing or self._queue.full()
+
+    def submit(self, job: dict) -> None:
+        """Lock the job's spool, persist the job and queue it; the lock comes first so no other
+        process starting up can take the job for an orphan."""
+        if self.full():
+            raise QueueFull()
+        fd = self.store.claim(job["id"])
+        if fd is None:
+            raise RuntimeError(f"cannot lock spool of upload job {job['id']}")
+        self._claims[job["id"]] = fd
+        try:
+            self.store.save(job)
+        except BaseException:
+            self._release(job["id"])
+            raise
+        self._queue.put_nowait(job)
+        QUEUE_DEPTH.set(self._queue.qsize())
+
+    def _release(self, job_id: str) -> None:
+        fd = self._claims.pop(job_id, None)
+        if fd is not None:
+            self.store.release(fd)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            QUEUE_DEPTH.set(self._queue.qsize())
+            started = time.perf_counter()
+            try:
+                job["status"] = "processing"
+                self.store.save(job)
+                await self.handler(job)
+                job["status"] = "done"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception("upload job %s failed", job["id"])
+                job["status"] = "failed"
+                job["error"] = str(getattr(e, "detail", e))
+            finally:
+                # a cancelled job stays "processing" with its spool, and resumes on the next start
+                if job["status"] != "processing":
+                    self.store.save(job)
+                    self.store.discard_spool(job["id"])
+                    JOB_SECONDS.labels(job["status"]).observe(time.perf_counter() - started)
+                self._release(job["id"])
+                self._queue.task_done()
+            self.store.prune()
+
+    def _recover(self) -> list[dict]:
+        """Claim the unfinished jobs nobody else holds; fail the ones whose spool is gone."""
+        resumed = []
+        for job in self.store.unfinished():
+            if job["id"] in self._claims:
+                continue
+            if not self.store.spool_dir(job["id"]).is_dir():
+                job.update(status="failed", error="upload data lost before processing")
+                self.store.save(job)
+                continue
+            fd = self.store.claim(job["id"])
+            if fd is not None:
+                self._claims[job["id"]] = fd
+                resumed.append(job)
+        return resumed
+
+    async def _resume(self, jobs: list[dict]) -> None:
+        for job in jobs:
+            await self._queue.put(job)     # waits for room rather than dropping past max_depth
+            QUEUE_DEPTH.set(self._queue.qsize())
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._closing = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        resumed = await asyncio.to_thread(self._recover)
+        if resumed:
+            log.info("resuming %s unfinished upload jobs", len(resumed))
+            self._tasks.append(asyncio.create_task(self._resume(resumed)))
+
+    async def stop(self, timeout: float = UPLOAD_DRAIN_SECONDS) -> None:
+        """Refuse new jobs, let the workers drain the queue for up to `timeout` seconds, then cancel."""
+        if not self._tasks:
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("%s upload jobs unfinished after %ss; they resume on the next start",
+                        len(self._claims), timeout)
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job_id in list(self._claims):
+            self._release(job_id)
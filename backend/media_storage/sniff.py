@@ -0,0 +1,167 @@
+# media_storage/sniff.py
+"""
+Header-only image sniffing.
+
+`sniff(data)` identifies JPEG, PNG, GIF, WebP and AVIF from the leading bytes and reads the
+pixel size straight out of the headers (IHDR, the GIF screen descriptor, the VP8/VP8L/VP8X
+chunk, the JPEG SOF segment, the AVIF `ispe` property), so an upload can be typed and
+size-checked before anything decodes it. Parsers only index into `data`; JPEG skips from
+segment to segment by length, so a huge Exif block costs nothing to pass over.
+
+Width / height are None when the header that carries them lies beyond `data` (a JPEG whose
+SOF comes after more than the bytes given); the full file resolves that.
+"""
+import os
+import struct
+from pathlib import Path
+from typing import NamedTuple
+
+HEAD_BYTES = 64 * 1024       # enough for the size header of practically every file
+
+# decompression-bomb guard: refuse anything that would decode to more pixels than this
+MAX_PIXELS = int(os.getenv("MEDIA_MAX_PIXELS", str(40_000_000)))
+
+MIME_TYPES = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+
+
+class ImageKind(NamedTuple):
+    ext: str                  # file extension we store under
+    width: int | None
+    height: int | None
+
+    @property
+    def mime(self) -> str:
+        return MIME_TYPES[self.ext]
+
+    @property
+    def pixels(self) -> int | None:
+        return None if self.width is None or self.height is None else self.width * self.height
+
+
+def _png(data: bytes) -> ImageKind:
+    if len(data) >= 24 and data[12:16] == b"IHDR":
+        w, h = struct.unpack(">II", data[16:24])
+        return ImageKind("png", w, h)
+    return ImageKind("png", None, None)
+
+
+def _gif(data: bytes) -> ImageKind:
+    if len(data) >= 10:
+        w, h = struct.unpack("<HH", data[6:10])
+        return ImageKind("gif", w, h)
+    return ImageKind("gif", None, None)
+
+
+# SOF0..SOF15 minus DHT (C4), JPG (C8) and DAC (CC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg(data: bytes) -> ImageKind:
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            break
+        marker = data[i + 1]
+        if marker == 0xFF:                  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:   # standalone markers carry no length
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):          # end of image / start of scan before any SOF
+            break
+        if marker in _JPEG_SOF:
+            if i + 9 <= n:
+                h, w = struct.unpack(">HH", data[i + 5:i + 9])
+                return ImageKind("jpg", w, h)
+            break
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return ImageKind("jpg", None, None)
+
+
+def _webp(data: bytes) -> ImageKind:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30 and data[23:26] == b"\x9d\x01\x2a":
+        w, h = struct.unpack("<HH", data[26:30])
+        return ImageKind("webp", w & 0x3FFF, h & 0x3FFF)
+    if chunk == b"VP8L" and len(data) >= 25 and data[20] == 0x2F:
+        bits = int.from_bytes(data[21:25], "little")
+        return ImageKind("webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk == b"VP8X" and len(data) >= 30:
+        w = int.from_bytes(data[24:27], "little") + 1
+        h = int.from_bytes(data[27:30], "little") + 1
+        return ImageKind("webp", w, h)
+    return ImageKind("webp", None, None)
+
+
+def _boxes(data: bytes, start: int, end: int):
+    """(type, payload_start, box_end) for the ISO-BMFF boxes in data[start:end]."""
+    i = start
+    while i + 8 <= end:
+        size, typ = struct.unpack(">I4s", data[i:i + 8])
+        head = 8
+        if size == 1:                       # 64-bit largesize
+            if i + 16 > end:
+                return
+            size, head = struct.unpack(">Q", data[i + 8:i + 16])[0], 16
+        elif size == 0:                     # runs to the end of the enclosing box
+            size = end - i
+        if size < head:
+            return
+        yield typ, i + head, min(i + size, end)
+        i += size
+
+
+def _child(data: bytes, start: int, end: int, want: bytes) -> tuple[int, int] | None:
+    for typ, s, e in _boxes(data, start, end):
+        if typ == want:
+            return s, e
+    return None
+
+
+_AVIF_BRANDS = {b"avif", b"avis"}
+
+
+def _avif(data: bytes) -> ImageKind | None:
+    ftyp_end = struct.unpack(">I", data[:4])[0]
+    brands = {data[8:12]} | {data[k:k + 4] for k in range(16, min(ftyp_end, len(data)) - 3, 4)}
+    if not brands & _AVIF_BRANDS:
+        return None
+    # meta (full box) > iprp > ipco > ispe (full box: width, height). Grids and thumbnails have
+    # their own ispe; the largest one is the primary image's canvas, and the safe one to check.
+    best = None
+    meta = _child(data, 0, len(data), b"meta")
+    iprp = meta and _child(data, meta[0] + 4, meta[1], b"iprp")
+    ipco = iprp and _child(data, *iprp, b"ipco")
+    for typ, start, end in (_boxes(data, *ipco) if ipco else ()):
+        if typ == b"ispe" and end - start >= 12:
+            w, h = struct.unpack(">II", data[start + 4:start + 12])
+            if best is None or w * h > best[0] * best[1]:
+                best = (w, h)
+    return ImageKind("avif", *(best or (None, None)))
+
+
+def sniff(data: bytes) -> ImageKind | None:
+    """The image type and size from the leading bytes of `data`; None if it isn't a supported image."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return _png(data)
+    if data[:3] == b"\xff\xd8\xff":
+        return _jpeg(data)
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return _gif(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _webp(data)
+    if data[4:8] == b"ftyp" and len(data) >= 12:
+        return _avif(data)
+    return None
+
+
+def sniff_file(path: Path, limit: int = HEAD_BYTES) -> ImageKind | None:
+    with open(path, "rb") as f:
+        return sniff(f.read(limit))
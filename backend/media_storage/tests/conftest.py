@@ -0,0 +1,33 @@
+"""
+Tests run without Redis (fakeredis stands in) and on a scratch MEDIA_ROOT, like
+bench/asgi_bench.py:
+
+    cd backend/media_storage && python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest_asyncio
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+_workdir = Path(tempfile.mkdtemp(prefix="media-tests-"))
+# before main.py reads them at import time
+os.environ["MEDIA_ROOT"] = str(_workdir / "media")
+os.environ["UPLOAD_SPOOL_DIR"] = str(_workdir / "spool")
+os.environ["MEDIA_META_DIR"] = str(_workdir / "meta")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, str(SERVICE_DIR))
+
+
+@pytest_asyncio.fixture
+async def redis(monkeypatch):
+    """A fakeredis client installed as the shared client returned by lib.redis.index.get_client."""
+    import fakeredis
+    import lib.redis.index as redis_index
+
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis_index, "_client", client)
+    yield client
+    await client.aclose()
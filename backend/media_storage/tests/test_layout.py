@@ -0,0 +1,70 @@
+import pytest
+
+import layout
+from migrate_layout import legacy_owners, migrate
+
+OWNER = "3f2c9a1e-5b7d-4c61-9e0a-2d8f6b4c1a70"
+
+
+@pytest.fixture(autouse=True)
+def two_levels(monkeypatch):
+    monkeypatch.setattr(layout, "SHARD_LEVELS", 2)
+    monkeypatch.setattr(layout, "SHARD_WIDTH", 2)
+
+
+def _write(path, data=b"x"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def test_owner_dir_is_sharded_and_stable(tmp_path):
+    d = layout.owner_dir(tmp_path, "products", OWNER)
+    a, b = layout.shard(OWNER)
+    assert d == tmp_path / "products" / a / b / OWNER
+    assert len(a) == len(b) == 2 and layout.is_shard_name(a)
+    assert not layout.is_shard_name(OWNER)
+    assert layout.owner_dirs(tmp_path, "products", OWNER) == [tmp_path / "products" / OWNER, d]
+
+
+def test_candidates_map_public_paths_to_disk():
+    a, b = layout.shard(OWNER)
+    assert layout.candidates(f"products/{OWNER}/w320/1.jpg") == [
+        f"products/{a}/{b}/{OWNER}/w320/1.jpg", f"products/{OWNER}/w320/1.jpg",
+    ]
+    assert layout.candidates("robots.txt") == ["robots.txt"]
+
+
+def test_flat_layout_when_levels_is_zero(tmp_path, monkeypatch):
+    monkeypatch.setattr(layout, "SHARD_LEVELS", 0)
+    assert layout.owner_dir(tmp_path, "products", OWNER) == tmp_path / "products" / OWNER
+    assert layout.owner_dirs(tmp_path, "products", OWNER) == [tmp_path / "products" / OWNER]
+    assert layout.candidates(f"products/{OWNER}/1.jpg") == [f"products/{OWNER}/1.jpg"]
+
+
+def test_static_files_serve_both_layouts(tmp_path):
+    _write(layout.owner_dir(tmp_path, "products", OWNER) / "new.jpg")
+    _write(layout.legacy_dir(tmp_path, "products", OWNER) / "old.jpg")
+    static = layout.ShardedStaticFiles(directory=str(tmp_path))
+    assert static.lookup_path(f"products/{OWNER}/new.jpg")[1] is not None
+    assert static.lookup_path(f"products/{OWNER}/old.jpg")[1] is not None
+    assert static.lookup_path(f"products/{OWNER}/none.jpg") == ("", None)
+
+
+def test_migrate_moves_and_merges(tmp_path):
+    other = "0b7e4d2a-9c1f-4e83-a5d6-7f2b8c3e1d94"
+    _write(layout.legacy_dir(tmp_path, "products", OWNER) / "000001-a.jpg")
+    _write(layout.legacy_dir(tmp_path, "products", OWNER) / "w320" / "000001-a.jpg")
+    _write(layout.legacy_dir(tmp_path, "products", other) / "000001-b.jpg")
+    _write(layout.owner_dir(tmp_path, "products", other) / "000002-c.jpg")      # uploaded since the deploy
+
+    assert migrate(tmp_path, ("products",), batch=1, pause=0, dry_run=True) == {"moved": 2, "merged": 0, "failed": 0}
+    assert sorted(legacy_owners(tmp_path, "products")) == sorted([OWNER, other])
+
+    assert migrate(tmp_path, ("products",), batch=1, pause=0) == {"moved": 1, "merged": 1, "failed": 0}
+    assert list(legacy_owners(tmp_path, "products")) == []
+    moved = layout.owner_dir(tmp_path, "products", OWNER)
+    assert sorted(p.relative_to(moved).as_posix() for p in moved.rglob("*.jpg")) == ["000001-a.jpg", "w320/000001-a.jpg"]
+    merged = layout.owner_dir(tmp_path, "products", other)
+    assert sorted(p.name for p in merged.iterdir()) == ["000001-b.jpg", "000002-c.jpg"]
+
+    assert migrate(tmp_path, ("products",), batch=1, pause=0) == {"moved": 0, "merged": 0, "failed": 0}
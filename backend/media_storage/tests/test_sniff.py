@@ -0,0 +1,121 @@
+import struct
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from sniff import MAX_PIXELS, ImageKind, sniff
+
+# 1x1 transparent PNG
+PNG_1PX = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+def png(w: int, h: int) -> bytes:
+    ihdr = struct.pack(">II5B", w, h, 8, 6, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + b"\0\0\0\0"
+
+
+def jpeg(w: int, h: int, exif_bytes: int = 0) -> bytes:
+    out = b"\xff\xd8"
+    if exif_bytes:
+        out += b"\xff\xe1" + struct.pack(">H", exif_bytes + 2) + b"\0" * exif_bytes
+    out += b"\xff\xdb" + struct.pack(">H", 67) + b"\0" * 65                # DQT
+    out += b"\xff\xc2" + struct.pack(">HBHHB", 11, 8, h, w, 1) + b"\x01\x11\x00"   # progressive SOF
+    return out + b"\xff\xda\0\x08\x01\x01\x00\x00\x3f\x00" + b"\0" * 16 + b"\xff\xd9"
+
+
+def riff(chunk: bytes, payload: bytes) -> bytes:
+    body = b"WEBP" + chunk + struct.pack("<I", len(payload)) + payload
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def box(typ: bytes, payload: bytes, full: bool = False) -> bytes:
+    payload = (b"\0\0\0\0" if full else b"") + payload
+    return struct.pack(">I", 8 + len(payload)) + typ + payload
+
+
+def avif(*sizes: tuple[int, int], brand: bytes = b"avif") -> bytes:
+    ftyp = box(b"ftyp", brand + b"\0\0\0\0" + b"mif1miaf")
+    ispes = b"".join(box(b"ispe", struct.pack(">II", w, h), full=True) for w, h in sizes)
+    meta = box(b"meta", box(b"hdlr", b"\0" * 20, full=True) + box(b"iprp", box(b"ipco", ispes)), full=True)
+    return ftyp + meta + box(b"mdat", b"\0" * 8)
+
+
+@pytest.mark.parametrize("data, expected", [
+    (PNG_1PX, ImageKind("png", 1, 1)),
+    (png(640, 480), ImageKind("png", 640, 480)),
+    (b"GIF89a" + struct.pack("<HH", 320, 200) + b"\0" * 8, ImageKind("gif", 320, 200)),
+    (jpeg(1024, 768), ImageKind("jpg", 1024, 768)),
+    (jpeg(1024, 768, exif_bytes=60_000), ImageKind("jpg", 1024, 768)),
+    (riff(b"VP8 ", b"\x30\x01\x00\x9d\x01\x2a" + struct.pack("<HH", 800, 600) + b"\0" * 8), ImageKind("webp", 800, 600)),
+    (riff(b"VP8L", b"\x2f" + struct.pack("<I", (100 - 1) | (50 - 1) << 14) + b"\0" * 8), ImageKind("webp", 100, 50)),
+    (riff(b"VP8X", b"\0" * 4 + (4000 - 1).to_bytes(3, "little") + (3000 - 1).to_bytes(3, "little")),
+     ImageKind("webp", 4000, 3000)),
+    (avif((256, 256), (4000, 3000)), ImageKind("avif", 4000, 3000)),     # thumbnail + primary
+    (avif((64, 64), brand=b"avis"), ImageKind("avif", 64, 64)),
+])
+def test_sniff_reads_type_and_size(data, expected):
+    assert sniff(data) == expected
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"<svg xmlns='http://www.w3.org/2000/svg'/>",
+    b"%PDF-1.7\n",
+    avif((64, 64), brand=b"heic"),          # ISO-BMFF, but not AVIF
+])
+def test_sniff_rejects_other_content(data):
+    assert sniff(data) is None
+
+
+def test_size_beyond_the_given_bytes_is_unknown():
+    data = jpeg(1024, 768, exif_bytes=60_000)
+    assert sniff(data[:1000]) == ImageKind("jpg", None, None)
+    assert sniff(png(10, 10)[:20]) == ImageKind("png", None, None)
+
+
+# ---------- upload checks ----------
+
+def _status(fn, *args, **kw) -> int:
+    with pytest.raises(HTTPException) as exc:
+        fn(*args, **kw)
+    return exc.value.status_code
+
+
+def test_check_image_limits():
+    from main import check_image
+
+    side = int(MAX_PIXELS ** 0.5) + 1
+    assert check_image("ok.png", png(100, 100)).mime == "image/png"
+    assert _status(check_image, "bomb.png", png(side, side)) == 413
+    assert _status(check_image, "bomb.webp", riff(b"VP8X", b"\0" * 4 + b"\xff\xff\xff" * 2)) == 413
+    assert _status(check_image, "zero.gif", b"GIF89a\0\0\0\0" + b"\0" * 8) == 400
+    assert _status(check_image, "fake.jpg", b"<html>") == 400
+
+    head = jpeg(1024, 768, exif_bytes=60_000)[:1000]
+    assert check_image("head.jpg", head, complete=False).width is None   # decided on the full file
+    assert _status(check_image, "head.jpg", head) == 400
+
+
+@pytest.mark.asyncio
+async def test_uploads_refuse_content_that_is_not_what_it_claims(redis):
+    import main
+
+    side = int(MAX_PIXELS ** 0.5) + 1
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        async def upload(path, name, data, mime):
+            return await client.post(path, files={"files": (name, data, mime)})
+
+        ok = await upload("/upload/products/p1", "a.jpg", PNG_1PX, "image/jpeg")      # declared type is not trusted
+        assert ok.status_code == 201
+        item = ok.json()["items"][0]
+        assert item["filename"].endswith(".png") and item["content_type"] == "image/png"
+
+        assert (await upload("/upload/products/p1", "x.png", b"<script>", "image/png")).status_code == 400
+        assert (await upload("/upload/products/p1", "bomb.png", png(side, side), "image/png")).status_code == 413
+        assert (await upload("/upload/products/p1/async", "bomb.png", png(side, side), "image/png")).status_code == 413
+        listed = (await client.get("/products/p1/images")).json()
+        assert [i["filename"] for i in listed["items"]] == [item["filename"]]
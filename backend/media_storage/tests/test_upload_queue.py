@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+
+from processing import JobStore, QueueFull, UploadQueue
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(tmp_path)
+
+
+@pytest.fixture
+def handled():
+    return []
+
+
+@pytest.fixture
+def make_queue(store, handled):
+    queues = []
+
+    def make(delay: float = 0.05) -> UploadQueue:
+        async def handler(job):
+            await asyncio.sleep(delay)
+            handled.append(job["id"])
+        q = UploadQueue(store, handler, workers=1, max_depth=10)
+        queues.append(q)
+        return q
+
+    yield make
+    for q in queues:
+        for job_id in list(q._claims):
+            q._release(job_id)
+
+
+def _job(store, status: str = "queued", spool: bool = True) -> dict:
+    job = {"id": store.new_id(), "status": status, "files": [], "processed": 0,
+           "items": [], "errors": [], "created_at": time.time()}
+    if spool:
+        store.spool_dir(job["id"]).mkdir()
+    store.save(job)
+    return job
+
+
+async def _until(cond, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def test_start_resumes_orphans_and_fails_lost_jobs(store, handled, make_queue):
+    queued, processing = _job(store), _job(store, "processing")
+    lost, done = _job(store, spool=False), _job(store, "done")
+    held = _job(store)
+    other_process = store.claim(held["id"])
+    try:
+        q = make_queue()
+        await q.start()
+        await _until(lambda: len(handled) == 2)
+        await q.stop()
+    finally:
+        store.release(other_process)
+
+    assert handled == [queued["id"], processing["id"]]
+    assert store.load(queued["id"])["status"] == "done"
+    assert store.load(lost["id"])["status"] == "failed"
+    assert store.load(done["id"])["status"] == "done"
+    assert store.load(held["id"])["status"] == "queued"      # still owned by its live process
+
+
+async def test_stop_drains_the_queue(store, handled, make_queue):
+    q = make_queue()
+    await q.start()
+    jobs = [_job(store) for _ in range(3)]
+    for job in jobs:
+        q.submit(job)
+    await q.stop(timeout=5)
+    assert handled == [j["id"] for j in jobs]
+    assert not any(store.spool_dir(j["id"]).exists() for j in jobs)
+    with pytest.raises(QueueFull):
+        q.submit(_job(store))
+
+
+async def test_jobs_cut_off_by_the_drain_timeout_resume_on_next_start(store, handled, make_queue):
+    q = make_queue(delay=0.2)
+    await q.start()
+    jobs = [_job(store) for _ in range(2)]
+    for job in jobs:
+        q.submit(job)
+    await q.stop(timeout=0.05)
+    assert handled == []
+    assert [store.load(j["id"])["status"] for j in jobs] == ["processing", "queued"]
+
+    q2 = make_queue(delay=0)
+    await q2.start()
+    await _until(lambda: len(handled) == 2)
+    await q2.stop()
+    assert sorted(handled) == sorted(j["id"] for j in jobs)
+    assert all(store.load(j["id"])["status"] == "done" for j in jobs)
+
+
+async def test_resumed_job_continues_after_its_last_processed_file(redis):
+    import main
+    from test_sniff import PNG_1PX
+
+    product_id = f"resume-{time.time_ns()}"
+    job = {"id": main.job_store.new_id(), "status": "processing", "subdir": "products", "owner_id": product_id,
+           "total": 2, "processed": 0, "items": [], "errors": [], "created_at": time.time(),
+           "files": [{"spool": str(i), "filename": f"{i}.png", "alt": None} for i in range(2)]}
+    spool = main.job_store.spool_dir(job["id"])
+    spool.mkdir(parents=True)
+    for i in range(2):
+        (spool / str(i)).write_bytes(PNG_1PX)
+
+    # first run stopped after one file, and its items already reached the manifest
+    base_dir = main.owner_dir(main.MEDIA_ROOT, "products", product_id)
+    base_dir.mkdir(parents=True)
+    first = main._finalize_one(base_dir, "products", product_id, spool / "0", "0.png", 1)
+    job["items"].append({**first, "alt": None})
+    job["processed"] = 1
+    main._rewrite_manifest(product_id, job["items"], set())
+
+    await main._process_upload_job(job)
+    assert job["processed"] == 2
+    assert [i["position"] for i in job["items"]] == [1, 2]
+    manifest = main.load_manifest(product_id)
+    assert [i["filename"] for i in manifest["images"]] == [i["filename"] for i in job["items"]]